@@ -1,15 +1,19 @@
 from __future__ import annotations
 
+import uuid
 from datetime import date
 from decimal import Decimal
 
 import streamlit as st
 
-from pdf_generator import build_quote_pdf_bytes
-from utils import QuoteItem, to_decimal
+from import_timing import import_times, timed_import
+from journal import get_journal
+from pdf_cache import get_pdf_cache
+from totals import totals_from_line_totals
+from utils import QuoteItem, money_clp, to_decimal
 
-# DB (Supabase/Postgres)
-from db import next_quote_number, insert_quote
+# db (psycopg) y pdf_generator (reportlab) se importan recién al usarse:
+# la pantalla de login no paga su carga (ver import_timing.py).
 
 st.set_page_config(page_title="Cotizador PDF", page_icon="🧾", layout="centered")
 
@@ -60,12 +64,44 @@ require_login()
 # FIN CONTROL DE ACCESO
 # -----------------------------
 
+view = st.sidebar.radio("Vista", ("Nueva cotización", "Historial"), horizontal=True)
+# Guarda por trabajo los tiempos de cada fase (timing.py) y los muestra al terminar
+st.sidebar.toggle("Desglose de tiempos", key="show_timings")
+if view == "Historial":
+    from history_view import render_history
+
+    render_history()
+    st.stop()
+
 st.title("Generador de cotizaciones en PDF")
 
 # Keys seguras (no chocan con dict methods)
 KEY_ITEMS = "quote_items"
-KEY_QUOTE_NUMBER = "quote_number"
-KEY_QUOTE_SEQ = "quote_seq"
+KEY_VALID_ITEMS = "valid_items"
+KEY_LINE_TOTALS = "line_totals_memo"
+KEY_JOB = "quote_job"
+KEY_DRAFT_ID = "quote_draft_id"
+KEY_EDITOR_VERSION = "items_editor_version"  # cambia cuando se reemplazan las filas (ej. ítem del catálogo)
+KEY_CATALOG_QUERY = "catalog_query"
+KEY_CLIENT_QUERY = "client_query"
+KEY_CLIENT_NAME = "client_name"
+KEY_CLIENT_EMAIL = "client_email"
+KEY_CLIENT_COMPANY = "client_company"
+
+# Requisito: para guardar + número autoincremental, debe existir DATABASE_URL
+has_db = bool(st.secrets.get("DATABASE_URL"))
+# Diario local (JOURNAL_PATH): guardar no depende de que la base responda en ese momento
+journal = get_journal() if has_db else None
+
+
+@st.cache_data(ttl=15, show_spinner=False)
+def cached_next_quote_number(year: int) -> str:
+    """Próximo N° referencial (solo lectura), cacheado para no consultar en cada rerun."""
+    if journal is not None:
+        reserved = journal.peek_number(year)
+        if reserved:
+            return reserved
+    return timed_import("db").peek_next_quote_number(year)
 
 with st.sidebar:
     st.subheader("Marca")
@@ -77,8 +113,26 @@ with st.sidebar:
     st.divider()
     st.subheader("Base de datos (Supabase)")
     # Validación suave para guiar si falta el secreto
-    if not st.secrets.get("DATABASE_URL"):
+    if not has_db:
         st.warning("Falta DATABASE_URL en Secrets. No se guardará historial ni se asignará N° automático.")
+    if journal is not None:
+        journal_stats = journal.stats()
+        st.caption(
+            f"Diario local: {journal_stats['pending']} por sincronizar · "
+            f"{journal_stats['reserved']} N° reservados (detalle en Historial)"
+        )
+        if journal_stats["last_loop_error"]:
+            st.caption(f"Último error del envío: {journal_stats['last_loop_error']}")
+
+    st.divider()
+    cache_stats = get_pdf_cache().stats()
+    st.caption(
+        f"Caché PDF: {cache_stats['hits_memory'] + cache_stats['hits_disk']} aciertos · "
+        f"{cache_stats['misses']} fallos · {cache_stats['bytes_memory'] / 1e6:.1f} MB en memoria"
+    )
+    lazy_loads = import_times()
+    if lazy_loads:
+        st.caption("Carga diferida: " + " · ".join(f"{name} {secs * 1000:.0f} ms" for name, secs in lazy_loads.items()))
 
 
 # -----------------------------
@@ -94,36 +148,80 @@ with col2:
     st.text_input("Año", value=str(issue_date.year), disabled=True)
 
 with col3:
-    # Botón para pedir correlativo
-    can_assign = bool(st.secrets.get("DATABASE_URL"))
-    if st.button("Asignar N° (autoincremental)", disabled=not can_assign):
+    # El correlativo se asigna al guardar (no se consumen números de cotizaciones no guardadas)
+    next_qn = ""
+    if has_db:
         try:
-            seq, qn = next_quote_number(issue_date.year)
-            st.session_state[KEY_QUOTE_SEQ] = seq
-            st.session_state[KEY_QUOTE_NUMBER] = qn
-            st.success(f"N° asignado: {qn}")
-        except Exception as e:
-            st.error("No se pudo asignar el número desde la base de datos.")
-            st.exception(e)
-
-quote_number = st.session_state.get(KEY_QUOTE_NUMBER, "")
-st.text_input("N° Cotización", value=quote_number, disabled=True)
-
-# Si cambian la fecha/año después de asignar número, advertir (para no mezclar)
-if quote_number and str(issue_date.year) != quote_number.split("-")[0]:
-    st.warning("Cambiaste el año de la fecha. Vuelve a asignar el N° para mantener el correlativo por año.")
+            next_qn = cached_next_quote_number(issue_date.year)
+        except Exception:
+            next_qn = ""
+    st.text_input(
+        "N° Cotización",
+        value=next_qn,
+        disabled=True,
+        help="Referencial: el N° definitivo se asigna al generar y guardar la cotización.",
+    )
 
 
 # -----------------------------
 # Cliente
 # -----------------------------
 st.subheader("Cliente")
+
+
+def _use_client(client) -> None:
+    st.session_state[KEY_CLIENT_NAME] = client.name
+    st.session_state[KEY_CLIENT_EMAIL] = client.email
+    st.session_state[KEY_CLIENT_COMPANY] = client.company
+    st.session_state[KEY_CLIENT_QUERY] = ""
+
+
+def client_picker() -> None:
+    """
+    Autocompletar el cliente desde el directorio (clients.py): la búsqueda es
+    sobre la copia compartida en memoria, no consulta la base por cada texto.
+    """
+    col_q, col_pick, col_use = st.columns([2, 3, 1], vertical_alignment="bottom")
+    query = col_q.text_input("Buscar cliente", key=KEY_CLIENT_QUERY, placeholder="Nombre, empresa o email")
+    if not query.strip():
+        return
+    try:
+        matches = timed_import("clients").get_directory().search(query)
+    except Exception:
+        col_pick.warning("El directorio de clientes no está disponible.")
+        return
+    if not matches:
+        col_pick.caption("Sin coincidencias en el directorio.")
+        return
+    client = col_pick.selectbox("Clientes", matches, format_func=lambda c: c.label, key="client_pick")
+    col_use.button("Usar", key="client_use", on_click=_use_client, args=(client,))
+
+
+def client_hint(name: str, email: str, company: str) -> None:
+    """Si el cliente escrito ya está en el directorio (misma clave), o si es nuevo."""
+    try:
+        known = timed_import("clients").get_directory().resolve(name, company)
+    except Exception:
+        return
+    if known is None:
+        st.caption("Cliente nuevo: se agrega al directorio al guardar.")
+        return
+    text = f"Cliente del directorio: {known.label}."
+    if known.email and not email.strip():
+        text += " Sin email en esta cotización."
+    st.caption(text)
+
+
+if has_db:
+    client_picker()
 col3, col4 = st.columns(2)
 with col3:
-    client_name = st.text_input("Nombre cliente", value="")
-    client_email = st.text_input("Email cliente", value="")
+    client_name = st.text_input("Nombre cliente", key=KEY_CLIENT_NAME)
+    client_email = st.text_input("Email cliente", key=KEY_CLIENT_EMAIL)
 with col4:
-    client_company = st.text_input("Empresa", value="")
+    client_company = st.text_input("Empresa", key=KEY_CLIENT_COMPANY)
+if has_db and client_name.strip():
+    client_hint(client_name, client_email, client_company)
 
 # -----------------------------
 # Ítems
@@ -136,39 +234,122 @@ if KEY_ITEMS not in st.session_state:
         {"description": "Landing page (1 sección)", "Cantidad": 1, "unit_price": 120000},
     ]
 
-for i, row in enumerate(st.session_state[KEY_ITEMS]):
-    c1, c2, c3, c4 = st.columns([5, 1.2, 2, 1])
 
-    row["description"] = c1.text_input(
-        f"Descripción {i+1}",
-        value=row.get("description", ""),
-        key=f"desc_{i}",
+def _cell(value, default):
+    # Celdas vacías del editor llegan como None o NaN
+    return default if value is None or value != value else value
+
+
+def rows_to_items(rows: list[dict]) -> list[QuoteItem]:
+    """Filas del editor -> ítems válidos (con descripción y cantidad > 0)."""
+    items: list[QuoteItem] = []
+    for row in rows:
+        desc = str(_cell(row.get("description"), "")).strip()
+        if not desc:
+            continue
+
+        qty = to_decimal(_cell(row.get("Cantidad"), 1))
+        unit_price = to_decimal(_cell(row.get("unit_price"), 0))
+
+        # filtro mínimo: si qty es 0, no lo agregues
+        if qty <= 0:
+            continue
+
+        items.append(QuoteItem(description=desc, qty=qty, unit_price=unit_price))
+    return items
+
+
+def _add_catalog_row(rows: list[dict], entry) -> None:
+    # Las filas editadas pasan a ser los datos base de un editor nuevo (otra key) con la fila agregada
+    st.session_state[KEY_ITEMS] = [*rows, {"description": entry.description, "Cantidad": 1, "unit_price": float(entry.unit_price)}]
+    st.session_state[KEY_EDITOR_VERSION] = st.session_state.get(KEY_EDITOR_VERSION, 0) + 1
+    st.session_state[KEY_CATALOG_QUERY] = ""
+
+
+def catalog_picker(rows: list[dict]) -> None:
+    """
+    Buscar en el catálogo y agregar el ítem (descripción + precio) como fila.
+    La búsqueda es en memoria (catalog.py): no consulta la base por cada texto.
+    """
+    col_q, col_pick, col_add = st.columns([2, 3, 1], vertical_alignment="bottom")
+    query = col_q.text_input("Buscar en catálogo", key=KEY_CATALOG_QUERY, placeholder="Ej: landing")
+    if not query.strip():
+        return
+    try:
+        matches = timed_import("catalog").get_catalog().search(query)
+    except Exception:
+        col_pick.warning("El catálogo no está disponible.")
+        return
+    if not matches:
+        col_pick.caption("Sin coincidencias en el catálogo.")
+        return
+    entry = col_pick.selectbox(
+        "Coincidencias",
+        matches,
+        format_func=lambda e: f"{e.description} · {money_clp(e.unit_price)}",
+        key="catalog_pick",
     )
+    col_add.button("Agregar", key="catalog_add", on_click=_add_catalog_row, args=(rows, entry))
 
-    row["Cantidad"] = c2.number_input(
-        f"Cantidad {i+1}",
-        min_value=0.0,
-        value=float(row.get("Cantidad", 1)),
-        step=1.0,
-        key=f"qty_{i}",
+
+def live_line_totals(items: list[QuoteItem]) -> list[int]:
+    """
+    Totales por línea reutilizando los ya calculados: solo se calculan las
+    combinaciones (cantidad, precio) nuevas desde la última edición.
+    """
+    memo = st.session_state.setdefault(KEY_LINE_TOTALS, {})
+    if len(memo) > 4 * len(items) + 64:
+        memo.clear()
+    out = []
+    for it in items:
+        k = (it.qty, it.unit_price)
+        total = memo.get(k)
+        if total is None:
+            total = memo[k] = int(it.line_total)
+        out.append(total)
+    return out
+
+
+@st.fragment
+def item_editor() -> None:
+    """
+    Editor de ítems aislado: editar, añadir o borrar filas solo vuelve a
+    ejecutar este bloque (no toda la app). Deja los ítems válidos en
+    st.session_state[KEY_VALID_ITEMS] para el resto de la página.
+    """
+    rows = st.data_editor(
+        st.session_state[KEY_ITEMS],
+        key=f"items_editor_{st.session_state.get(KEY_EDITOR_VERSION, 0)}",
+        num_rows="dynamic",
+        use_container_width=True,
+        column_config={
+            "description": st.column_config.TextColumn("Descripción", width="large"),
+            "Cantidad": st.column_config.NumberColumn("Cantidad", min_value=0.0, step=1.0, default=1),
+            "unit_price": st.column_config.NumberColumn("Precio", min_value=0.0, step=1000.0, default=0, format="%.0f"),
+        },
     )
 
-    row["unit_price"] = c3.number_input(
-        f"Precio {i+1}",
-        min_value=0.0,
-        value=float(row.get("unit_price", 0)),
-        step=1000.0,
-        key=f"price_{i}",
+    if has_db:
+        catalog_picker(rows)
+
+    items = rows_to_items(rows)
+    first_run = KEY_VALID_ITEMS not in st.session_state
+    had_items = bool(st.session_state.get(KEY_VALID_ITEMS))
+    st.session_state[KEY_VALID_ITEMS] = items
+
+    totals = totals_from_line_totals(live_line_totals(items), Decimal(str(st.session_state.get("discount_pct", 0.0))))
+    st.caption(
+        f"{len(items)} ítems · Neto {money_clp(totals.neto)} · IVA {money_clp(totals.iva_amount)} · "
+        f"**Total {money_clp(totals.total)}**"
     )
 
-    if c4.button("❌", key=f"del_{i}", help="Eliminar ítem"):
-        st.session_state[KEY_ITEMS].pop(i)
-        st.rerun()
+    # El botón "Generar PDF" depende de que haya ítems: solo entonces se refresca la página completa
+    if not first_run and had_items != bool(items):
+        st.rerun(scope="app")
+
 
-col_add, col_space = st.columns([1, 5])
-if col_add.button("Añadir ítem"):
-    st.session_state[KEY_ITEMS].append({"description": "", "Cantidad": 1, "unit_price": 0})
-    st.rerun()
+item_editor()
+items: list[QuoteItem] = st.session_state[KEY_VALID_ITEMS]
 
 # -----------------------------
 # Totales y condiciones
@@ -176,6 +357,7 @@ if col_add.button("Añadir ítem"):
 st.subheader("Totales")
 discount_pct = st.number_input(
     "Descuento (%)",
+    key="discount_pct",
     min_value=0.0,
     max_value=90.0,
     value=0.0,
@@ -196,22 +378,6 @@ validity_days = st.number_input(
     step=1,
 )
 
-# Build items para el PDF/DB
-items: list[QuoteItem] = []
-for row in st.session_state[KEY_ITEMS]:
-    desc = (row.get("description") or "").strip()
-    if not desc:
-        continue
-
-    qty = to_decimal(row.get("Cantidad", 1))
-    unit_price = to_decimal(row.get("unit_price", 0))
-
-    # filtro mínimo: si qty es 0, no lo agregues
-    if qty <= 0:
-        continue
-
-    items.append(QuoteItem(description=desc, qty=qty, unit_price=unit_price))
-
 st.divider()
 
 can_generate = bool(client_name.strip()) and len(items) > 0
@@ -219,76 +385,66 @@ can_generate = bool(client_name.strip()) and len(items) > 0
 if not can_generate:
     st.info("Completa al menos el nombre del cliente y agrega 1 ítem con descripción (y cantidad > 0) para generar el PDF.")
 
-# Requisito: para guardar + número autoincremental, debe existir quote_number asignado
-needs_number = True
-has_number = bool(st.session_state.get(KEY_QUOTE_NUMBER))
+if not has_db:
+    st.warning("Falta DATABASE_URL en Secrets. No puedo guardar ni asignar el correlativo.")
 
-if needs_number and not has_number:
-    st.warning("Antes de generar, presiona “Asignar N° (autoincremental)” para obtener el correlativo desde la base de datos.")
-
-btn_disabled = (not can_generate) or (not has_number)
+btn_disabled = (not can_generate) or (not has_db)
 
 if st.button("Generar PDF", disabled=btn_disabled):
-    qn = st.session_state.get(KEY_QUOTE_NUMBER, "").strip()
-    seq = int(st.session_state.get(KEY_QUOTE_SEQ, 0))
-    yr = int(issue_date.year)
-
-    # 1) Guardar en DB (Supabase)
-    try:
-        if not st.secrets.get("DATABASE_URL"):
-            st.error("Falta DATABASE_URL en Secrets. No puedo guardar ni asegurar correlativo.")
-            st.stop()
-
-        insert_quote(
-            year=yr,
-            seq=seq,
-            quote_number=qn,
-            issue_date=issue_date,
-            brand_name=brand_name.strip() or "HIDRACODE SOLUTIONS",
-            brand_email=brand_email.strip(),
-            brand_phone=brand_phone.strip(),
-            client_name=client_name.strip(),
-            client_email=client_email.strip(),
-            client_company=client_company.strip(),
-            discount_pct=Decimal(str(discount_pct)),
-            notes=notes,
-            validity_days=int(validity_days),
-            items=items,
-        )
-    except Exception as e:
-        st.error("No se pudo guardar la cotización en la base de datos.")
-        st.exception(e)
-        st.stop()
-
-    # 2) Generar PDF
-    with st.spinner("Generando PDF..."):
-        pdf_bytes = build_quote_pdf_bytes(
-            quote_number=qn or "0001",
-            issue_date=issue_date,
-            brand_name=brand_name.strip() or "HIDRACODE SOLUTIONS",
-            brand_email=brand_email.strip(),
-            brand_phone=brand_phone.strip(),
-            client_name=client_name.strip(),
-            client_email=client_email.strip(),
-            client_company=client_company.strip(),
-            items=items,
-            discount_pct=Decimal(str(discount_pct)),
-            notes=notes,
-            validity_days=int(validity_days),
-            logo_path=logo_path.strip() if logo_path.strip() else None,
-        )
-
-    filename = f"cotizacion_{qn or '0001'}.pdf"
-    st.success("PDF generado y guardado en la base de datos.")
-    st.download_button(
-        label="Descargar PDF",
-        data=pdf_bytes,
-        file_name=filename,
-        mime="application/pdf",
+    # Guardar (correlativo + cabecera + ítems) y generar el PDF corre en la cola
+    # de trabajos del proceso: la sesión no se bloquea y un rerun no lo repite.
+    from jobs import get_job_queue, save_and_render, save_job_key
+
+    header = {
+        "year": int(issue_date.year),
+        "issue_date": issue_date,
+        "brand_name": brand_name.strip() or "HIDRACODE SOLUTIONS",
+        "brand_email": brand_email.strip(),
+        "brand_phone": brand_phone.strip(),
+        "client_name": client_name.strip(),
+        "client_email": client_email.strip(),
+        "client_company": client_company.strip(),
+        "discount_pct": Decimal(str(discount_pct)),
+        "notes": notes,
+        "validity_days": int(validity_days),
+    }
+    draft_id = st.session_state.setdefault(KEY_DRAFT_ID, uuid.uuid4().hex)
+    job_key = save_job_key(draft_id, header, items)
+    get_job_queue().submit(
+        job_key,
+        save_and_render,
+        header,
+        list(items),
+        logo_path.strip() if logo_path.strip() else None,
+        timed=bool(st.session_state.get("show_timings")),
+    )
+    st.session_state[KEY_JOB] = job_key
+
+
+def _on_saved(job) -> None:
+    from jobs import DONE
+
+    if job.status == DONE:
+        # Borrador nuevo: volver a guardar el mismo contenido es otra cotización,
+        # no el trabajo ya terminado (si falló, se conserva para reintentarlo sin otro N°)
+        st.session_state[KEY_DRAFT_ID] = uuid.uuid4().hex
+    if job.quote_number:
+        cached_next_quote_number.clear()
+        # Para que el cliente recién guardado aparezca en el directorio
+        timed_import("clients").invalidate()
+
+
+if KEY_JOB in st.session_state:
+    from job_view import render_job
+
+    render_job(
+        KEY_JOB,
+        logo_path=logo_path.strip() or None,
+        on_done=_on_saved,
+        done_message=lambda job: (
+            f"PDF generado con el N° {job.quote_number}. Quedó en el diario local y se sincroniza con la base en segundo plano."
+            if journal is not None
+            else f"PDF generado y guardado en la base de datos con el N° {job.quote_number}."
+        ),
+        widget_prefix="quote_job",
     )
-
-    # Opcional: limpiar número para que obligue a asignar uno nuevo en la próxima cotización
-    st.session_state.pop(KEY_QUOTE_NUMBER, None)
-    st.session_state.pop(KEY_QUOTE_SEQ, None)
-
-
@@ -0,0 +1,342 @@
+"""
+Generador batch de cotizaciones (sin Streamlit).
+
+Lee especificaciones desde JSONL (una cotización por línea) o CSV (una fila por
+ítem, agrupadas por la columna `ref`), renderiza los PDF en paralelo con un pool
+de procesos y los escribe en un ZIP o en una carpeta a medida que terminan
+(memoria acotada: solo hay --max-inflight PDFs en vuelo).
+
+Ejemplos:
+    python batch.py cotizaciones.jsonl --zip salida.zip
+    python batch.py items.csv --out-dir pdfs/ --workers 8
+    python batch.py cotizaciones.jsonl --zip salida.zip --persist --batch-size 200
+    python batch.py --reprint 2026-01-01 2026-03-31 --zip trimestre.zip
+
+JSONL (campos opcionales salvo client_name e items):
+    {"ref": "A1", "client_name": "ACME", "client_email": "", "client_company": "",
+     "issue_date": "2026-01-31", "discount_pct": "5", "notes": "...", "validity_days": 10,
+     "quote_number": "2026-0001",
+     "items": [{"description": "Landing page", "qty": "1", "unit_price": "120000"}]}
+
+CSV: mismas columnas de cabecera (se toman de la primera fila de cada `ref`)
+más description, qty, unit_price por fila. Las filas de una misma cotización
+deben ir consecutivas.
+
+Con --persist cada lote reserva sus correlativos en bloque
+(db.reserve_quote_numbers) y se guarda en una sola transacción
+(db.insert_quotes); DATABASE_URL se lee de st.secrets o del entorno.
+
+Con --reprint DESDE HASTA no se lee archivo: se vuelven a generar los PDF de
+las cotizaciones guardadas con fecha en ese rango (db.iter_quotes), con su
+número original.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import sys
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from itertools import groupby, islice
+from typing import Any, Iterable, Iterator, Optional
+
+from utils import QuoteItem
+
+DEFAULT_BRAND = {
+    "brand_name": "HIDRACODE SOLUTIONS",
+    "brand_email": "contacto.hidracode@gmail.com",
+    "brand_phone": "+56 9 4075 2095",
+}
+
+HEADER_FIELDS = (
+    "quote_number",
+    "issue_date",
+    "brand_name",
+    "brand_email",
+    "brand_phone",
+    "client_name",
+    "client_email",
+    "client_company",
+    "discount_pct",
+    "notes",
+    "validity_days",
+)
+
+
+# -----------------------------
+# Lectura de especificaciones
+# -----------------------------
+def _decimal(value: Any, field: str, ref: str) -> Decimal:
+    try:
+        d = Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"[{ref}] valor inválido en {field}: {value!r}") from None
+    if not d.is_finite():
+        # NaN/Infinity: Decimal los acepta, pero fallan (o no tienen sentido) al comparar y sumar
+        raise ValueError(f"[{ref}] valor inválido en {field}: {value!r}")
+    return d
+
+
+def _build_spec(raw: dict[str, Any], raw_items: Iterable[dict[str, Any]], ref: str) -> dict[str, Any]:
+    """Normaliza una cotización a los argumentos de build_quote_pdf_bytes/insert_quote."""
+    spec: dict[str, Any] = {"ref": ref}
+    for field in HEADER_FIELDS:
+        value = raw.get(field)
+        if value is not None and str(value).strip() != "":
+            spec[field] = value
+
+    for key, default in DEFAULT_BRAND.items():
+        spec.setdefault(key, default)
+
+    if not str(spec.get("client_name", "")).strip():
+        raise ValueError(f"[{ref}] falta client_name")
+
+    spec["issue_date"] = date.fromisoformat(str(spec["issue_date"])) if "issue_date" in spec else date.today()
+    spec["discount_pct"] = _decimal(spec.get("discount_pct", "0"), "discount_pct", ref)
+    spec["validity_days"] = int(spec.get("validity_days", 10))
+    spec["notes"] = str(spec.get("notes", ""))
+    spec["client_email"] = str(spec.get("client_email", ""))
+    spec["client_company"] = str(spec.get("client_company", ""))
+
+    items: list[tuple[str, str, str]] = []
+    for it in raw_items:
+        desc = str(it.get("description") or "").strip()
+        if not desc:
+            continue
+        qty = _decimal(it.get("qty", "1"), "qty", ref)
+        unit_price = _decimal(it.get("unit_price", "0"), "unit_price", ref)
+        if qty <= 0:
+            continue
+        # Se envían como texto al worker (Decimal exacto, pickling barato)
+        items.append((desc, str(qty), str(unit_price)))
+    if not items:
+        raise ValueError(f"[{ref}] la cotización no tiene ítems válidos")
+    spec["items"] = items
+    return spec
+
+
+def spec_from_json(raw: dict[str, Any], default_ref: str) -> dict[str, Any]:
+    """Una cotización en el formato JSONL de arriba (también lo usa service.py)."""
+    if not isinstance(raw, dict):
+        raise ValueError(f"[{default_ref}] se esperaba un objeto JSON")
+    ref = str(raw.get("ref") or raw.get("quote_number") or default_ref)
+    return _build_spec(raw, raw.get("items") or [], ref)
+
+
+def read_jsonl(path: str) -> Iterator[dict[str, Any]]:
+    with open(path, encoding="utf-8") as fh:
+        for lineno, line in enumerate(fh, start=1):
+            if not line.strip():
+                continue
+            yield spec_from_json(json.loads(line), f"L{lineno}")
+
+
+def read_csv(path: str) -> Iterator[dict[str, Any]]:
+    with open(path, encoding="utf-8-sig", newline="") as fh:
+        reader = csv.DictReader(fh)
+        if not reader.fieldnames or "ref" not in reader.fieldnames:
+            raise ValueError("El CSV debe tener una columna 'ref' que agrupe los ítems de cada cotización.")
+        for ref, rows in groupby(reader, key=lambda r: r["ref"]):
+            rows = list(rows)
+            yield _build_spec(rows[0], rows, str(ref))
+
+
+def read_specs(path: str) -> Iterator[dict[str, Any]]:
+    if path.lower().endswith(".csv"):
+        return read_csv(path)
+    return read_jsonl(path)
+
+
+def read_stored(date_from: date, date_to: date) -> Iterator[dict[str, Any]]:
+    """Cotizaciones guardadas en el rango de fechas, como especificaciones ya numeradas."""
+    import db
+
+    for q in db.iter_quotes(date_from, date_to):
+        spec = q.pdf_kwargs()
+        del spec["logo_path"]
+        spec["ref"] = q.quote_number
+        spec["items"] = [(it.description, str(it.qty), str(it.unit_price)) for it in q.items]
+        yield spec
+
+
+def _batched(specs: Iterable[dict[str, Any]], size: int) -> Iterator[list[dict[str, Any]]]:
+    it = iter(specs)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+# -----------------------------
+# Persistencia (por lotes)
+# -----------------------------
+def persist_batch(batch: list[dict[str, Any]]) -> None:
+    """
+    Asigna correlativos en bloque (uno por año del lote) y guarda el lote en una
+    transacción. Si falla, los números reservados se liberan/anulan.
+    """
+    import db
+
+    by_year: dict[int, list[dict[str, Any]]] = {}
+    for spec in batch:
+        by_year.setdefault(spec["issue_date"].year, []).append(spec)
+
+    reserved: dict[int, list[int]] = {}
+    try:
+        for year, specs in by_year.items():
+            block = db.reserve_quote_numbers(year, len(specs))
+            reserved[year] = [seq for seq, _ in block]
+            for spec, (seq, qn) in zip(specs, block):
+                spec["year"] = year
+                spec["seq"] = seq
+                spec["quote_number"] = qn
+
+        db.insert_quotes([_db_args(spec) for spec in batch])
+    except Exception:
+        for year, seqs in reserved.items():
+            db.release_quote_numbers(year, seqs, reason="batch: error al guardar el lote")
+        raise
+
+
+def _db_args(spec: dict[str, Any]) -> dict[str, Any]:
+    args = {k: spec[k] for k in HEADER_FIELDS}
+    args["year"] = spec["year"]
+    args["seq"] = spec["seq"]
+    args["items"] = _quote_items(spec["items"])
+    return args
+
+
+# -----------------------------
+# Render (en procesos worker)
+# -----------------------------
+def _quote_items(raw_items: Iterable[tuple[str, str, str]]) -> list[QuoteItem]:
+    return [QuoteItem(description=d, qty=Decimal(q), unit_price=Decimal(p)) for d, q, p in raw_items]
+
+
+def render_spec(spec: dict[str, Any], logo_path: Optional[str]) -> tuple[str, bytes]:
+    """Worker: retorna (nombre de archivo, bytes del PDF)."""
+    from pdf_generator import build_quote_pdf_bytes
+
+    kwargs = {k: spec[k] for k in HEADER_FIELDS}
+    pdf_bytes = build_quote_pdf_bytes(items=_quote_items(spec["items"]), logo_path=logo_path, **kwargs)
+    return f"cotizacion_{spec['quote_number']}.pdf", pdf_bytes
+
+
+class _Output:
+    """Destino de los PDF: ZIP (escritura incremental) o carpeta."""
+
+    def __init__(self, zip_path: Optional[str], out_dir: Optional[str]):
+        self._zip = zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_STORED) if zip_path else None
+        self._dir = out_dir
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+
+    def write(self, filename: str, data: bytes) -> None:
+        if self._zip is not None:
+            # Los PDF ya vienen comprimidos: ZIP_STORED evita gastar CPU del proceso principal
+            self._zip.writestr(filename, data)
+        else:
+            with open(os.path.join(self._dir, filename), "wb") as fh:
+                fh.write(data)
+
+    def close(self) -> None:
+        if self._zip is not None:
+            self._zip.close()
+
+
+def run(
+    *,
+    specs: Iterable[dict[str, Any]],
+    zip_path: Optional[str],
+    out_dir: Optional[str],
+    workers: int,
+    max_inflight: int,
+    persist: bool,
+    batch_size: int,
+    logo_path: Optional[str],
+) -> int:
+    """Procesa todas las especificaciones. Retorna la cantidad de PDFs generados."""
+    output = _Output(zip_path, out_dir)
+    done_count = 0
+    draft_seq = 0
+    inflight: set[Future] = set()
+
+    def drain(limit: int) -> None:
+        nonlocal done_count
+        while len(inflight) > limit:
+            finished, _ = wait(inflight, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                inflight.discard(fut)
+                filename, data = fut.result()
+                output.write(filename, data)
+                done_count += 1
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for batch in _batched(specs, batch_size):
+                if persist:
+                    persist_batch(batch)
+                else:
+                    for spec in batch:
+                        if "quote_number" not in spec:
+                            draft_seq += 1
+                            spec["quote_number"] = f"BORRADOR-{draft_seq:04d}"
+
+                for spec in batch:
+                    drain(max_inflight - 1)
+                    inflight.add(executor.submit(render_spec, spec, logo_path))
+
+                print(f"… {done_count} PDF listos", file=sys.stderr)
+
+            drain(0)
+    finally:
+        output.close()
+
+    return done_count
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Genera cotizaciones PDF en lote desde JSONL o CSV.")
+    parser.add_argument("input", nargs="?", help="Archivo .jsonl o .csv con las cotizaciones")
+    parser.add_argument(
+        "--reprint",
+        nargs=2,
+        metavar=("DESDE", "HASTA"),
+        type=date.fromisoformat,
+        help="En vez de un archivo, regenera las cotizaciones guardadas entre estas fechas (AAAA-MM-DD)",
+    )
+    dest = parser.add_mutually_exclusive_group(required=True)
+    dest.add_argument("--zip", dest="zip_path", help="Escribe los PDF en este archivo ZIP")
+    dest.add_argument("--out-dir", help="Escribe los PDF en esta carpeta")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Procesos de render (default: N° de CPUs)")
+    parser.add_argument("--max-inflight", type=int, default=0, help="PDFs en vuelo como máximo (default: 4 x workers)")
+    parser.add_argument("--persist", action="store_true", help="Guarda en la base de datos y asigna correlativos")
+    parser.add_argument("--batch-size", type=int, default=100, help="Cotizaciones por transacción/reserva (default: 100)")
+    parser.add_argument("--logo", default="assets/logo.jpg", help="Ruta del logo ('' para omitir)")
+    args = parser.parse_args(argv)
+
+    if bool(args.input) == bool(args.reprint):
+        parser.error("indica un archivo de entrada o --reprint DESDE HASTA (no ambos)")
+    if args.reprint and args.persist:
+        parser.error("--persist no aplica a --reprint (las cotizaciones ya están guardadas)")
+    specs = read_stored(*args.reprint) if args.reprint else read_specs(args.input)
+
+    workers = max(1, args.workers)
+    total = run(
+        specs=specs,
+        zip_path=args.zip_path,
+        out_dir=args.out_dir,
+        workers=workers,
+        max_inflight=max(1, args.max_inflight or 4 * workers),
+        persist=args.persist,
+        batch_size=max(1, args.batch_size),
+        logo_path=args.logo or None,
+    )
+    print(f"Listo: {total} PDF generados.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,316 @@
+"""
+Benchmarks de render PDF, cálculos y persistencia.
+
+Mide build_quote_pdf_bytes (10 / 1k / 10k ítems, notas cortas/largas, con y sin
+logo), money_clp, QuoteItem.line_total y el motor de totals.py en bloque y, si se indica --pg-url,
+insert_quote / save_quote / next_quote_number contra un Postgres local
+desechable (se crea un schema temporal y se borra al final).
+
+Ejemplos:
+    python bench.py --out bench.json
+    python bench.py --quick --out nuevo.json --baseline bench.json --threshold 0.2
+    python bench.py --pg-url "postgresql://postgres@localhost:5432/postgres?sslmode=disable"
+
+Con --baseline el proceso termina con código 1 si algún caso empeora más que
+--threshold (fracción, sobre la mediana) respecto del JSON de referencia.
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Any, Callable, Iterator, Optional
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+from totals import compute_totals_many, line_totals, to_lines
+from utils import QuoteItem, money_clp
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+LOGO_PATH = os.path.join(_HERE, "assets", "logo.jpg")
+
+SHORT_NOTES = "• Entrega: 3-5 días hábiles.\n• Incluye 1 ronda de ajustes.\n• Forma de pago: 50% inicio, 50% contra entrega."
+LONG_NOTES = "\n".join(
+    f"{i}. El proveedor se obliga a cumplir las condiciones técnicas y comerciales descritas en esta cotización, "
+    "incluyendo plazos, garantías, soporte y cualquier ajuste acordado por escrito entre las partes." * 4
+    for i in range(1, 41)
+)
+
+# Esquema mínimo equivalente al de Supabase (tablas base); luego se aplican los sql/*.sql
+_BASE_SCHEMA_SQL = """
+create table quote_counters(year int primary key, last_seq int not null);
+create table quotes(
+  id bigserial primary key, year int not null, seq int not null, quote_number text not null unique,
+  issue_date date not null, brand_name text, brand_email text, brand_phone text,
+  client_name text, client_email text, client_company text,
+  discount_pct numeric(5,2) not null default 0, notes text, validity_days int,
+  created_at timestamptz not null default now()
+);
+create table quote_items(
+  id bigserial primary key, quote_id bigint not null references quotes(id) on delete cascade,
+  description text not null, qty numeric(12,2) not null, unit_price numeric(14,2) not null
+);
+"""
+
+
+def make_items(n: int) -> list[QuoteItem]:
+    return [
+        QuoteItem(
+            description=f"Servicio {i} - implementación y soporte",
+            qty=Decimal(1 + i % 5),
+            unit_price=Decimal(1990 + (i * 37) % 250000) + Decimal("0.5"),
+        )
+        for i in range(n)
+    ]
+
+
+def _timeit(fn: Callable[[], Any], repeat: int) -> tuple[dict[str, Any], Any]:
+    runs: list[float] = []
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        runs.append(time.perf_counter() - t0)
+    return {"min_s": min(runs), "median_s": statistics.median(runs), "runs": repeat}, result
+
+
+# -----------------------------
+# Casos
+# -----------------------------
+def bench_pdf(results: dict[str, Any], repeat: int, quick: bool) -> None:
+    from pdf_generator import build_quote_pdf_bytes
+
+    sizes = (10, 1000) if quick else (10, 1000, 10000)
+    for n in sizes:
+        items = make_items(n)
+        for notes_label, notes in (("short", SHORT_NOTES), ("long", LONG_NOTES)):
+            for logo in (False, True):
+                name = f"pdf/items={n}/notes={notes_label}/logo={'yes' if logo else 'no'}"
+
+                def run() -> bytes:
+                    return build_quote_pdf_bytes(
+                        quote_number="2026-0001",
+                        issue_date=date(2026, 1, 15),
+                        brand_name="HIDRACODE SOLUTIONS",
+                        brand_email="contacto.hidracode@gmail.com",
+                        brand_phone="+56 9 4075 2095",
+                        client_name="Cliente Benchmark",
+                        client_email="cliente@example.com",
+                        client_company="Empresa SpA",
+                        items=items,
+                        discount_pct=Decimal("7.5"),
+                        notes=notes,
+                        validity_days=10,
+                        logo_path=LOGO_PATH if logo else None,
+                    )
+
+                stats, pdf = _timeit(run, repeat)
+                stats["bytes"] = len(pdf)
+                stats["items"] = n
+                results[name] = stats
+                print(f"{name:<45} {stats['median_s'] * 1000:9.1f} ms  {len(pdf) / 1024:8.0f} KiB", file=sys.stderr)
+
+
+def bench_utils(results: dict[str, Any], repeat: int) -> None:
+    n = 100_000
+    items = make_items(n)
+    values = [it.unit_price for it in items]
+
+    stats, _ = _timeit(lambda: [money_clp(v) for v in values], repeat)
+    stats["items"] = n
+    results["utils/money_clp/100k"] = stats
+
+    stats, _ = _timeit(lambda: [it.line_total for it in items], repeat)
+    stats["items"] = n
+    results["utils/line_total/100k"] = stats
+
+    lines = to_lines(items)
+    stats, _ = _timeit(lambda: line_totals(lines), repeat)
+    stats["items"] = n
+    results["totals/line_totals/100k"] = stats
+
+    # 1.000 cotizaciones de 100 ítems (ítems ya convertidos a Line)
+    quotes = [(lines[i : i + 100], Decimal("7.5")) for i in range(0, n, 100)]
+    stats, _ = _timeit(lambda: compute_totals_many(quotes), repeat)
+    stats["items"] = n
+    results["totals/compute_totals_many/1k_x_100"] = stats
+
+    for name in ("utils/money_clp/100k", "utils/line_total/100k", "totals/line_totals/100k", "totals/compute_totals_many/1k_x_100"):
+        print(f"{name:<45} {results[name]['median_s'] * 1000:9.1f} ms", file=sys.stderr)
+
+
+def _with_bench_schema(pg_url: str, schema: str) -> str:
+    parsed = urlparse(pg_url)
+    q = dict(parse_qsl(parsed.query, keep_blank_values=True))
+    q["options"] = f"-csearch_path={schema},public"
+    q.setdefault("sslmode", "prefer")
+    return urlunparse(parsed._replace(query=urlencode(q)))
+
+
+@contextmanager
+def throwaway_database(pg_url: str) -> Iterator[str]:
+    """
+    Crea un schema temporal en pg_url con el esquema base + sql/*.sql y deja
+    db.py (y db_async.py) apuntando ahí: el DSN se le pasa al pool con
+    db.get_pool(url), sin pasar por DATABASE_URL ni por Secrets.
+    Al salir cierra el pool y borra el schema.
+    """
+    import psycopg
+
+    schema = f"bench_{os.getpid()}"
+    url = _with_bench_schema(pg_url, schema)
+    with psycopg.connect(url, autocommit=True) as admin:
+        admin.execute(f"create schema {schema}")
+    try:
+        with psycopg.connect(url, autocommit=True) as conn:
+            conn.execute(_BASE_SCHEMA_SQL)
+            for path in sorted(glob.glob(os.path.join(_HERE, "sql", "*.sql"))):
+                with open(path, encoding="utf-8") as fh:
+                    conn.execute(fh.read())
+
+        import db
+
+        db.get_pool(url).wait()
+        yield url
+    finally:
+        try:
+            import db
+
+            db.close_pool()
+        except Exception:
+            pass
+        with psycopg.connect(url, autocommit=True) as admin:
+            admin.execute(f"drop schema if exists {schema} cascade")
+
+
+def bench_db(results: dict[str, Any], repeat: int, pg_url: str) -> None:
+    """Corre contra un schema desechable en pg_url (ver throwaway_database)."""
+    with throwaway_database(pg_url):
+        import db
+
+        calls = 100
+
+        def counters() -> None:
+            for _ in range(calls):
+                db.next_quote_number(2026)
+
+        stats, _ = _timeit(counters, repeat)
+        stats["calls"] = calls
+        stats["per_call_s"] = stats["median_s"] / calls
+        results["db/next_quote_number"] = stats
+
+        header = dict(
+            issue_date=date(2026, 1, 15),
+            brand_name="HIDRACODE SOLUTIONS",
+            brand_email="contacto.hidracode@gmail.com",
+            brand_phone="+56 9 4075 2095",
+            client_name="Cliente Benchmark",
+            client_email="cliente@example.com",
+            client_company="Empresa SpA",
+            discount_pct=Decimal("7.5"),
+            notes=SHORT_NOTES,
+            validity_days=10,
+        )
+        for n in (10, 1000):
+            items = make_items(n)
+
+            def insert() -> int:
+                seq, qn = db.next_quote_number(2027)
+                return db.insert_quote(year=2027, seq=seq, quote_number=qn, items=items, **header)
+
+            stats, _ = _timeit(insert, repeat)
+            stats["items"] = n
+            results[f"db/insert_quote/items={n}"] = stats
+
+            stats, _ = _timeit(lambda: db.save_quote(year=2028, items=items, **header), repeat)
+            stats["items"] = n
+            results[f"db/save_quote/items={n}"] = stats
+
+        for name, stats in results.items():
+            if name.startswith("db/"):
+                print(f"{name:<45} {stats['median_s'] * 1000:9.1f} ms", file=sys.stderr)
+
+
+# -----------------------------
+# Comparación contra baseline
+# -----------------------------
+def compare(results: dict[str, Any], baseline_path: str, threshold: float) -> list[str]:
+    """Retorna los casos que empeoraron más que threshold (mediana vs baseline)."""
+    with open(baseline_path, encoding="utf-8") as fh:
+        baseline = json.load(fh).get("results", {})
+
+    regressions = []
+    for name, stats in results.items():
+        old = baseline.get(name)
+        if not old or not old.get("median_s"):
+            continue
+        ratio = stats["median_s"] / old["median_s"]
+        if ratio > 1 + threshold:
+            regressions.append(f"{name}: {old['median_s'] * 1000:.1f} ms -> {stats['median_s'] * 1000:.1f} ms (x{ratio:.2f})")
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks del cotizador (PDF, cálculos y base de datos).")
+    parser.add_argument("--out", help="Escribe los resultados en este JSON")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por caso (default: 3)")
+    parser.add_argument("--quick", action="store_true", help="Omite los casos de 10k ítems")
+    parser.add_argument("--only", choices=("pdf", "utils", "db"), action="append", help="Solo estos grupos")
+    parser.add_argument("--pg-url", help="Postgres local desechable para los casos de db (si falta, se omiten)")
+    parser.add_argument("--baseline", help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Empeoramiento tolerado (default: 0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    groups = set(args.only or ("pdf", "utils", "db"))
+    repeat = max(1, args.repeat)
+    results: dict[str, Any] = {}
+
+    if "utils" in groups:
+        bench_utils(results, repeat)
+    if "pdf" in groups:
+        bench_pdf(results, repeat, args.quick)
+    if "db" in groups:
+        if args.pg_url:
+            bench_db(results, repeat, args.pg_url)
+        else:
+            print("(sin --pg-url: se omiten los casos de base de datos)", file=sys.stderr)
+
+    import reportlab
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "reportlab": reportlab.Version,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2, ensure_ascii=False)
+    else:
+        json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.threshold)
+        if regressions:
+            print("Regresiones sobre el umbral:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            return 1
+        print("Sin regresiones sobre el umbral.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,289 @@
+"""
+Catálogo de productos/servicios (tabla catalog_items, sql/005_catalog.sql) con
+un índice en memoria para autocompletar descripción y precio de los ítems.
+
+    for entry in get_catalog().search("land pag"):
+        print(entry.description, entry.unit_price)
+
+El índice es uno por proceso (lo comparten todas las sesiones de Streamlit) y
+search() nunca consulta Postgres:
+- Cada palabra de la consulta debe ser prefijo de alguna palabra de la
+  descripción, sin mayúsculas ni tildes (utils.fold_text). Las palabras de
+  todo el catálogo están en una lista ordenada de (palabra, id): el rango de
+  un prefijo se encuentra con bisect, sin recorrer el catálogo.
+- La primera búsqueda carga el catálogo completo (solo ítems activos).
+  Después, si el índice tiene más de CATALOG_REFRESH_SECONDS (default 60),
+  search() responde con lo que ya tiene y lanza en un hilo un refresco que
+  trae solo las filas con updated_at posterior al refresco anterior (menos
+  REFRESH_OVERLAP, por transacciones que confirman tarde).
+
+Carga desde CSV (descripcion,precio; si la descripción ya existe se
+actualiza el precio) y búsqueda por consola:
+    python catalog.py --import catalogo.csv
+    python catalog.py --search "landing"
+"""
+from __future__ import annotations
+
+import argparse
+import bisect
+import csv
+import heapq
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Iterable, Optional, Sequence
+
+from utils import fold_text, money_clp, to_decimal
+
+# Una transacción que modifica el catálogo dura menos que esto: lo anterior a
+# (inicio del refresco - REFRESH_OVERLAP) ya se vio completo
+REFRESH_OVERLAP = timedelta(seconds=30)
+# Tras un refresco en segundo plano fallido, la próxima búsqueda pasado esto lo reintenta
+RETRY_SECONDS = 5.0
+
+_LOAD_SQL = """
+select id, description, unit_price, active, updated_at
+from catalog_items
+where active
+"""
+
+_CHANGES_SQL = """
+select id, description, unit_price, active, updated_at
+from catalog_items
+where updated_at > %s
+"""
+
+_UPSERT_SQL = """
+insert into catalog_items (description, unit_price)
+values (%s, %s)
+on conflict ((lower(description)))
+do update set unit_price = excluded.unit_price, active = true
+"""
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    """Ítem del catálogo, listo para agregarlo como fila del editor de ítems."""
+    id: int
+    description: str
+    unit_price: Decimal
+
+
+class Catalog:
+    """
+    Índice en memoria de catalog_items (ver docstring del módulo).
+    Thread-safe: las búsquedas y los refrescos se serializan con un lock;
+    las consultas a la base ocurren fuera de él.
+    """
+
+    def __init__(self, refresh_seconds: float = 60.0):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._entries: dict[int, CatalogEntry] = {}
+        self._words: dict[int, tuple[str, ...]] = {}  # palabras (sin tildes) de cada ítem
+        self._folded: dict[int, str] = {}  # descripción completa sin tildes, para ordenar
+        self._postings: list[tuple[str, int]] = []  # (palabra, id), ordenada
+        self._loaded = False
+        self._watermark: Optional[datetime] = None  # el próximo refresco pide updated_at > esto
+        self._refreshed_at = 0.0
+        self._retry_at = 0.0
+        self._refreshing = False
+        self.last_error = ""
+
+    # -----------------------------
+    # Búsqueda
+    # -----------------------------
+    def search(self, query: str, limit: int = 8) -> list[CatalogEntry]:
+        """
+        Ítems cuyas palabras empiezan con cada palabra de query (en cualquier
+        orden). Primero los que empiezan con la consulta completa, luego los
+        de descripción más corta.
+        """
+        phrase = fold_text(query)
+        terms = set(phrase.split())
+        if not terms:
+            return []
+        self._ensure_fresh()
+
+        with self._lock:
+            # Se parte por la palabra con menos coincidencias; el resto se verifica por ítem
+            ranges = {t: self._prefix_range(t) for t in terms}
+            first = min(terms, key=lambda t: ranges[t][1] - ranges[t][0])
+            lo, hi = ranges[first]
+            candidates = {entry_id for _word, entry_id in self._postings[lo:hi]}
+            rest = [t for t in terms if t != first]
+            if rest:
+                candidates = {
+                    entry_id
+                    for entry_id in candidates
+                    if all(any(w.startswith(t) for w in self._words[entry_id]) for t in rest)
+                }
+            best = heapq.nsmallest(
+                limit,
+                candidates,
+                key=lambda i: (not self._folded[i].startswith(phrase), len(self._folded[i]), self._folded[i]),
+            )
+            return [self._entries[i] for i in best]
+
+    def _prefix_range(self, prefix: str) -> tuple[int, int]:
+        """Posiciones [lo, hi) de _postings cuyas palabras empiezan con prefix."""
+        lo = bisect.bisect_left(self._postings, (prefix,))
+        hi = bisect.bisect_left(self._postings, (prefix + "\U0010ffff",), lo)
+        return lo, hi
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "words": len(self._postings),
+                "age_seconds": time.monotonic() - self._refreshed_at if self._loaded else None,
+                "last_error": self.last_error,
+            }
+
+    # -----------------------------
+    # Refresco
+    # -----------------------------
+    def _ensure_fresh(self) -> None:
+        if not self._loaded:
+            self.refresh()
+            return
+        now = time.monotonic()
+        if now - self._refreshed_at < self.refresh_seconds or now < self._retry_at:
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_refresh, name="catalog-refresh", daemon=True).start()
+
+    def _background_refresh(self) -> None:
+        try:
+            self.refresh()
+        except Exception as e:  # el índice sigue vencido: la primera búsqueda pasado RETRY_SECONDS reintenta
+            self.last_error = f"{type(e).__name__}: {e}"
+            self._retry_at = time.monotonic() + RETRY_SECONDS
+        finally:
+            self._refreshing = False
+
+    def refresh(self) -> int:
+        """
+        Carga el catálogo (la primera vez) o aplica lo que cambió desde el
+        último refresco. Retorna la cantidad de filas leídas.
+        """
+        from db import get_conn
+
+        with self._refresh_lock:
+            since = self._watermark
+            with get_conn() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("select now()")
+                    started = cur.fetchone()[0]
+                    if since is None:
+                        cur.execute(_LOAD_SQL)
+                    else:
+                        cur.execute(_CHANGES_SQL, (since,))
+                    rows = cur.fetchall()
+
+            with self._lock:
+                self._apply(rows)
+                self._watermark = started - REFRESH_OVERLAP
+                self._loaded = True
+                self._refreshed_at = time.monotonic()
+            self.last_error = ""
+        return len(rows)
+
+    def _apply(self, rows: Sequence[tuple[int, str, Decimal, bool, Any]]) -> None:
+        # Muchos cambios (o la carga inicial): reordenar todo de una vez sale más barato que insertar uno a uno
+        bulk = len(rows) > 256 and len(rows) > len(self._entries) // 8
+        for entry_id, description, unit_price, active, _updated_at in rows:
+            if not bulk:
+                self._unindex(entry_id)
+            self._entries.pop(entry_id, None)
+            self._words.pop(entry_id, None)
+            self._folded.pop(entry_id, None)
+            if active:
+                folded = fold_text(description)
+                words = tuple(sorted({sys.intern(w) for w in folded.split()}))
+                self._entries[entry_id] = CatalogEntry(entry_id, description, unit_price)
+                self._words[entry_id] = words
+                self._folded[entry_id] = folded
+                if not bulk:
+                    for word in words:
+                        bisect.insort(self._postings, (word, entry_id))
+        if bulk:
+            self._postings = sorted((w, i) for i, words in self._words.items() for w in words)
+
+    def _unindex(self, entry_id: int) -> None:
+        for word in self._words.get(entry_id, ()):
+            i = bisect.bisect_left(self._postings, (word, entry_id))
+            if i < len(self._postings) and self._postings[i] == (word, entry_id):
+                del self._postings[i]
+
+
+def upsert_items(rows: Iterable[tuple[str, Decimal]]) -> int:
+    """
+    Agrega o actualiza (por descripción, sin distinguir mayúsculas) ítems del
+    catálogo en una transacción. Los índices en memoria los ven en su próximo
+    refresco. Retorna la cantidad de filas enviadas.
+    """
+    from db import get_conn
+
+    values = [(description.strip(), unit_price) for description, unit_price in rows if description.strip()]
+    if not values:
+        return 0
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.executemany(_UPSERT_SQL, values)
+    return len(values)
+
+
+_catalog: Optional[Catalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> Catalog:
+    """Índice del proceso (compartido por todas las sesiones)."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                from settings import get_int_setting
+
+                _catalog = Catalog(refresh_seconds=float(get_int_setting("CATALOG_REFRESH_SECONDS", 60)))
+    return _catalog
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Catálogo de productos/servicios.")
+    parser.add_argument("--import", dest="import_path", help="CSV con columnas descripcion,precio (con encabezado)")
+    parser.add_argument("--search", help="buscar en el índice en memoria")
+    args = parser.parse_args(argv)
+
+    if args.import_path:
+        with open(args.import_path, newline="", encoding="utf-8-sig") as fh:
+            reader = csv.reader(fh)
+            next(reader, None)
+            sent = upsert_items((row[0], to_decimal(row[1]) if len(row) > 1 else Decimal("0")) for row in reader if row)
+        print(f"Ítems enviados: {sent}")
+
+    if args.search is not None:
+        catalog = get_catalog()
+        t0 = time.perf_counter()
+        catalog.refresh()
+        load_ms = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        matches = catalog.search(args.search, limit=20)
+        search_ms = (time.perf_counter() - t0) * 1000
+        stats = catalog.stats()
+        print(f"{stats['entries']} ítems ({stats['words']} palabras) cargados en {load_ms:.0f} ms · búsqueda {search_ms:.2f} ms")
+        for entry in matches:
+            print(f"  {entry.description}  {money_clp(entry.unit_price)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,237 @@
+"""
+Directorio de clientes (tabla clients, sql/006_clients.sql).
+
+Un cliente se identifica por utils.client_key (nombre + empresa sin
+mayúsculas, tildes, espacios ni puntuación). Al guardar, db.py liga la
+cotización a su cliente y lo crea si no existe.
+
+- La app autocompleta nombre, email y empresa desde el directorio y avisa si
+  el cliente escrito ya existe. El directorio se lee completo y se comparte
+  entre sesiones por CLIENTS_CACHE_SECONDS (default 300): buscar no consulta
+  la base.
+- Las cotizaciones anteriores al directorio se ligan con una migración en
+  lotes, de la más nueva a la más antigua (el nombre del cliente queda como se
+  escribió la última vez). Cada lote es una transacción corta que crea los
+  clientes que falten y fija client_id de a lo más --batch-size cotizaciones:
+  quotes no queda bloqueada mientras corre, y si se interrumpe se retoma
+  donde quedó.
+
+    python clients.py --migrate --batch-size 500
+    python clients.py --search "perez"
+"""
+from __future__ import annotations
+
+import argparse
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+from db import get_conn
+from settings import get_int_setting
+from utils import client_key, fold_text
+
+
+@dataclass(frozen=True)
+class Client:
+    id: int
+    key: str
+    name: str
+    email: str
+    company: str
+
+    @property
+    def label(self) -> str:
+        return " · ".join(v for v in (self.name, self.company, self.email) if v)
+
+
+class ClientDirectory:
+    """Foto del directorio: búsqueda por prefijos de palabras y resolución por client_key."""
+
+    def __init__(self, clients: Sequence[Client]):
+        self.clients = list(clients)  # los de cotizaciones más recientes primero
+        self._by_key = {c.key: c for c in self.clients}
+        # " palabra palabra ...": " " + término dentro del texto = alguna palabra empieza con el término
+        self._text = [" " + fold_text(f"{c.name} {c.company} {c.email}") for c in self.clients]
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    def search(self, query: str, limit: int = 8) -> list[Client]:
+        """Clientes con una palabra (de nombre, empresa o email) que empiece con cada palabra de query."""
+        terms = [" " + t for t in fold_text(query).split()]
+        if not terms:
+            return []
+        out: list[Client] = []
+        for client, text in zip(self.clients, self._text):
+            if all(t in text for t in terms):
+                out.append(client)
+                if len(out) >= limit:
+                    break
+        return out
+
+    def resolve(self, name: str, company: str = "") -> Optional[Client]:
+        """El cliente al que se ligaría una cotización con este nombre y empresa, o None si es nuevo."""
+        key = client_key(name, company)
+        return self._by_key.get(key) if key else None
+
+
+# Los de cotizaciones más recientes primero (índice quotes (client_id, issue_date))
+_DIRECTORY_SQL = """
+select c.id, c.client_key, c.name, c.email, c.company
+from clients c
+order by (select max(q.issue_date) from quotes q where q.client_id = c.id) desc nulls last, c.id desc
+"""
+
+
+def load_directory() -> ClientDirectory:
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(_DIRECTORY_SQL)
+            return ClientDirectory([Client(*row) for row in cur.fetchall()])
+
+
+# -----------------------------
+# Caché compartida (TTL)
+# -----------------------------
+_directory: Optional[ClientDirectory] = None
+_loaded_at = 0.0
+_lock = threading.Lock()
+
+
+def get_directory(max_age_s: Optional[int] = None) -> ClientDirectory:
+    """Directorio del proceso, releído si tiene más de max_age_s segundos (default CLIENTS_CACHE_SECONDS)."""
+    global _directory, _loaded_at
+    if max_age_s is None:
+        max_age_s = get_int_setting("CLIENTS_CACHE_SECONDS", 300)
+    directory = _directory
+    if directory is not None and time.monotonic() - _loaded_at < max_age_s:
+        return directory
+    with _lock:
+        if _directory is None or time.monotonic() - _loaded_at >= max_age_s:
+            _directory = load_directory()
+            _loaded_at = time.monotonic()
+        return _directory
+
+
+def invalidate() -> None:
+    """La próxima get_directory() relee (ej. después de guardar un cliente nuevo)."""
+    global _loaded_at
+    _loaded_at = 0.0
+
+
+# -----------------------------
+# Migración del historial
+# -----------------------------
+_PENDING_SQL = """
+select id, coalesce(client_name, ''), coalesce(client_email, ''), coalesce(client_company, '')
+from quotes
+where client_id is null
+  and (%(before)s::bigint is null or id < %(before)s)
+order by id desc
+limit %(limit)s
+"""
+
+_INSERT_CLIENTS_SQL = """
+insert into clients (client_key, name, email, company)
+select * from unnest(%(keys)s::text[], %(names)s::text[], %(emails)s::text[], %(companies)s::text[])
+on conflict (client_key) do nothing
+"""
+
+_LINK_SQL = """
+update quotes q
+set client_id = v.client_id
+from unnest(%(ids)s::bigint[], %(client_ids)s::bigint[]) as v(id, client_id)
+where q.id = v.id and q.client_id is null
+"""
+
+
+def migrate_batch(batch_size: int, before: Optional[int] = None) -> tuple[int, int, Optional[int]]:
+    """
+    Liga un lote de hasta batch_size cotizaciones sin cliente (id < before, de
+    la más nueva a la más antigua) en una transacción. Las que no tienen
+    nombre ni empresa quedan sin cliente.
+    Retorna (cotizaciones ligadas, clientes creados, before del próximo lote o None si no quedan).
+    """
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(_PENDING_SQL, {"before": before, "limit": max(1, batch_size)})
+            rows = cur.fetchall()
+            if not rows:
+                return 0, 0, None
+
+            links: list[tuple[int, str]] = []
+            new: dict[str, list[str]] = {}  # client_key -> [nombre, email, empresa]
+            for quote_id, name, email, company in rows:
+                key = client_key(name, company)
+                if not key:
+                    continue
+                links.append((quote_id, key))
+                fields = new.setdefault(key, [name.strip(), "", company.strip()])
+                if not fields[1] and email.strip():
+                    fields[1] = email.strip()
+
+            created = linked = 0
+            if links:
+                cur.execute(
+                    _INSERT_CLIENTS_SQL,
+                    {
+                        "keys": list(new),
+                        "names": [f[0] for f in new.values()],
+                        "emails": [f[1] for f in new.values()],
+                        "companies": [f[2] for f in new.values()],
+                    },
+                )
+                created = cur.rowcount
+                cur.execute("select client_key, id from clients where client_key = any(%s)", (list(new),))
+                ids = dict(cur.fetchall())
+                cur.execute(
+                    _LINK_SQL,
+                    {"ids": [q for q, _ in links], "client_ids": [ids[k] for _, k in links]},
+                )
+                linked = cur.rowcount
+        conn.commit()
+    return linked, created, int(rows[-1][0])
+
+
+def migrate(batch_size: int = 500, pause_s: float = 0.0, verbose: bool = False) -> tuple[int, int]:
+    """Liga todo el historial por lotes (pause_s entre lotes). Retorna (cotizaciones ligadas, clientes creados)."""
+    before: Optional[int] = None
+    total_linked = total_created = 0
+    while True:
+        linked, created, before = migrate_batch(batch_size, before)
+        if before is None:
+            break
+        total_linked += linked
+        total_created += created
+        if verbose:
+            print(f"  hasta id {before}: {total_linked} cotizaciones ligadas, {total_created} clientes nuevos")
+        if pause_s:
+            time.sleep(pause_s)
+    invalidate()
+    return total_linked, total_created
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Directorio de clientes.")
+    parser.add_argument("--migrate", action="store_true", help="ligar las cotizaciones anteriores a sus clientes")
+    parser.add_argument("--batch-size", type=int, default=500, help="cotizaciones por transacción (default: 500)")
+    parser.add_argument("--pause", type=float, default=0.0, help="segundos de espera entre lotes")
+    parser.add_argument("--search", help="buscar en el directorio")
+    args = parser.parse_args(argv)
+
+    if args.migrate:
+        t0 = time.perf_counter()
+        linked, created = migrate(args.batch_size, args.pause, verbose=True)
+        print(f"Cotizaciones ligadas: {linked} · clientes nuevos: {created} · {time.perf_counter() - t0:.1f} s")
+
+    if args.search is not None:
+        directory = get_directory(0)
+        print(f"{len(directory)} clientes")
+        for client in directory.search(args.search, limit=20):
+            print(f"  {client.label}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,23 +1,33 @@
 from __future__ import annotations
 
+import atexit
+import heapq
+import os
+import socket
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import date
-from decimal import Decimal
-from typing import Sequence
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, Iterator, Mapping, Sequence
 from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
 
 import psycopg
-import streamlit as st
+from psycopg_pool import ConnectionPool
 
-from utils import QuoteItem
+from settings import get_int_setting, get_setting
+from timing import span
+from totals import compute_totals, to_lines
+from utils import QuoteItem, client_key
 
 
 def _get_database_url() -> str:
     """
-    Lee DATABASE_URL desde st.secrets.
+    Lee DATABASE_URL desde la variable de entorno o st.secrets (settings.get_setting).
     Debe ser una URL tipo:
     postgresql://postgres:<PASSWORD>@...:5432/postgres
     """
-    url = st.secrets.get("DATABASE_URL")
+    url = get_setting("DATABASE_URL")
     if not url:
         raise RuntimeError("Falta DATABASE_URL en st.secrets")
     return str(url).strip()
@@ -37,12 +47,109 @@ def _with_sslmode_require(url: str) -> str:
     )
 
 
-def get_conn() -> psycopg.Connection:
+# Identifica a este proceso en quote_number_blocks
+_HOLDER = f"{socket.gethostname()}:{os.getpid()}"
+
+# Pool único por proceso: lo comparten todas las sesiones de Streamlit.
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+_atexit_registered = False  # close_pool se registra una vez aunque el pool se recree
+# DSN fijado con get_pool(dsn) (benchmarks, pruebas de carga); None = DATABASE_URL de los ajustes
+_dsn: str | None = None
+
+
+def _conninfo() -> str:
+    return _dsn or _with_sslmode_require(_get_database_url())
+
+
+def get_pool(dsn: str | None = None) -> ConnectionPool:
+    """
+    Retorna el pool de conexiones del proceso, creándolo en el primer uso.
+    El DSN y la configuración se leen una sola vez (no en cada consulta).
+    Con dsn, el pool (y db_async) se conecta ahí en vez de a DATABASE_URL
+    hasta el próximo close_pool(); si había un pool a otra base, se cierra.
+
+    Configuración opcional en st.secrets:
+    DB_POOL_MIN_SIZE  (default 1)   conexiones abiertas en reposo
+    DB_POOL_MAX_SIZE  (default 5)   máximo de conexiones simultáneas
+    DB_POOL_MAX_IDLE  (default 300) segundos antes de cerrar una conexión ociosa
+    DB_POOL_TIMEOUT   (default 15)  segundos esperando una conexión libre
+    DB_POOL_CHECK     (default 1)   verificar la conexión antes de entregarla
+    """
+    global _pool, _dsn, _atexit_registered
+    if dsn is not None and dsn != _dsn:
+        close_pool()
+        with _pool_lock:
+            _dsn = dsn
+    if _pool is not None:
+        return _pool
+
+    with _pool_lock:
+        if _pool is None:
+            min_size = get_int_setting("DB_POOL_MIN_SIZE", 1)
+            max_size = max(min_size, get_int_setting("DB_POOL_MAX_SIZE", 5))
+            check = ConnectionPool.check_connection if get_int_setting("DB_POOL_CHECK", 1) else None
+
+            pool = ConnectionPool(
+                conninfo=_conninfo(),
+                min_size=min_size,
+                max_size=max_size,
+                max_idle=float(get_int_setting("DB_POOL_MAX_IDLE", 300)),
+                timeout=float(get_int_setting("DB_POOL_TIMEOUT", 15)),
+                check=check,
+                name="cotizador",
+                open=False,
+            )
+            pool.open()
+            _pool = pool
+            if not _atexit_registered:
+                atexit.register(close_pool)
+                _atexit_registered = True
+    return _pool
+
+
+def close_pool() -> None:
+    """
+    Cierra el pool (y sus conexiones) y olvida el DSN de get_pool(dsn).
+    Se registra con atexit; también sirve para forzar reconexión si cambian
+    los Secrets.
+    """
+    global _pool, _dsn
+    with _pool_lock:
+        pool, _pool = _pool, None
+        _dsn = None
+    if pool is not None:
+        pool.close()
+
+
+@contextmanager
+def get_conn() -> Iterator[psycopg.Connection]:
     """
-    Abre conexión a PostgreSQL (Supabase) con SSL.
+    Entrega una conexión del pool (Supabase, con SSL) como context manager.
+    Al salir del `with` se hace commit (o rollback si hubo error)
+    y la conexión vuelve al pool en vez de cerrarse.
+    (Igual que ConnectionPool.connection(), midiendo la espera por la conexión.)
     """
-    dsn = _with_sslmode_require(_get_database_url())
-    return psycopg.connect(dsn)
+    pool = get_pool()
+    with span("db.connect"):
+        conn = pool.getconn()
+    try:
+        with conn:
+            yield conn
+    finally:
+        pool.putconn(conn)
+
+
+# SQL compartido con db_async.py
+_NEXT_NUMBER_SQL = """
+insert into quote_counters(year, last_seq)
+values (%s, 1)
+on conflict (year)
+do update set last_seq = quote_counters.last_seq + 1
+returning last_seq;
+"""
+
+_PEEK_NUMBER_SQL = "select coalesce((select last_seq from quote_counters where year = %s), 0) + 1;"
 
 
 def next_quote_number(year: int) -> tuple[int, str]:
@@ -50,23 +157,15 @@ def next_quote_number(year: int) -> tuple[int, str]:
     Obtiene el siguiente correlativo del año de forma atómica (sin duplicados).
     Retorna (seq, "YYYY-0001").
     """
-    sql = """
-    insert into quote_counters(year, last_seq)
-    values (%s, 1)
-    on conflict (year)
-    do update set last_seq = quote_counters.last_seq + 1
-    returning last_seq;
-    """
-
-    with get_conn() as conn:
+    with get_conn() as conn, span("db.counter_upsert"):
         with conn.cursor() as cur:
-            cur.execute(sql, (year,))
+            cur.execute(_NEXT_NUMBER_SQL, (year,))
             row = cur.fetchone()
             if not row:
                 raise RuntimeError("No se pudo obtener el correlativo (fetchone vacío).")
             seq = int(row[0])
 
-        # psycopg v3: si no hay error, al salir del with se confirma automáticamente.
+        # El pool confirma automáticamente al devolver la conexión si no hubo error.
         # Igual lo dejamos explícito para que sea claro:
         conn.commit()
 
@@ -74,6 +173,197 @@ def next_quote_number(year: int) -> tuple[int, str]:
     return seq, quote_number
 
 
+def peek_next_quote_number(year: int) -> str:
+    """
+    Muestra el próximo correlativo del año SIN consumirlo (solo lectura).
+    Es referencial: el número real se asigna al guardar con save_quote().
+    """
+    if _number_strategy() == "block":
+        leased = _lease.peek(year)
+        if leased is not None:
+            return f"{year}-{leased:04d}"
+
+    with get_conn() as conn:
+        row = conn.execute(_PEEK_NUMBER_SQL, (year,)).fetchone()
+
+    seq = int(row[0]) if row else 1
+    return f"{year}-{seq:04d}"
+
+
+def reserve_quote_numbers(year: int, count: int, holder: str | None = None) -> list[tuple[int, str]]:
+    """
+    Reserva un bloque contiguo de `count` correlativos del año en UN statement
+    (un solo bloqueo de la fila de quote_counters, en vez de uno por cotización).
+    El bloque queda registrado en quote_number_blocks (quién y cuándo).
+    Retorna [(seq, "YYYY-0001"), ...] en orden.
+
+    Los números que no se usen deben pasarse a release_quote_numbers(),
+    para que cada hueco de la numeración quede explicado.
+    """
+    if count < 1:
+        raise ValueError("La reserva debe ser de al menos 1 correlativo.")
+
+    sql = """
+    with counter as (
+      insert into quote_counters(year, last_seq)
+      values (%(year)s, %(count)s)
+      on conflict (year)
+      do update set last_seq = quote_counters.last_seq + excluded.last_seq
+      returning last_seq
+    )
+    insert into quote_number_blocks(year, first_seq, last_seq, holder)
+    select %(year)s, last_seq - %(count)s + 1, last_seq, %(holder)s
+    from counter
+    returning last_seq;
+    """
+    params = {"year": year, "count": count, "holder": holder or _HOLDER}
+
+    with get_conn() as conn, span("db.reserve_numbers", count=count):
+        row = conn.execute(sql, params).fetchone()
+        if not row:
+            raise RuntimeError("No se pudo reservar el bloque de correlativos (fetchone vacío).")
+        last_seq = int(row[0])
+        conn.commit()
+
+    first_seq = last_seq - count + 1
+    return [(seq, f"{year}-{seq:04d}") for seq in range(first_seq, last_seq + 1)]
+
+
+def release_quote_numbers(year: int, seqs: Sequence[int], reason: str = "no utilizado") -> tuple[int, int]:
+    """
+    Política para correlativos reservados que no se usaron:
+    - Si están al final de la numeración del año (nadie pidió números después),
+      se devuelven al contador y se reutilizan: no queda hueco.
+    - El resto se registra en quote_number_voids con su motivo (hueco explicado).
+    Los números que ya tienen cotización guardada se ignoran.
+    Solo se aceptan números ya entregados (1..last_seq del contador): anular
+    uno posterior lo haría repetirse en el próximo next_quote_number. Si hay
+    alguno fuera de rango se lanza ValueError sin liberar nada.
+    Retorna (devueltos, anulados).
+    """
+    pending = sorted(set(int(s) for s in seqs))
+    if not pending:
+        return 0, 0
+
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            # Bloquea el contador del año mientras se decide (transacción corta)
+            cur.execute("select last_seq from quote_counters where year = %s for update;", (year,))
+            row = cur.fetchone()
+            last_seq = int(row[0]) if row else 0
+
+            invalid = [s for s in pending if s < 1 or s > last_seq]
+            if invalid:
+                raise ValueError(
+                    f"Correlativos de {year} que nunca se entregaron (último: {last_seq}): "
+                    + ", ".join(str(s) for s in invalid)
+                )
+
+            cur.execute("select seq from quotes where year = %s and seq = any(%s);", (year, pending))
+            used = {int(r[0]) for r in cur.fetchall()}
+            pending = [s for s in pending if s not in used]
+
+            # Cola contigua al final del contador -> se devuelve
+            returned = 0
+            while pending and pending[-1] == last_seq - returned:
+                pending.pop()
+                returned += 1
+            if returned:
+                cur.execute(
+                    "update quote_counters set last_seq = last_seq - %s where year = %s;",
+                    (returned, year),
+                )
+
+            if pending:
+                cur.executemany(
+                    """
+                    insert into quote_number_voids(year, seq, quote_number, reason)
+                    values (%s, %s, %s, %s)
+                    on conflict (year, seq) do nothing
+                    """,
+                    [(year, s, f"{year}-{s:04d}", reason) for s in pending],
+                )
+
+        conn.commit()
+
+    return returned, len(pending)
+
+
+_ITEM_COPY_COLUMNS = ("quote_id", "description", "qty", "unit_price")
+_item_copy_types: list[int] | None = None
+
+_ITEM_COPY_TYPES_SQL = """
+select attname, atttypid::int
+from pg_attribute
+where attrelid = 'quote_items'::regclass
+  and attname = any(%s)
+  and not attisdropped;
+"""
+
+_ITEM_COPY_SQL = "copy quote_items (quote_id, description, qty, unit_price) from stdin (format binary)"
+
+
+def _copy_threshold() -> int:
+    """
+    Sobre cuántos ítems se usa COPY en vez de executemany.
+    Configurable en st.secrets: DB_COPY_THRESHOLD (default 500).
+    """
+    return get_int_setting("DB_COPY_THRESHOLD", 500)
+
+
+def _quote_items_copy_types(cur: psycopg.Cursor) -> list[int]:
+    """
+    OIDs reales de las columnas de quote_items (COPY binario exige tipos exactos:
+    ej. int4 vs int8 en quote_id). Se consultan una vez por proceso.
+    """
+    global _item_copy_types
+    if _item_copy_types is None:
+        cur.execute(_ITEM_COPY_TYPES_SQL, (list(_ITEM_COPY_COLUMNS),))
+        _item_copy_types = _copy_types_from(cur.fetchall())
+    return _item_copy_types
+
+
+def _copy_types_from(rows: Sequence[tuple[str, int]]) -> list[int]:
+    oids = dict(rows)
+    missing = [col for col in _ITEM_COPY_COLUMNS if col not in oids]
+    if missing:
+        raise RuntimeError(f"quote_items no tiene las columnas: {', '.join(missing)}")
+    return [oids[col] for col in _ITEM_COPY_COLUMNS]
+
+
+def _prepare_items(
+    items: Sequence[QuoteItem], discount_pct: Decimal
+) -> tuple[list[tuple[str, Decimal, Decimal]], dict[str, int]]:
+    """
+    Retorna ((description, qty, unit_price) por ítem, totales para la cabecera).
+    qty/precio van en la escala de totals.py y los totales salen del mismo
+    cálculo que usa el PDF: lo guardado reproduce siempre los totales impresos.
+    """
+    lines = to_lines(items)
+    totals = compute_totals(lines, discount_pct)
+    values = [(it.description, ln.qty, ln.unit_price) for it, ln in zip(items, lines)]
+    return values, {
+        "subtotal": totals.subtotal,
+        "discount_amount": totals.discount_amount,
+        "neto": totals.neto,
+        "iva_amount": totals.iva_amount,
+        "total": totals.total,
+    }
+
+
+def _copy_quote_items(cur: psycopg.Cursor, quote_id: int, values: Sequence[tuple[str, Decimal, Decimal]]) -> None:
+    """
+    Inserta ítems vía COPY ... FROM STDIN (formato binario), en la misma
+    transacción del cursor. qty/unit_price viajan como numeric binario:
+    mismo Decimal exacto que con executemany.
+    """
+    types = _quote_items_copy_types(cur)
+    with cur.copy(_ITEM_COPY_SQL) as copy:
+        copy.set_types(types)
+        for description, qty, unit_price in values:
+            copy.write_row((quote_id, description, qty, unit_price))
+
+
 def insert_quote(
     *,
     year: int,
@@ -100,50 +390,685 @@ def insert_quote(
 
     with get_conn() as conn:
         with conn.cursor() as cur:
-            # 1) Insert cabecera
-            cur.execute(
-                """
-                insert into quotes(
-                  year, seq, quote_number, issue_date,
-                  brand_name, brand_email, brand_phone,
-                  client_name, client_email, client_company,
-                  discount_pct, notes, validity_days
-                )
-                values (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                returning id;
-                """,
-                (
-                    year,
-                    seq,
-                    quote_number,
-                    issue_date,
-                    brand_name,
-                    brand_email,
-                    brand_phone,
-                    client_name,
-                    client_email,
-                    client_company,
-                    discount_pct,
-                    notes,
-                    validity_days,
-                ),
+            quote_id = _insert_quote_cur(
+                cur,
+                year=year,
+                seq=seq,
+                quote_number=quote_number,
+                issue_date=issue_date,
+                brand_name=brand_name,
+                brand_email=brand_email,
+                brand_phone=brand_phone,
+                client_name=client_name,
+                client_email=client_email,
+                client_company=client_company,
+                discount_pct=discount_pct,
+                notes=notes,
+                validity_days=validity_days,
+                items=items,
             )
-            row = cur.fetchone()
+
+        with span("db.commit"):
+            conn.commit()
+
+    return quote_id
+
+
+def insert_quotes(quotes: Sequence[Mapping[str, Any]]) -> list[int]:
+    """
+    Inserta varias cotizaciones (cada una con los mismos argumentos que
+    insert_quote) usando UNA conexión y UNA transacción: todo el lote o nada.
+    Pensado para procesos batch con correlativos de reserve_quote_numbers().
+    Retorna los quote_id en el mismo orden.
+    """
+    for q in quotes:
+        if not q.get("items"):
+            raise ValueError(f"La cotización {q.get('quote_number', '')} no tiene ítems.")
+
+    quote_ids: list[int] = []
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            for q in quotes:
+                quote_ids.append(_insert_quote_cur(cur, **q))
+
+        with span("db.commit", quotes=len(quote_ids)):
+            conn.commit()
+
+    return quote_ids
+
+
+# Directorio de clientes (sql/006_clients.sql): la cotización queda ligada al
+# cliente de su client_key (utils.client_key), que se crea si no existe. Si ya
+# existe solo se lee (sin bloquear su fila: guardados simultáneos del mismo
+# cliente no se esperan); el email se escribe solo si el cliente no tenía.
+# Sin nombre ni empresa no se liga a ninguno.
+_CLIENT_CTE = """
+known as (
+  select id from clients where client_key = %(client_key)s
+),
+added as (
+  insert into clients (client_key, name, email, company)
+  select %(client_key)s, %(client_name)s, %(client_email)s, %(client_company)s
+  where %(client_key)s <> '' and not exists (select 1 from known)
+  on conflict (client_key) do update set updated_at = clients.updated_at
+  returning id
+),
+client_filled as (
+  update clients set email = %(client_email)s, updated_at = now()
+  where client_key = %(client_key)s and email = '' and %(client_email)s <> ''
+),
+client as (
+  select id from known
+  union all
+  select id from added
+)"""
+
+_INSERT_QUOTE_SQL = "with" + _CLIENT_CTE + """
+insert into quotes(
+  year, seq, quote_number, issue_date,
+  brand_name, brand_email, brand_phone,
+  client_name, client_email, client_company, client_id,
+  discount_pct, notes, validity_days,
+  subtotal, discount_amount, neto, iva_amount, total
+)
+values (
+  %(year)s, %(seq)s, %(quote_number)s, %(issue_date)s,
+  %(brand_name)s, %(brand_email)s, %(brand_phone)s,
+  %(client_name)s, %(client_email)s, %(client_company)s, (select id from client),
+  %(discount_pct)s, %(notes)s, %(validity_days)s,
+  %(subtotal)s, %(discount_amount)s, %(neto)s, %(iva_amount)s, %(total)s
+)
+returning id;
+"""
+
+_INSERT_ITEMS_SQL = """
+insert into quote_items(quote_id, description, qty, unit_price)
+values (%s, %s, %s, %s)
+"""
+
+
+def _insert_quote_cur(
+    cur: psycopg.Cursor,
+    *,
+    year: int,
+    seq: int,
+    quote_number: str,
+    issue_date: date,
+    brand_name: str,
+    brand_email: str,
+    brand_phone: str,
+    client_name: str,
+    client_email: str,
+    client_company: str,
+    discount_pct: Decimal,
+    notes: str,
+    validity_days: int,
+    items: Sequence[QuoteItem],
+) -> int:
+    """
+    Cabecera (con totales) + ítems con un cursor ya abierto (sin commit). Retorna quote_id.
+    """
+    with span("db.prepare_items", items=len(items)):
+        values, totals = _prepare_items(items, discount_pct)
+
+    # 1) Insert cabecera
+    with span("db.insert.header"):
+        cur.execute(
+            _INSERT_QUOTE_SQL,
+            {
+                "year": year,
+                "seq": seq,
+                "quote_number": quote_number,
+                "issue_date": issue_date,
+                "brand_name": brand_name,
+                "brand_email": brand_email,
+                "brand_phone": brand_phone,
+                "client_name": client_name,
+                "client_email": client_email,
+                "client_company": client_company,
+                "client_key": client_key(client_name, client_company),
+                "discount_pct": discount_pct,
+                "notes": notes,
+                "validity_days": validity_days,
+                **totals,
+            },
+        )
+        row = cur.fetchone()
+    if not row:
+        raise RuntimeError("No se pudo insertar la cotización (fetchone vacío).")
+    quote_id = int(row[0])
+
+    # 2) Insert items (executemany, o COPY si la cotización es grande)
+    with span("db.insert.items", items=len(values)):
+        if len(items) > _copy_threshold():
+            _copy_quote_items(cur, quote_id, values)
+        else:
+            cur.executemany(_INSERT_ITEMS_SQL, [(quote_id, *v) for v in values])
+
+    return quote_id
+
+
+# Un solo statement: correlativo + cabecera + ítems (CTEs que modifican datos).
+# El número se arma en SQL igual que en Python: f"{year}-{seq:04d}".
+# El CTE "counter" entrega el correlativo: upsert en quote_counters (estrategia "row")
+# o un número ya reservado por el proceso en un bloque (estrategia "block").
+_COUNTER_CTE_UPSERT = """
+counter as (
+  insert into quote_counters(year, last_seq)
+  values (%(year)s, 1)
+  on conflict (year)
+  do update set last_seq = quote_counters.last_seq + 1
+  returning last_seq
+)"""
+
+_COUNTER_CTE_LEASED = """
+counter as (
+  select %(seq)s::int as last_seq
+)"""
+
+_HEADER_CTE = """
+header as (
+  insert into quotes(
+    year, seq, quote_number, issue_date,
+    brand_name, brand_email, brand_phone,
+    client_name, client_email, client_company, client_id,
+    discount_pct, notes, validity_days,
+    subtotal, discount_amount, neto, iva_amount, total
+  )
+  select
+    %(year)s,
+    counter.last_seq,
+    %(year)s::text || '-' || lpad(counter.last_seq::text, greatest(4, length(counter.last_seq::text)), '0'),
+    %(issue_date)s,
+    %(brand_name)s, %(brand_email)s, %(brand_phone)s,
+    %(client_name)s, %(client_email)s, %(client_company)s, (select id from client),
+    %(discount_pct)s, %(notes)s, %(validity_days)s,
+    %(subtotal)s, %(discount_amount)s, %(neto)s, %(iva_amount)s, %(total)s
+  from counter
+  returning id, seq, quote_number
+)"""
+
+_LINES_CTE = """
+lines as (
+  insert into quote_items(quote_id, description, qty, unit_price)
+  select header.id, t.description, t.qty, t.unit_price
+  from header,
+       unnest(%(descriptions)s::text[], %(qtys)s::numeric[], %(unit_prices)s::numeric[])
+         with ordinality as t(description, qty, unit_price, ord)
+  order by t.ord
+)"""
+
+
+# Variante idempotente (diario local, journal.py): si el N° ya está guardado
+# (reintento de un envío que sí llegó) la cabecera no inserta nada y, por lo
+# tanto, tampoco los ítems.
+_HEADER_CTE_IDEMPOTENT = _HEADER_CTE.replace(
+    "  returning id, seq, quote_number", "  on conflict do nothing\n  returning id, seq, quote_number"
+)
+
+
+def _save_quote_sql(counter_cte: str, with_items: bool, header_cte: str = _HEADER_CTE) -> str:
+    ctes = [counter_cte, _CLIENT_CTE, header_cte] + ([_LINES_CTE] if with_items else [])
+    return "with" + ",".join(ctes) + "\nselect id, seq, quote_number from header;\n"
+
+
+_SAVE_QUOTE_SQL = _save_quote_sql(_COUNTER_CTE_UPSERT, with_items=True)
+_SAVE_LEASED_QUOTE_SQL = _save_quote_sql(_COUNTER_CTE_LEASED, with_items=True)
+# Variantes para cotizaciones grandes: solo correlativo + cabecera (los ítems van por COPY).
+_SAVE_QUOTE_HEADER_SQL = _save_quote_sql(_COUNTER_CTE_UPSERT, with_items=False)
+_SAVE_LEASED_QUOTE_HEADER_SQL = _save_quote_sql(_COUNTER_CTE_LEASED, with_items=False)
+_SAVE_JOURNALED_QUOTE_SQL = _save_quote_sql(_COUNTER_CTE_LEASED, with_items=True, header_cte=_HEADER_CTE_IDEMPOTENT)
+
+
+def _number_strategy() -> str:
+    """
+    Cómo se asignan correlativos al guardar (st.secrets QUOTE_NUMBER_STRATEGY):
+    - "row" (default): upsert en quote_counters dentro del mismo statement.
+      Orden estrictamente cronológico, pero cada guardado bloquea la fila del año.
+    - "block": el proceso reserva bloques de QUOTE_NUMBER_BLOCK_SIZE números
+      (un bloqueo por bloque) y los entrega localmente sin tocar quote_counters.
+    """
+    strategy = str(get_setting("QUOTE_NUMBER_STRATEGY", "row")).strip().lower()
+    if strategy not in ("row", "block"):
+        raise RuntimeError(f"QUOTE_NUMBER_STRATEGY inválida: {strategy!r} (usa 'row' o 'block')")
+    return strategy
+
+
+class _NumberLease:
+    """
+    Correlativos reservados en bloque por este proceso (estrategia "block").
+    Se entregan en orden ascendente; los de un guardado fallido vuelven a la
+    reserva, y los que sobren al cerrar el proceso se liberan/anulan.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._free: dict[int, list[int]] = {}
+        self._atexit_registered = False
+
+    def take(self, year: int) -> int:
+        with self._lock:
+            free = self._free.get(year)
+            if free:
+                return heapq.heappop(free)
+
+        block = reserve_quote_numbers(year, get_int_setting("QUOTE_NUMBER_BLOCK_SIZE", 20))
+        seqs = [seq for seq, _ in block]
+        with self._lock:
+            free = self._free.setdefault(year, [])
+            for seq in seqs[1:]:
+                heapq.heappush(free, seq)
+            if not self._atexit_registered:
+                # Se registra después del pool: atexit corre en orden inverso
+                atexit.register(self.release_all)
+                self._atexit_registered = True
+        return seqs[0]
+
+    def give_back(self, year: int, seq: int) -> None:
+        with self._lock:
+            heapq.heappush(self._free.setdefault(year, []), seq)
+
+    def peek(self, year: int) -> int | None:
+        with self._lock:
+            free = self._free.get(year)
+            return free[0] if free else None
+
+    def release_all(self) -> None:
+        with self._lock:
+            pending, self._free = self._free, {}
+        for year, seqs in pending.items():
+            if seqs:
+                release_quote_numbers(year, seqs, reason="bloque del proceso sin usar al cerrar")
+
+
+_lease = _NumberLease()
+
+
+def release_leased_numbers() -> None:
+    """
+    Libera/anula los correlativos que este proceso tiene reservados y sin usar
+    (estrategia "block"). Se llama sola al cerrar el proceso.
+    """
+    _lease.release_all()
+
+
+def allocate_quote_number(year: int) -> tuple[int, str]:
+    """
+    Asigna un correlativo según QUOTE_NUMBER_STRATEGY. Retorna (seq, "YYYY-0001").
+    Si finalmente no se usa, devolverlo con release_quote_numbers().
+    """
+    if _number_strategy() == "block":
+        seq = _lease.take(year)
+        return seq, f"{year}-{seq:04d}"
+    return next_quote_number(year)
+
+
+def save_quote(
+    *,
+    year: int,
+    issue_date: date,
+    brand_name: str,
+    brand_email: str,
+    brand_phone: str,
+    client_name: str,
+    client_email: str,
+    client_company: str,
+    discount_pct: Decimal,
+    notes: str,
+    validity_days: int,
+    items: Sequence[QuoteItem],
+) -> tuple[int, int, str]:
+    """
+    Asigna correlativo + inserta cotización + items en UNA transacción
+    y UN viaje de red (statement único + commit en pipeline).
+    Como el número se asigna recién al guardar, no se pierden correlativos
+    por cotizaciones que nunca se guardaron.
+    Sobre DB_COPY_THRESHOLD ítems, los ítems se envían por COPY binario
+    (misma transacción; ahí el costo es el volumen, no los viajes de red).
+    Retorna (quote_id, seq, "YYYY-0001").
+    """
+    if not items:
+        raise ValueError("No puedes guardar una cotización sin ítems.")
+
+    header = {
+        "year": year,
+        "issue_date": issue_date,
+        "brand_name": brand_name,
+        "brand_email": brand_email,
+        "brand_phone": brand_phone,
+        "client_name": client_name,
+        "client_email": client_email,
+        "client_company": client_company,
+        "client_key": client_key(client_name, client_company),
+        "discount_pct": discount_pct,
+        "notes": notes,
+        "validity_days": validity_days,
+    }
+
+    if _number_strategy() != "block":
+        return _execute_save(header, items, _SAVE_QUOTE_SQL, _SAVE_QUOTE_HEADER_SQL)
+
+    header["seq"] = _lease.take(year)
+    try:
+        return _execute_save(header, items, _SAVE_LEASED_QUOTE_SQL, _SAVE_LEASED_QUOTE_HEADER_SQL)
+    except psycopg.errors.UniqueViolation:
+        # El número ya quedó usado: no se devuelve a la reserva
+        raise
+    except Exception:
+        _lease.give_back(year, header["seq"])
+        raise
+
+
+def _execute_save(
+    header: dict[str, Any],
+    items: Sequence[QuoteItem],
+    sql: str,
+    header_sql: str,
+) -> tuple[int, int, str]:
+    with span("db.prepare_items", items=len(items)):
+        values, totals = _prepare_items(items, header["discount_pct"])
+    header = {**header, **totals}
+    if len(values) > _copy_threshold():
+        return _save_quote_bulk(header, values, header_sql)
+
+    params = _statement_params(header, values)
+
+    with get_conn() as conn:
+        # Correlativo + cabecera + ítems + commit: un statement, un viaje
+        with span("db.save.statement", items=len(values)), conn.pipeline():
+            cur = conn.cursor()
+            cur.execute(sql, params)
+            conn.commit()
+        # Al salir del pipeline ya se sincronizó (execute + commit en un solo envío).
+        row = cur.fetchone()
+        if not row:
+            raise RuntimeError("No se pudo guardar la cotización (fetchone vacío).")
+
+    return int(row[0]), int(row[1]), str(row[2])
+
+
+def _statement_params(header: Mapping[str, Any], values: Sequence[tuple[str, Decimal, Decimal]]) -> dict[str, Any]:
+    """Parámetros de _save_quote_sql(..., with_items=True): cabecera + ítems como arrays."""
+    return {
+        **header,
+        "descriptions": [v[0] for v in values],
+        "qtys": [v[1] for v in values],
+        "unit_prices": [v[2] for v in values],
+    }
+
+
+def save_journaled_quotes(quotes: Sequence[Mapping[str, Any]]) -> list[str]:
+    """
+    Guarda un lote de cotizaciones del diario local (journal.py) en UNA
+    transacción. Cada una trae su N° ya reservado (seq) y los mismos campos
+    que save_quote(). Es idempotente por quote_number: las que ya existen se
+    saltan. Retorna los N° que se insertaron ahora.
+    """
+    params = []
+    for q in quotes:
+        header = {k: v for k, v in q.items() if k != "items"}
+        header["client_key"] = client_key(header["client_name"], header["client_company"])
+        values, totals = _prepare_items(q["items"], header["discount_pct"])
+        params.append(_statement_params({**header, **totals}, values))
+
+    inserted: list[str] = []
+    with get_conn() as conn, span("db.journal_flush", quotes=len(params)):
+        with conn.cursor() as cur:
+            # executemany va en pipeline: un viaje por lote, un resultado por cotización
+            cur.executemany(_SAVE_JOURNALED_QUOTE_SQL, params, returning=True)
+            while True:
+                row = cur.fetchone()
+                if row:
+                    inserted.append(str(row[2]))
+                if not cur.nextset():
+                    break
+        conn.commit()
+    return inserted
+
+
+_JOURNAL_TEXT_FIELDS = (
+    "brand_name", "brand_email", "brand_phone", "client_name", "client_email", "client_company", "notes",
+)
+
+
+def journaled_quote_matches(quote: Mapping[str, Any]) -> bool:
+    """
+    True si el N° de una cotización del diario (year + seq) ya está en la base
+    con esta misma cotización (cabecera, totales e ítems): un envío anterior
+    sí alcanzó a llegar. False si no existe o si ese N° lo tiene otra
+    cotización (save_journaled_quotes la saltó sin guardarla).
+    """
+    stored = load_quote(f"{int(quote['year'])}-{int(quote['seq']):04d}")
+    if stored is None:
+        return False
+    values, totals = _prepare_items(quote["items"], quote["discount_pct"])
+    # discount_pct es numeric(5,2): se guarda redondeado a centésimos (mitades lejos de cero)
+    discount_pct = Decimal(quote["discount_pct"]).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    return (
+        stored.issue_date == quote["issue_date"]
+        and stored.discount_pct == discount_pct
+        and stored.validity_days == int(quote.get("validity_days") or 10)
+        and all(getattr(stored, f) == (quote.get(f) or "") for f in _JOURNAL_TEXT_FIELDS)
+        and stored.total == totals["total"]
+        and [(it.description, it.qty, it.unit_price) for it in stored.items] == values
+    )
+
+
+def _save_quote_bulk(
+    header: dict[str, Any],
+    values: Sequence[tuple[str, Decimal, Decimal]],
+    header_sql: str,
+) -> tuple[int, int, str]:
+    """
+    save_quote() para cotizaciones grandes: correlativo + cabecera en un statement,
+    ítems por COPY binario y un único commit (todo o nada).
+    """
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            with span("db.save.header"):
+                cur.execute(header_sql, header)
+                row = cur.fetchone()
             if not row:
-                raise RuntimeError("No se pudo insertar la cotización (fetchone vacío).")
+                raise RuntimeError("No se pudo guardar la cotización (fetchone vacío).")
             quote_id = int(row[0])
 
-            # 2) Insert items (executemany)
-            rows = [(quote_id, it.description, it.qty, it.unit_price) for it in items]
-            cur.executemany(
-                """
-                insert into quote_items(quote_id, description, qty, unit_price)
-                values (%s, %s, %s, %s)
-                """,
-                rows,
-            )
+            with span("db.save.copy_items", items=len(values)):
+                _copy_quote_items(cur, quote_id, values)
 
-        conn.commit()
+        with span("db.commit"):
+            conn.commit()
 
-    return quote_id
+    return quote_id, int(row[1]), str(row[2])
+
+
+# Historial: listado con paginación por cursor (keyset) sobre (year, seq).
+# Misma expresión que el índice de trigramas de sql/004_quote_search.sql.
+_CLIENT_SEARCH_EXPR = (
+    "(coalesce(client_name, '') || ' ' || coalesce(client_company, '') || ' ' || coalesce(client_email, ''))"
+)
+
+_has_trgm: bool | None = None
+
+
+@dataclass(frozen=True)
+class QuoteListRow:
+    """Fila del historial (solo cabecera y totales; los ítems se piden aparte)."""
+    id: int
+    year: int
+    seq: int
+    quote_number: str
+    issue_date: date
+    client_name: str
+    client_company: str
+    client_email: str
+    total: int | None
 
+
+def _trgm_available(cur: psycopg.Cursor) -> bool:
+    global _has_trgm
+    if _has_trgm is None:
+        cur.execute("select exists (select 1 from pg_extension where extname = 'pg_trgm')")
+        row = cur.fetchone()
+        _has_trgm = bool(row and row[0])
+    return _has_trgm
+
+
+def list_quotes(
+    *,
+    search: str = "",
+    after: tuple[int, int] | None = None,
+    limit: int = 25,
+) -> tuple[list[QuoteListRow], tuple[int, int] | None]:
+    """
+    Una página del historial, de la más reciente a la más antigua.
+    - search: texto en nombre/empresa/email del cliente (subcadena, o difusa
+      por similitud de palabras si pg_trgm está instalado).
+    - after: cursor (year, seq) de la última fila de la página anterior.
+    Retorna (filas, cursor de la página siguiente o None si no hay más).
+    Sin OFFSET: el costo de cada página no depende de cuán atrás se esté.
+    """
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            sql, params = _list_quotes_query(search, after, limit, bool(search.strip()) and _trgm_available(cur))
+            cur.execute(sql, params)
+            rows = [QuoteListRow(*r) for r in cur.fetchall()]
+    return _page(rows, limit)
+
+
+def _list_quotes_query(
+    search: str, after: tuple[int, int] | None, limit: int, trgm: bool
+) -> tuple[str, dict[str, Any]]:
+    """SQL + parámetros de list_quotes (pide limit + 1 filas para saber si hay otra página)."""
+    where = []
+    params: dict[str, Any] = {"limit": max(1, limit) + 1}
+
+    if after is not None:
+        where.append("(year, seq) < (%(after_year)s, %(after_seq)s)")
+        params["after_year"], params["after_seq"] = after
+
+    term = search.strip()
+    if term:
+        params["like"] = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        if trgm:
+            params["term"] = term
+            where.append(f"({_CLIENT_SEARCH_EXPR} ilike %(like)s or %(term)s <%% {_CLIENT_SEARCH_EXPR})")
+        else:
+            where.append(f"{_CLIENT_SEARCH_EXPR} ilike %(like)s")
+
+    sql = f"""
+    select id, year, seq, quote_number, issue_date,
+           coalesce(client_name, ''), coalesce(client_company, ''), coalesce(client_email, ''),
+           total
+    from quotes
+    {"where " + " and ".join(where) if where else ""}
+    order by year desc, seq desc
+    limit %(limit)s
+    """
+    return sql, params
+
+
+def _page(rows: list[QuoteListRow], limit: int) -> tuple[list[QuoteListRow], tuple[int, int] | None]:
+    limit = max(1, limit)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, (rows[-1].year, rows[-1].seq)
+    return rows, None
+
+
+_GET_ITEMS_SQL = "select description, qty, unit_price from quote_items where quote_id = %s order by id"
+
+
+def get_quote_items(quote_id: int) -> list[QuoteItem]:
+    """Ítems de una cotización, en el orden en que se guardaron."""
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(_GET_ITEMS_SQL, (quote_id,))
+            return [QuoteItem(description=d, qty=q, unit_price=p) for d, q, p in cur.fetchall()]
+
+
+# Reimpresión: cabecera + ítems en UN statement (ítems como arreglo JSON).
+# qty/unit_price viajan como texto para no pasar por float al decodificar el JSON.
+_STORED_QUOTE_SQL = """
+select q.id, q.year, q.seq, q.quote_number, q.issue_date,
+       coalesce(q.brand_name, ''), coalesce(q.brand_email, ''), coalesce(q.brand_phone, ''),
+       coalesce(q.client_name, ''), coalesce(q.client_email, ''), coalesce(q.client_company, ''),
+       q.discount_pct, coalesce(q.notes, ''), coalesce(q.validity_days, 10), q.total,
+       coalesce(
+         (select json_agg(json_build_array(i.description, i.qty::text, i.unit_price::text) order by i.id)
+          from quote_items i
+          where i.quote_id = q.id),
+         '[]'::json
+       )
+from quotes q
+"""
+
+
+@dataclass(frozen=True)
+class StoredQuote:
+    """Cotización guardada, lista para volver a generar su PDF."""
+    id: int
+    year: int
+    seq: int
+    quote_number: str
+    issue_date: date
+    brand_name: str
+    brand_email: str
+    brand_phone: str
+    client_name: str
+    client_email: str
+    client_company: str
+    discount_pct: Decimal
+    notes: str
+    validity_days: int
+    total: int | None
+    items: list[QuoteItem]
+
+    def pdf_kwargs(self, logo_path: str | None = None) -> dict[str, Any]:
+        """Argumentos para build_quote_pdf_bytes / cached_build_quote_pdf_bytes."""
+        return {
+            "quote_number": self.quote_number,
+            "issue_date": self.issue_date,
+            "brand_name": self.brand_name,
+            "brand_email": self.brand_email,
+            "brand_phone": self.brand_phone,
+            "client_name": self.client_name,
+            "client_email": self.client_email,
+            "client_company": self.client_company,
+            "items": self.items,
+            "discount_pct": self.discount_pct,
+            "notes": self.notes,
+            "validity_days": self.validity_days,
+            "logo_path": logo_path,
+        }
+
+
+def _stored_quote(row: Sequence[Any]) -> StoredQuote:
+    *header, raw_items = row
+    items = [QuoteItem(description=d, qty=Decimal(q), unit_price=Decimal(p)) for d, q, p in raw_items]
+    return StoredQuote(*header, items=items)
+
+
+def load_quote(quote_number: str) -> StoredQuote | None:
+    """Cabecera + ítems de una cotización en un solo viaje a la base. None si no existe."""
+    with get_conn() as conn, span("db.load_quote"):
+        with conn.cursor() as cur:
+            cur.execute(_STORED_QUOTE_SQL + "where q.quote_number = %s", (quote_number,))
+            row = cur.fetchone()
+    return _stored_quote(row) if row else None
+
+
+def iter_quotes(date_from: date, date_to: date, *, batch_size: int = 500) -> Iterator[StoredQuote]:
+    """
+    Cotizaciones con issue_date entre date_from y date_to (inclusive), en orden
+    de número. Usa un cursor del lado del servidor: se traen batch_size filas
+    por viaje y la memoria no depende del tamaño del rango.
+    """
+    with get_conn() as conn:
+        with conn.cursor(name="iter_quotes") as cur:
+            cur.itersize = batch_size
+            cur.execute(
+                _STORED_QUOTE_SQL + "where q.issue_date between %s and %s order by q.year, q.seq",
+                (date_from, date_to),
+            )
+            for row in cur:
+                yield _stored_quote(row)
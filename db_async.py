@@ -0,0 +1,449 @@
+"""
+Capa asyncio de db.py (psycopg async + AsyncConnectionPool), para procesos
+que hacen muchas operaciones independientes a la vez: migraciones, reimpresión
+masiva, integraciones que guardan cientos de cotizaciones.
+
+    async def main():
+        ids = await db_async.save_quotes(cotizaciones, concurrency=8)
+        quotes = await db_async.load_quotes(numeros)
+        await db_async.close_pool()
+
+    asyncio.run(main())
+
+Mismo SQL y mismas garantías que db.py (las sentencias se importan de ahí):
+cada operación es una transacción en una conexión del pool (commit al salir,
+rollback si hay error), el correlativo se asigna con el mismo upsert / bloque
+reservado, e insert_quotes() es todo o nada en una transacción.
+
+La concurrencia se acota con un semáforo (DB_ASYNC_CONCURRENCY, default =
+DB_POOL_MAX_SIZE): las tareas que exceden el límite esperan su turno en vez de
+agotar el timeout del pool. El pool es por event loop (se crea en el primer uso
+dentro del loop) y usa el mismo DSN (incluido el de db.get_pool(dsn)) y los
+mismos ajustes DB_POOL_* que db.get_pool().
+"""
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import date
+from decimal import Decimal
+from typing import Any, AsyncIterator, Awaitable, Iterable, Mapping, Sequence, TypeVar
+
+import psycopg
+from psycopg_pool import AsyncConnectionPool
+
+import db
+from db import QuoteListRow, StoredQuote
+from settings import get_int_setting
+from timing import span
+from utils import QuoteItem, client_key
+
+T = TypeVar("T")
+
+_pool: AsyncConnectionPool | None = None
+_pool_loop: asyncio.AbstractEventLoop | None = None
+_pool_lock: asyncio.Lock | None = None
+_limit: asyncio.Semaphore | None = None
+
+# Cachés de catálogo (no dependen del loop)
+_has_trgm: bool | None = None
+_item_copy_types: list[int] | None = None
+
+
+# -----------------------------
+# Pool y conexiones
+# -----------------------------
+def _max_size() -> int:
+    min_size = get_int_setting("DB_POOL_MIN_SIZE", 1)
+    return max(min_size, get_int_setting("DB_POOL_MAX_SIZE", 5))
+
+
+async def get_pool() -> AsyncConnectionPool:
+    """
+    Pool async del event loop actual, creado y abierto en el primer uso.
+    Un pool no se puede compartir entre loops: si cambia el loop (otro
+    asyncio.run()), se crea uno nuevo.
+    """
+    global _pool, _pool_loop, _pool_lock, _limit
+    loop = asyncio.get_running_loop()
+    if _pool is not None and _pool_loop is loop:
+        return _pool
+
+    if _pool_loop is not loop:
+        _pool, _pool_loop = None, loop
+        _pool_lock = asyncio.Lock()
+        _limit = None
+
+    assert _pool_lock is not None
+    async with _pool_lock:
+        if _pool is None:
+            min_size = get_int_setting("DB_POOL_MIN_SIZE", 1)
+            check = AsyncConnectionPool.check_connection if get_int_setting("DB_POOL_CHECK", 1) else None
+            pool = AsyncConnectionPool(
+                conninfo=db._conninfo(),
+                min_size=min_size,
+                max_size=_max_size(),
+                max_idle=float(get_int_setting("DB_POOL_MAX_IDLE", 300)),
+                timeout=float(get_int_setting("DB_POOL_TIMEOUT", 15)),
+                check=check,
+                name="cotizador-async",
+                open=False,
+            )
+            await pool.open()
+            _pool = pool
+    return _pool
+
+
+async def close_pool() -> None:
+    """Cierra el pool del loop actual. Llamarlo antes de que termine asyncio.run()."""
+    global _pool, _pool_loop, _limit
+    pool, _pool = _pool, None
+    _pool_loop = None
+    _limit = None
+    if pool is not None:
+        await pool.close()
+
+
+def _semaphore() -> asyncio.Semaphore:
+    global _limit
+    if _limit is None:
+        _limit = asyncio.Semaphore(max(1, get_int_setting("DB_ASYNC_CONCURRENCY", _max_size())))
+    return _limit
+
+
+@asynccontextmanager
+async def get_conn() -> AsyncIterator[psycopg.AsyncConnection]:
+    """
+    Conexión del pool con commit al salir (rollback si hubo error), como
+    db.get_conn(). Respeta el límite de concurrencia: a lo más
+    DB_ASYNC_CONCURRENCY conexiones tomadas a la vez por este proceso.
+    """
+    pool = await get_pool()
+    async with _semaphore():
+        with span("db.connect"):
+            conn = await pool.getconn()
+        try:
+            async with conn:
+                yield conn
+        finally:
+            await pool.putconn(conn)
+
+
+async def gather_limited(aws: Iterable[Awaitable[T]], limit: int | None = None) -> list[T]:
+    """
+    asyncio.gather con a lo más limit corrutinas en curso (además del límite
+    de conexiones de get_conn). Retorna los resultados en el orden de entrada;
+    el primer error se propaga y cancela las que aún no terminan.
+    """
+    gate = asyncio.Semaphore(max(1, limit)) if limit else None
+
+    async def run(aw: Awaitable[T]) -> T:
+        if gate is None:
+            return await aw
+        async with gate:
+            return await aw
+
+    tasks = [asyncio.ensure_future(run(aw)) for aw in aws]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+# -----------------------------
+# Correlativos
+# -----------------------------
+async def next_quote_number(year: int) -> tuple[int, str]:
+    """Como db.next_quote_number: siguiente correlativo del año, atómico. Retorna (seq, "YYYY-0001")."""
+    async with get_conn() as conn:
+        with span("db.counter_upsert"):
+            cur = await conn.execute(db._NEXT_NUMBER_SQL, (year,))
+            row = await cur.fetchone()
+    if not row:
+        raise RuntimeError("No se pudo obtener el correlativo (fetchone vacío).")
+    seq = int(row[0])
+    return seq, f"{year}-{seq:04d}"
+
+
+async def peek_next_quote_number(year: int) -> str:
+    """Como db.peek_next_quote_number: muestra el próximo N° sin consumirlo."""
+    async with get_conn() as conn:
+        cur = await conn.execute(db._PEEK_NUMBER_SQL, (year,))
+        row = await cur.fetchone()
+    seq = int(row[0]) if row else 1
+    return f"{year}-{seq:04d}"
+
+
+# -----------------------------
+# Inserción
+# -----------------------------
+async def _quote_items_copy_types(cur: psycopg.AsyncCursor) -> list[int]:
+    global _item_copy_types
+    if _item_copy_types is None:
+        await cur.execute(db._ITEM_COPY_TYPES_SQL, (list(db._ITEM_COPY_COLUMNS),))
+        _item_copy_types = db._copy_types_from(await cur.fetchall())
+    return _item_copy_types
+
+
+async def _copy_quote_items(
+    cur: psycopg.AsyncCursor, quote_id: int, values: Sequence[tuple[str, Decimal, Decimal]]
+) -> None:
+    types = await _quote_items_copy_types(cur)
+    async with cur.copy(db._ITEM_COPY_SQL) as copy:
+        copy.set_types(types)
+        for description, qty, unit_price in values:
+            await copy.write_row((quote_id, description, qty, unit_price))
+
+
+async def _insert_quote_cur(cur: psycopg.AsyncCursor, quote: Mapping[str, Any]) -> int:
+    """Cabecera + ítems de una cotización (argumentos de db.insert_quote), sin commit. Retorna quote_id."""
+    items = quote["items"]
+    with span("db.prepare_items", items=len(items)):
+        values, totals = db._prepare_items(items, quote["discount_pct"])
+
+    with span("db.insert.header"):
+        params = {**quote, **totals, "client_key": client_key(quote["client_name"], quote["client_company"])}
+        await cur.execute(db._INSERT_QUOTE_SQL, params)
+        row = await cur.fetchone()
+    if not row:
+        raise RuntimeError("No se pudo insertar la cotización (fetchone vacío).")
+    quote_id = int(row[0])
+
+    with span("db.insert.items", items=len(values)):
+        if len(values) > db._copy_threshold():
+            await _copy_quote_items(cur, quote_id, values)
+        else:
+            await cur.executemany(db._INSERT_ITEMS_SQL, [(quote_id, *v) for v in values])
+    return quote_id
+
+
+async def insert_quote(
+    *,
+    year: int,
+    seq: int,
+    quote_number: str,
+    issue_date: date,
+    brand_name: str,
+    brand_email: str,
+    brand_phone: str,
+    client_name: str,
+    client_email: str,
+    client_company: str,
+    discount_pct: Decimal,
+    notes: str,
+    validity_days: int,
+    items: Sequence[QuoteItem],
+) -> int:
+    """Como db.insert_quote: cotización + ítems en una transacción. Retorna quote_id."""
+    if not items:
+        raise ValueError("No puedes guardar una cotización sin ítems.")
+
+    quote = {
+        "year": year,
+        "seq": seq,
+        "quote_number": quote_number,
+        "issue_date": issue_date,
+        "brand_name": brand_name,
+        "brand_email": brand_email,
+        "brand_phone": brand_phone,
+        "client_name": client_name,
+        "client_email": client_email,
+        "client_company": client_company,
+        "discount_pct": discount_pct,
+        "notes": notes,
+        "validity_days": validity_days,
+        "items": items,
+    }
+    async with get_conn() as conn:
+        async with conn.cursor() as cur:
+            quote_id = await _insert_quote_cur(cur, quote)
+        with span("db.commit"):
+            await conn.commit()
+    return quote_id
+
+
+async def insert_quotes(quotes: Sequence[Mapping[str, Any]]) -> list[int]:
+    """
+    Como db.insert_quotes: varias cotizaciones (con N° ya reservado) en UNA
+    conexión y UNA transacción, todo o nada. Retorna los quote_id en orden.
+    """
+    for q in quotes:
+        if not q.get("items"):
+            raise ValueError(f"La cotización {q.get('quote_number', '')} no tiene ítems.")
+
+    quote_ids: list[int] = []
+    async with get_conn() as conn:
+        async with conn.cursor() as cur:
+            for q in quotes:
+                quote_ids.append(await _insert_quote_cur(cur, q))
+        with span("db.commit", quotes=len(quote_ids)):
+            await conn.commit()
+    return quote_ids
+
+
+async def save_quote(
+    *,
+    year: int,
+    issue_date: date,
+    brand_name: str,
+    brand_email: str,
+    brand_phone: str,
+    client_name: str,
+    client_email: str,
+    client_company: str,
+    discount_pct: Decimal,
+    notes: str,
+    validity_days: int,
+    items: Sequence[QuoteItem],
+) -> tuple[int, int, str]:
+    """
+    Como db.save_quote: correlativo + cabecera + ítems en una transacción
+    (un statement + commit en pipeline; COPY sobre DB_COPY_THRESHOLD ítems),
+    con la misma estrategia de numeración (QUOTE_NUMBER_STRATEGY).
+    Retorna (quote_id, seq, "YYYY-0001").
+    """
+    if not items:
+        raise ValueError("No puedes guardar una cotización sin ítems.")
+
+    header: dict[str, Any] = {
+        "year": year,
+        "issue_date": issue_date,
+        "brand_name": brand_name,
+        "brand_email": brand_email,
+        "brand_phone": brand_phone,
+        "client_name": client_name,
+        "client_email": client_email,
+        "client_company": client_company,
+        "client_key": client_key(client_name, client_company),
+        "discount_pct": discount_pct,
+        "notes": notes,
+        "validity_days": validity_days,
+    }
+
+    if db._number_strategy() != "block":
+        return await _execute_save(header, items, db._SAVE_QUOTE_SQL, db._SAVE_QUOTE_HEADER_SQL)
+
+    # La reserva por bloques es del proceso (compartida con db.py); puede ir a la base al agotarse
+    header["seq"] = await asyncio.to_thread(db._lease.take, year)
+    try:
+        return await _execute_save(header, items, db._SAVE_LEASED_QUOTE_SQL, db._SAVE_LEASED_QUOTE_HEADER_SQL)
+    except psycopg.errors.UniqueViolation:
+        # El número ya quedó usado: no se devuelve a la reserva
+        raise
+    except Exception:
+        db._lease.give_back(year, header["seq"])
+        raise
+
+
+async def _execute_save(
+    header: dict[str, Any],
+    items: Sequence[QuoteItem],
+    sql: str,
+    header_sql: str,
+) -> tuple[int, int, str]:
+    with span("db.prepare_items", items=len(items)):
+        values, totals = db._prepare_items(items, header["discount_pct"])
+    header = {**header, **totals}
+
+    async with get_conn() as conn:
+        if len(values) > db._copy_threshold():
+            async with conn.cursor() as cur:
+                with span("db.save.header"):
+                    await cur.execute(header_sql, header)
+                    row = await cur.fetchone()
+                if not row:
+                    raise RuntimeError("No se pudo guardar la cotización (fetchone vacío).")
+                with span("db.save.copy_items", items=len(values)):
+                    await _copy_quote_items(cur, int(row[0]), values)
+            with span("db.commit"):
+                await conn.commit()
+        else:
+            with span("db.save.statement", items=len(values)):
+                async with conn.pipeline():
+                    cur = conn.cursor()
+                    await cur.execute(sql, db._statement_params(header, values))
+                    await conn.commit()
+            row = await cur.fetchone()
+            if not row:
+                raise RuntimeError("No se pudo guardar la cotización (fetchone vacío).")
+
+    return int(row[0]), int(row[1]), str(row[2])
+
+
+async def save_quotes(
+    quotes: Sequence[Mapping[str, Any]], *, concurrency: int | None = None
+) -> list[tuple[int, int, str]]:
+    """
+    save_quote() de muchas cotizaciones en paralelo (cada una en su propia
+    transacción; argumentos sin year/seq asignado, como db.save_quote).
+    Retorna (quote_id, seq, N°) en el orden de entrada. Si una falla, se
+    propaga el error: las que ya terminaron quedan guardadas.
+    """
+    return await gather_limited((save_quote(**q) for q in quotes), concurrency)
+
+
+# -----------------------------
+# Lecturas
+# -----------------------------
+async def _trgm_available(cur: psycopg.AsyncCursor) -> bool:
+    global _has_trgm
+    if _has_trgm is None:
+        await cur.execute("select exists (select 1 from pg_extension where extname = 'pg_trgm')")
+        row = await cur.fetchone()
+        _has_trgm = bool(row and row[0])
+    return _has_trgm
+
+
+async def list_quotes(
+    *,
+    search: str = "",
+    after: tuple[int, int] | None = None,
+    limit: int = 25,
+) -> tuple[list[QuoteListRow], tuple[int, int] | None]:
+    """Como db.list_quotes: una página del historial (cursor keyset). Retorna (filas, cursor siguiente)."""
+    async with get_conn() as conn:
+        async with conn.cursor() as cur:
+            trgm = bool(search.strip()) and await _trgm_available(cur)
+            sql, params = db._list_quotes_query(search, after, limit, trgm)
+            await cur.execute(sql, params)
+            rows = [QuoteListRow(*r) for r in await cur.fetchall()]
+    return db._page(rows, limit)
+
+
+async def get_quote_items(quote_id: int) -> list[QuoteItem]:
+    """Ítems de una cotización, en el orden en que se guardaron."""
+    async with get_conn() as conn:
+        cur = await conn.execute(db._GET_ITEMS_SQL, (quote_id,))
+        return [QuoteItem(description=d, qty=q, unit_price=p) for d, q, p in await cur.fetchall()]
+
+
+async def load_quote(quote_number: str) -> StoredQuote | None:
+    """Como db.load_quote: cabecera + ítems en un viaje. None si no existe."""
+    async with get_conn() as conn:
+        with span("db.load_quote"):
+            cur = await conn.execute(db._STORED_QUOTE_SQL + "where q.quote_number = %s", (quote_number,))
+            row = await cur.fetchone()
+    return db._stored_quote(row) if row else None
+
+
+async def load_quotes(
+    quote_numbers: Sequence[str], *, concurrency: int | None = None
+) -> list[StoredQuote | None]:
+    """load_quote() de varios N° en paralelo; None en los que no existen. Mismo orden de entrada."""
+    return await gather_limited((load_quote(qn) for qn in quote_numbers), concurrency)
+
+
+async def iter_quotes(date_from: date, date_to: date, *, batch_size: int = 500) -> AsyncIterator[StoredQuote]:
+    """Como db.iter_quotes: cursor del lado del servidor, batch_size filas por viaje."""
+    async with get_conn() as conn:
+        async with conn.cursor(name="iter_quotes") as cur:
+            cur.itersize = batch_size
+            await cur.execute(
+                db._STORED_QUOTE_SQL + "where q.issue_date between %s and %s order by q.year, q.seq",
+                (date_from, date_to),
+            )
+            async for row in cur:
+                yield db._stored_quote(row)
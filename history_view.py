@@ -0,0 +1,149 @@
+"""
+Vista "Historial" de la app: cotizaciones guardadas, más recientes primero.
+
+Pagina con cursor (db.list_quotes) y guarda en session_state la pila de
+cursores para volver atrás. Los ítems de una cotización se consultan solo
+cuando se despliegan; ahí también se puede reimprimir su PDF (trabajo
+"pdf:<N°>" en la cola de jobs.py, con progreso y descarga de job_view.py).
+Arriba se listan las cotizaciones del diario local (journal.py) que aún no
+llegan a la base.
+"""
+from __future__ import annotations
+
+import streamlit as st
+
+from db import get_quote_items, list_quotes
+from job_view import render_job, timings_requested
+from jobs import get_job_queue, render_stored
+from journal import get_journal
+from utils import QuoteItem, money_clp
+
+PAGE_SIZE = 25
+LOGO_PATH = "assets/logo.jpg"
+
+KEY_SEARCH = "hist_search"
+KEY_CURSORS = "hist_cursors"  # cursor de inicio de cada página visitada (None = primera)
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def cached_quote_items(quote_id: int) -> list[QuoteItem]:
+    """Las cotizaciones guardadas no cambian: los ítems se pueden cachear."""
+    return get_quote_items(quote_id)
+
+
+def _reset_pages() -> None:
+    st.session_state[KEY_CURSORS] = [None]
+
+
+def _render_pending() -> None:
+    """Cotizaciones del diario local que aún no llegan a la base (no salen en el listado)."""
+    journal = get_journal()
+    if journal is None:
+        return
+    entries = journal.pending()
+    if not entries:
+        return
+
+    with st.expander(f"Por sincronizar con la base de datos ({len(entries)})", expanded=True):
+        st.dataframe(
+            [
+                {
+                    "N°": e.quote_number,
+                    "Fecha": f"{e.issue_date:%d-%m-%Y}",
+                    "Cliente": e.client_name,
+                    "Ítems": e.items,
+                    "Intentos": e.attempts,
+                    "Último error": e.last_error,
+                }
+                for e in entries
+            ],
+            hide_index=True,
+            use_container_width=True,
+        )
+        if st.button("Reintentar ahora", key="hist_journal_retry"):
+            journal.retry_now()
+            st.rerun()
+
+
+def render_history() -> None:
+    st.title("Historial de cotizaciones")
+
+    if not st.secrets.get("DATABASE_URL"):
+        st.warning("Falta DATABASE_URL en Secrets: no hay historial disponible.")
+        return
+
+    _render_pending()
+
+    if KEY_CURSORS not in st.session_state:
+        _reset_pages()
+
+    st.text_input(
+        "Buscar cliente",
+        key=KEY_SEARCH,
+        placeholder="Nombre, empresa o email",
+        on_change=_reset_pages,
+    )
+
+    cursors = st.session_state[KEY_CURSORS]
+    try:
+        rows, next_cursor = list_quotes(
+            search=st.session_state.get(KEY_SEARCH, ""),
+            after=cursors[-1],
+            limit=PAGE_SIZE,
+        )
+    except Exception as e:
+        st.error("No se pudo leer el historial.")
+        st.exception(e)
+        return
+
+    if not rows:
+        st.info("No hay cotizaciones que coincidan.")
+
+    for row in rows:
+        with st.container(border=True):
+            c1, c2, c3 = st.columns([1.3, 3, 1.5])
+            c1.markdown(f"**{row.quote_number}**  \n{row.issue_date:%d-%m-%Y}")
+            client = " · ".join(v for v in (row.client_name, row.client_company, row.client_email) if v)
+            c2.write(client or "—")
+            c3.write(money_clp(row.total) if row.total is not None else "—")
+
+            if st.toggle("Ver ítems", key=f"hist_items_{row.id}"):
+                items = cached_quote_items(row.id)
+                st.dataframe(
+                    [
+                        {
+                            "Descripción": it.description,
+                            "Cantidad": f"{it.qty.normalize()}",
+                            "Precio unitario": money_clp(it.unit_price),
+                            "Total": money_clp(it.line_total),
+                        }
+                        for it in items
+                    ],
+                    hide_index=True,
+                    use_container_width=True,
+                )
+
+                job_state = f"hist_job_{row.id}"
+                if job_state in st.session_state:
+                    render_job(job_state, logo_path=LOGO_PATH, widget_prefix=f"hist_{row.id}")
+                elif st.button("Reimprimir PDF", key=f"hist_reprint_{row.id}"):
+                    job_key = f"pdf:{row.quote_number}"
+                    get_job_queue().submit(
+                        job_key,
+                        render_stored,
+                        row.quote_number,
+                        LOGO_PATH,
+                        retry_consumed=True,
+                        timed=timings_requested(),
+                    )
+                    st.session_state[job_state] = job_key
+                    st.rerun()
+
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    if col_prev.button("← Anterior", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    col_page.caption(f"Página {len(cursors)}")
+    if col_next.button("Siguiente →", disabled=next_cursor is None):
+        cursors.append(next_cursor)
+        st.rerun()
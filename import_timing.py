@@ -0,0 +1,129 @@
+"""
+Costo de importación por módulo (arranque en frío de la app).
+
+- timed_import(name): importa un módulo y registra cuánto tardó la primera
+  vez. app.py lo usa para db / pdf_generator, que se cargan recién al usarse
+  (después del login), así la pantalla de acceso no paga psycopg ni reportlab.
+- CLI: mide cada módulo en un intérprete nuevo (total y costo adicional con
+  streamlit ya cargado) y renderiza la pantalla de login para verificar que no
+  importe módulos pesados:
+
+    python import_timing.py
+    python import_timing.py --budget-ms 1500   # código 1 si el login tarda más
+"""
+from __future__ import annotations
+
+import argparse
+import importlib
+import os
+import subprocess
+import sys
+import threading
+import time
+from types import ModuleType
+from typing import Optional
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Módulos de la app, en orden aproximado de carga
+MODULES = (
+    "streamlit",
+    "settings",
+    "utils",
+    "totals",
+    "pdf_cache",
+    "db",
+    "pdf_generator",
+    "history_view",
+    "catalog",
+    "clients",
+)
+# No deben cargarse antes del login
+HEAVY_MODULES = ("reportlab", "psycopg", "psycopg_pool", "db", "pdf_generator")
+
+_times: dict[str, float] = {}
+_times_lock = threading.Lock()
+
+
+def timed_import(name: str) -> ModuleType:
+    """importlib.import_module(name), registrando la duración de la primera carga."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    t0 = time.perf_counter()
+    module = importlib.import_module(name)
+    elapsed = time.perf_counter() - t0
+    with _times_lock:
+        _times.setdefault(name, elapsed)
+    return module
+
+
+def import_times() -> dict[str, float]:
+    """Segundos que tomó cada timed_import() de este proceso (solo primeras cargas)."""
+    with _times_lock:
+        return dict(_times)
+
+
+# -----------------------------
+# Medición (CLI)
+# -----------------------------
+def _importtime_ms(module: str, preload: str = "") -> float:
+    """Costo acumulado de importar module en un intérprete nuevo (python -X importtime)."""
+    code = f"import {preload}; import {module}" if preload else f"import {module}"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=_HERE,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # Formato: "import time: self [us] | cumulative | imported package"
+    for line in reversed(proc.stderr.splitlines()):
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1]) / 1000
+    return 0.0
+
+
+def measure_login() -> tuple[float, list[str]]:
+    """Renderiza la pantalla de login (sin sesión). Retorna (segundos, módulos pesados cargados)."""
+    from streamlit.testing.v1 import AppTest
+
+    if _HERE not in sys.path:
+        sys.path.insert(0, _HERE)
+    before = set(sys.modules)
+    at = AppTest.from_file(os.path.join(_HERE, "app.py"), default_timeout=60)
+    t0 = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - t0
+    if at.exception:
+        raise RuntimeError(f"La pantalla de login falló: {at.exception[0].message}")
+    loaded = [m for m in HEAVY_MODULES if m in sys.modules and m not in before]
+    return elapsed, loaded
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Costo de importación por módulo y tiempo de la pantalla de login.")
+    parser.add_argument("--budget-ms", type=float, default=0, help="Tiempo máximo de la pantalla de login (0 = sin límite)")
+    args = parser.parse_args(argv)
+
+    print(f"{'módulo':<16} {'en frío':>10} {'+ streamlit':>12}")
+    for module in MODULES:
+        cold = _importtime_ms(module)
+        extra = cold if module == "streamlit" else _importtime_ms(module, preload="streamlit")
+        print(f"{module:<16} {cold:8.1f} ms {extra:9.1f} ms")
+
+    elapsed, loaded = measure_login()
+    print(f"\nPantalla de login: {elapsed * 1000:.1f} ms")
+    ok = True
+    if loaded:
+        print(f"  cargó módulos pesados antes del login: {', '.join(loaded)}")
+        ok = False
+    if args.budget_ms and elapsed * 1000 > args.budget_ms:
+        print(f"  supera el presupuesto de {args.budget_ms:.0f} ms")
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
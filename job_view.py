@@ -0,0 +1,121 @@
+"""
+Progreso y descarga de trabajos de jobs.py en la UI de Streamlit.
+
+Mientras el trabajo corre, un fragmento se refresca solo (run_every) sin
+volver a ejecutar la página; al terminar se redibuja la página una vez y se
+ofrece la descarga, que saca el PDF del almacén de resultados.
+"""
+from __future__ import annotations
+
+from typing import Callable, Optional
+
+import streamlit as st
+
+from jobs import DONE, FAILED, Job, get_job_queue, render_stored
+from timing import summarize
+
+POLL_SECONDS = 1.0
+KEY_SHOW_TIMINGS = "show_timings"  # toggle "Desglose de tiempos" de la barra lateral
+
+
+def timings_requested() -> bool:
+    """Si los trabajos que se encolen ahora deben guardar su desglose (submit(timed=...))."""
+    return bool(st.session_state.get(KEY_SHOW_TIMINGS))
+
+
+def render_timings(job: Job) -> None:
+    """Desglose por fase del trabajo (spans de timing.py) en la barra lateral."""
+    if not job.timings or not timings_requested():
+        return
+    phases = summarize(list(job.timings))
+    total_ms = (job.finished_at - job.created_at) * 1000 if job.finished_at else 0.0
+    with st.sidebar:
+        st.caption(f"Tiempos de {job.quote_number or job.key}: {total_ms:.0f} ms en total")
+        st.dataframe(
+            [{"Fase": phase, "ms": round(ms, 1), "Veces": n} for phase, ms, n in phases],
+            hide_index=True,
+            use_container_width=True,
+        )
+
+
+@st.fragment(run_every=POLL_SECONDS)
+def _poll(key: str) -> None:
+    job = get_job_queue().get(key)
+    if job is None or job.finished:
+        st.rerun(scope="app")
+    st.progress(job.progress, text=job.stage)
+
+
+def render_job(
+    state_key: str,
+    *,
+    logo_path: Optional[str] = None,
+    on_done: Optional[Callable[[Job], None]] = None,
+    done_message: Optional[Callable[[Job], str]] = None,
+    widget_prefix: str = "job",
+) -> Optional[Job]:
+    """
+    Muestra el trabajo cuya clave está en st.session_state[state_key].
+    on_done(job) se llama una sola vez por trabajo y estado final, en el primer
+    rerun en que se ve terminado (ej. limpiar cachés; un trabajo fallido que se
+    reintenta y termina bien lo llama de nuevo); done_message(job) es el texto de
+    éxito sobre el botón de descarga. Retorna el Job, o None si no hay.
+    """
+    key = st.session_state.get(state_key)
+    if not key:
+        return None
+
+    queue = get_job_queue()
+    job = queue.get(key)
+    if job is None:
+        # El proceso se reinició o el registro se podó
+        del st.session_state[state_key]
+        return None
+
+    if not job.finished:
+        _poll(key)
+        return job
+
+    render_timings(job)
+
+    seen_key = f"{widget_prefix}_seen"
+    seen = f"{key}:{job.status}"
+    if on_done is not None and st.session_state.get(seen_key) != seen:
+        st.session_state[seen_key] = seen
+        on_done(job)
+
+    if job.status == FAILED:
+        st.error(f"No se pudo completar: {job.error}")
+        if job.quote_number:
+            st.caption(f"La cotización quedó guardada con el N° {job.quote_number}: al reintentar solo se genera el PDF.")
+        return job
+
+    if done_message is not None:
+        st.success(done_message(job))
+    data = queue.peek_result(key)
+    if data is not None:
+        st.download_button(
+            label="Descargar PDF",
+            data=data,
+            file_name=job.filename,
+            mime="application/pdf",
+            key=f"{widget_prefix}_dl_{key}",
+            on_click=queue.take_result,
+            args=(key,),
+        )
+    elif job.status == DONE and job.quote_number:
+        st.caption("PDF ya descargado." if job.downloaded else "El PDF ya no está en memoria.")
+        if st.button("Generar de nuevo", key=f"{widget_prefix}_again_{key}"):
+            # Solo render: la cotización ya está guardada, no se asigna otro N°
+            new_key = f"pdf:{job.quote_number}"
+            queue.submit(
+                new_key,
+                render_stored,
+                job.quote_number,
+                logo_path,
+                retry_consumed=True,
+                timed=timings_requested(),
+            )
+            st.session_state[state_key] = new_key
+            st.rerun()
+    return job
@@ -0,0 +1,320 @@
+"""
+Cola de trabajos en segundo plano para guardar y renderizar cotizaciones.
+
+Un pool de hilos por proceso (compartido por todas las sesiones de Streamlit)
+ejecuta los trabajos fuera del hilo del script: la sesión no se bloquea y un
+rerun a mitad de camino no repite el trabajo, porque cada trabajo tiene una
+clave de idempotencia (enviar dos veces la misma clave retorna el mismo trabajo):
+- "pdf:<N° de cotización>" para reimprimir una cotización guardada.
+- "save:<borrador>:<hash del contenido>" para guardar + renderizar (el N° aún
+  no existe; se asigna al guardar y queda en job.quote_number). Si falla
+  después de guardar, reenviarlo solo renderiza: no se guarda otra vez.
+
+Los PDF terminados quedan en un almacén acotado por bytes hasta que se
+descargan (take_result) o hasta que trabajos más nuevos los desplacen.
+
+Ajustes opcionales en st.secrets (o entorno):
+JOBS_WORKERS (default 2), JOBS_RESULTS_MB (default 64), JOBS_MAX (default 500).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Optional, Sequence
+
+from timing import collect
+from timing import enabled as timing_enabled
+from utils import QuoteItem
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# report(progreso 0..1, etapa, **campos del Job) lo recibe cada trabajo para
+# informar avance; ej. report(0.5, "...", quote_number=qn) apenas se guarda
+Report = Callable[..., None]
+
+
+@dataclass(frozen=True)
+class Job:
+    """Estado de un trabajo (instantánea inmutable; get() retorna la última)."""
+    key: str
+    status: str = PENDING
+    progress: float = 0.0
+    stage: str = "En cola"
+    quote_number: str = ""
+    filename: str = ""
+    error: str = ""
+    result_bytes: int = 0
+    downloaded: bool = False
+    evicted: bool = False
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    timings: tuple[dict[str, Any], ...] = ()  # spans de timing.py (si se pidió timed)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+
+class JobQueue:
+    """Pool de hilos + registro de trabajos por clave + almacén de PDFs acotado."""
+
+    def __init__(self, workers: int = 2, max_result_bytes: int = 64 * 1024 * 1024, max_jobs: int = 500):
+        self.max_result_bytes = max_result_bytes
+        self.max_jobs = max_jobs
+
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="quote-job")
+        self._lock = threading.Lock()
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._results: OrderedDict[str, bytes] = OrderedDict()
+        self._result_bytes = 0
+
+    # -----------------------------
+    # API
+    # -----------------------------
+    def submit(
+        self,
+        key: str,
+        fn: Callable[..., tuple[dict[str, Any], bytes]],
+        *args: Any,
+        retry_consumed: bool = False,
+        timed: bool = False,
+    ) -> Job:
+        """
+        Encola fn(report, *args) bajo key, salvo que ya exista un trabajo con esa
+        clave que no haya fallado (en ese caso lo retorna sin volver a ejecutar).
+        Si el trabajo anterior falló después de informar su quote_number (ya
+        guardó), el nuevo lo conserva y fn recibe saved_as=<N°> para no
+        volver a guardar.
+        Con retry_consumed=True también se vuelve a ejecutar si el trabajo ya
+        terminó pero su PDF ya no está (descargado o desplazado): solo para
+        trabajos que se pueden repetir sin efectos (render, no guardado).
+        fn retorna (metadatos para Job, bytes del PDF). Con timed=True los spans
+        de timing.py del trabajo quedan en job.timings.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.status != FAILED:
+                consumed = job.status == DONE and key not in self._results
+                if not (retry_consumed and consumed):
+                    return job
+            saved_as = job.quote_number if job is not None and job.status == FAILED else ""
+            job = Job(key=key, quote_number=saved_as)
+            self._jobs[key] = job
+            self._jobs.move_to_end(key)
+            self._trim_jobs()
+
+        kwargs = {"saved_as": saved_as} if saved_as else {}
+        self._executor.submit(self._run, key, fn, args, kwargs, timed)
+        return job
+
+    def get(self, key: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(key)
+
+    def peek_result(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._results.get(key)
+
+    def take_result(self, key: str) -> Optional[bytes]:
+        """Entrega el PDF y lo saca del almacén (se marca como descargado)."""
+        with self._lock:
+            data = self._results.pop(key, None)
+            if data is not None:
+                self._result_bytes -= len(data)
+                job = self._jobs.get(key)
+                if job is not None:
+                    self._jobs[key] = replace(job, downloaded=True)
+            return data
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return {**counts, "results": len(self._results), "result_bytes": self._result_bytes}
+
+    # -----------------------------
+    # Internos
+    # -----------------------------
+    def _update(self, key: str, **changes: Any) -> None:
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                self._jobs[key] = replace(job, **changes)
+
+    def _run(
+        self,
+        key: str,
+        fn: Callable[..., tuple[dict[str, Any], bytes]],
+        args: tuple,
+        kwargs: dict[str, Any],
+        timed: bool,
+    ) -> None:
+        def report(progress: float, stage: str, **changes: Any) -> None:
+            self._update(key, progress=min(max(progress, 0.0), 1.0), stage=stage, **changes)
+
+        self._update(key, status=RUNNING, stage="Iniciando")
+        # collect() también marca los registros del sink con la clave del trabajo
+        measure = collect(key) if timed or timing_enabled() else nullcontext([])
+        with measure as records:
+            try:
+                meta, data = fn(report, *args, **kwargs)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            else:
+                error = ""
+        timings = tuple(records) if timed else ()
+
+        if error:
+            self._update(key, status=FAILED, stage="Error", error=error, finished_at=time.time(), timings=timings)
+            return
+
+        with self._lock:
+            self._store_result(key, data)
+            job = self._jobs.get(key)
+            if job is not None:
+                self._jobs[key] = replace(
+                    job,
+                    status=DONE,
+                    progress=1.0,
+                    stage="Listo",
+                    result_bytes=len(data),
+                    finished_at=time.time(),
+                    timings=timings,
+                    **meta,
+                )
+
+    def _store_result(self, key: str, data: bytes) -> None:
+        """Guarda el PDF desplazando los resultados más antiguos si no cabe (con lock)."""
+        if len(data) > self.max_result_bytes:
+            self._mark_evicted(key)
+            return
+        self._results[key] = data
+        self._result_bytes += len(data)
+        while self._result_bytes > self.max_result_bytes:
+            old_key, old = self._results.popitem(last=False)
+            self._result_bytes -= len(old)
+            self._mark_evicted(old_key)
+
+    def _mark_evicted(self, key: str) -> None:
+        job = self._jobs.get(key)
+        if job is not None:
+            self._jobs[key] = replace(job, evicted=True)
+
+    def _trim_jobs(self) -> None:
+        """Olvida los trabajos terminados más antiguos sobre max_jobs (con lock)."""
+        excess = len(self._jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        for key in [k for k, j in self._jobs.items() if j.finished][:excess]:
+            del self._jobs[key]
+            data = self._results.pop(key, None)
+            if data is not None:
+                self._result_bytes -= len(data)
+
+
+# Cola única por proceso (la comparten todas las sesiones de Streamlit)
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                from settings import get_int_setting
+
+                _queue = JobQueue(
+                    workers=get_int_setting("JOBS_WORKERS", 2),
+                    max_result_bytes=get_int_setting("JOBS_RESULTS_MB", 64) * 1024 * 1024,
+                    max_jobs=get_int_setting("JOBS_MAX", 500),
+                )
+    return _queue
+
+
+# -----------------------------
+# Trabajos
+# -----------------------------
+def save_job_key(draft_id: str, header: dict[str, Any], items: Sequence[QuoteItem]) -> str:
+    """Clave de idempotencia de un guardado: mismo borrador + mismo contenido = mismo trabajo."""
+    payload = {
+        "header": {k: str(v) for k, v in sorted(header.items())},
+        "items": [[it.description, str(it.qty), str(it.unit_price)] for it in items],
+    }
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return f"save:{draft_id}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()[:24]}"
+
+
+def save_and_render(
+    report: Report,
+    header: dict[str, Any],
+    items: Sequence[QuoteItem],
+    logo_path: Optional[str],
+    saved_as: str = "",
+) -> tuple[dict[str, Any], bytes]:
+    """
+    Guarda la cotización (asigna el N°) y genera su PDF. Con diario local
+    (JOURNAL_PATH) se guarda ahí y llega a la base en segundo plano.
+    El N° se informa al Job apenas se guarda: si el render falla, el
+    reintento llega con saved_as=<N°> y solo genera el PDF (mismo contenido,
+    misma clave), sin guardar otra cotización ni gastar otro correlativo.
+    """
+    from pdf_cache import cached_build_quote_pdf_bytes
+
+    if saved_as:
+        qn = saved_as
+    else:
+        from journal import get_journal
+
+        journal = get_journal()
+        if journal is not None:
+            report(0.1, "Guardando en el diario local")
+            _seq, qn = journal.save_quote(items=items, **header)
+        else:
+            from db import save_quote
+
+            report(0.1, "Guardando en la base de datos")
+            _quote_id, _seq, qn = save_quote(items=items, **header)
+
+    report(0.5, f"Generando PDF {qn}", quote_number=qn)
+    pdf_args = {k: v for k, v in header.items() if k != "year"}
+    data = cached_build_quote_pdf_bytes(quote_number=qn, items=items, logo_path=logo_path, **pdf_args)
+    return {"quote_number": qn, "filename": f"cotizacion_{qn}.pdf"}, data
+
+
+def render_stored(report: Report, quote_number: str, logo_path: Optional[str]) -> tuple[dict[str, Any], bytes]:
+    """
+    Regenera el PDF de una cotización guardada (clave "pdf:<N°>"). Con diario
+    local, una cotización que aún no llega a la base se lee del diario.
+    """
+    from journal import get_journal
+    from pdf_cache import cached_build_quote_pdf_bytes
+
+    report(0.1, "Leyendo cotización")
+    journal = get_journal()
+    pending = journal.pending_quote(quote_number) if journal is not None else None
+    if pending is not None:
+        items = pending.pop("items")
+        pdf_args = {k: v for k, v in pending.items() if k not in ("year", "seq")}
+        pdf_args.update(quote_number=quote_number, items=items, logo_path=logo_path)
+    else:
+        from db import load_quote
+
+        stored = load_quote(quote_number)
+        if stored is None:
+            raise LookupError(f"No existe la cotización {quote_number}")
+        pdf_args = stored.pdf_kwargs(logo_path)
+
+    report(0.4, f"Generando PDF {quote_number}")
+    data = cached_build_quote_pdf_bytes(**pdf_args)
+    return {"quote_number": quote_number, "filename": f"cotizacion_{quote_number}.pdf"}, data
@@ -0,0 +1,490 @@
+"""
+Diario local de guardados (SQLite en modo WAL): las cotizaciones no se pierden
+si Supabase está lento o caído.
+
+save_quote() escribe la cotización en el diario con un N° ya reservado y
+retorna de inmediato. Un hilo en segundo plano (flusher) la envía a Postgres
+en lotes (db.save_journaled_quotes), con reintentos y espera creciente si la
+base no responde. El envío es idempotente por quote_number: reintentar un lote
+que sí alcanzó a llegar no duplica nada. Si el N° ya lo tiene otra cotización
+en la base, la entrada no se da por enviada: queda pendiente con el error.
+
+Los N° salen de una reserva local (tabla numbers del diario) que se llena con
+db.reserve_quote_numbers mientras la base responde; con la base caída se puede
+seguir numerando hasta agotarla. Los números reservados que nunca se usen
+quedan explicados por su bloque en quote_number_blocks.
+
+Ajustes opcionales en st.secrets (o entorno):
+JOURNAL_PATH (archivo SQLite; vacío = sin diario, se guarda directo en la base),
+JOURNAL_RESERVE (default 20), JOURNAL_BATCH (default 50),
+JOURNAL_RETRY_MAX_SECONDS (default 300).
+
+Estado (código 1 si hay pendientes) y envío manual:
+    python journal.py
+    python journal.py --flush
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+from typing import Any, Optional, Sequence
+
+from utils import QuoteItem
+
+log = logging.getLogger(__name__)
+
+# Cotizaciones ya enviadas que se conservan en el diario (para auditoría)
+KEEP_FLUSHED_SECONDS = 7 * 24 * 3600
+IDLE_SECONDS = 5.0
+
+_SCHEMA = """
+create table if not exists entries (
+  quote_number    text    primary key,
+  year            integer not null,
+  seq             integer not null,
+  payload         text    not null,  -- JSON: cabecera + ítems
+  created_at      real    not null,
+  attempts        integer not null default 0,
+  next_attempt_at real    not null default 0,
+  last_error      text    not null default '',
+  flushed_at      real
+);
+create index if not exists entries_pending on entries (flushed_at, next_attempt_at);
+
+create table if not exists numbers (
+  year integer not null,
+  seq  integer not null,
+  primary key (year, seq)
+);
+"""
+
+
+@dataclass(frozen=True)
+class JournalEntry:
+    """Cotización del diario que aún no llega a Postgres."""
+    quote_number: str
+    client_name: str
+    issue_date: date
+    items: int
+    created_at: float
+    attempts: int
+    next_attempt_at: float
+    last_error: str
+
+
+# -----------------------------
+# Serialización (cabecera + ítems <-> JSON)
+# -----------------------------
+def _encode(header: dict[str, Any], items: Sequence[QuoteItem]) -> str:
+    payload = {
+        **header,
+        "issue_date": header["issue_date"].isoformat(),
+        "discount_pct": str(header["discount_pct"]),
+        "items": [[it.description, str(it.qty), str(it.unit_price)] for it in items],
+    }
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+def _decode(payload: str) -> dict[str, Any]:
+    data = json.loads(payload)
+    data["issue_date"] = date.fromisoformat(data["issue_date"])
+    data["discount_pct"] = Decimal(data["discount_pct"])
+    data["items"] = [QuoteItem(description=d, qty=Decimal(q), unit_price=Decimal(p)) for d, q, p in data["items"]]
+    return data
+
+
+def _is_connection_error(e: Exception) -> bool:
+    """Base caída / sin red / pool agotado (no tiene sentido reintentar uno por uno)."""
+    import psycopg
+
+    return isinstance(e, psycopg.OperationalError)
+
+
+class Journal:
+    """Diario SQLite + reserva local de correlativos + hilo que lo vacía hacia Postgres."""
+
+    def __init__(self, path: str, reserve_size: int = 20, batch_size: int = 50, retry_max_seconds: float = 300.0):
+        self.path = path
+        self.reserve_size = max(1, reserve_size)
+        self.batch_size = max(1, batch_size)
+        self.retry_max_seconds = retry_max_seconds
+        self.holder = f"journal@{socket.gethostname()}:{os.path.abspath(path)}"
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._years: set[int] = {date.today().year}
+        self._years_lock = threading.Lock()
+        self.loop_errors = 0
+        self.last_loop_error = ""
+
+        with self._connect() as conn:
+            conn.execute("pragma journal_mode=wal")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> closing[sqlite3.Connection]:
+        # Una conexión por operación (el diario se usa desde varios hilos y procesos),
+        # en autocommit: las transacciones se abren con "begin immediate"
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("pragma synchronous=full")
+        return closing(conn)
+
+    # -----------------------------
+    # Guardar
+    # -----------------------------
+    def save_quote(self, *, items: Sequence[QuoteItem], **header: Any) -> tuple[int, str]:
+        """
+        Mismos argumentos que db.save_quote(). Asigna un N° de la reserva local
+        y deja la cotización en el diario (durable al retornar); el envío a
+        Postgres queda para el flusher. Retorna (seq, "YYYY-0001").
+        """
+        if not items:
+            raise ValueError("No puedes guardar una cotización sin ítems.")
+        year = int(header["year"])
+        with self._years_lock:
+            self._years.add(year)
+
+        for _attempt in range(3):
+            with self._connect() as conn:
+                conn.execute("begin immediate")
+                row = conn.execute("select min(seq) from numbers where year = ?", (year,)).fetchone()
+                seq = row[0] if row else None
+                if seq is None:
+                    conn.execute("rollback")
+                else:
+                    quote_number = f"{year}-{seq:04d}"
+                    conn.execute("delete from numbers where year = ? and seq = ?", (year, seq))
+                    conn.execute(
+                        "insert into entries(quote_number, year, seq, payload, created_at) values (?, ?, ?, ?, ?)",
+                        (quote_number, year, seq, _encode({**header, "seq": seq}, items), time.time()),
+                    )
+                    conn.execute("commit")
+                    self._wake.set()
+                    return seq, quote_number
+
+            # Reserva vacía: pedir un bloque (requiere la base)
+            try:
+                self._refill(year)
+            except Exception as e:
+                raise RuntimeError(
+                    f"No quedan correlativos reservados para {year} y la base de datos no responde: {e}"
+                ) from e
+        raise RuntimeError(f"No se pudo asignar un correlativo del diario para {year}.")
+
+    def _refill(self, year: int) -> int:
+        """Reserva un bloque de correlativos en Postgres y lo agrega a la reserva local."""
+        from db import reserve_quote_numbers
+
+        block = reserve_quote_numbers(year, self.reserve_size, holder=self.holder)
+        with self._connect() as conn:
+            conn.executemany("insert or ignore into numbers(year, seq) values (?, ?)", [(year, s) for s, _ in block])
+        return len(block)
+
+    # -----------------------------
+    # Estado
+    # -----------------------------
+    def peek_number(self, year: int) -> Optional[str]:
+        """Próximo N° de la reserva local (referencial), o None si está vacía."""
+        with self._connect() as conn:
+            row = conn.execute("select min(seq) from numbers where year = ?", (year,)).fetchone()
+        return f"{year}-{row[0]:04d}" if row and row[0] is not None else None
+
+    def pending(self, limit: int = 100) -> list[JournalEntry]:
+        """Cotizaciones aún no enviadas, las más antiguas primero."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                select quote_number, payload, created_at, attempts, next_attempt_at, last_error
+                from entries where flushed_at is null
+                order by created_at limit ?
+                """,
+                (limit,),
+            ).fetchall()
+        out = []
+        for quote_number, payload, created_at, attempts, next_attempt_at, last_error in rows:
+            data = json.loads(payload)
+            out.append(
+                JournalEntry(
+                    quote_number=quote_number,
+                    client_name=data.get("client_name", ""),
+                    issue_date=date.fromisoformat(data["issue_date"]),
+                    items=len(data["items"]),
+                    created_at=created_at,
+                    attempts=attempts,
+                    next_attempt_at=next_attempt_at,
+                    last_error=last_error,
+                )
+            )
+        return out
+
+    def pending_quote(self, quote_number: str) -> Optional[dict[str, Any]]:
+        """
+        Cabecera (argumentos de save_quote + seq) e ítems de una cotización
+        que aún no llega a Postgres; None si no está en el diario o ya se envió.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "select payload from entries where quote_number = ? and flushed_at is null", (quote_number,)
+            ).fetchone()
+        return _decode(row[0]) if row else None
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Conteos del diario + errores del hilo de envío: loop_errors (total) y
+        last_loop_error (el de la última vuelta; vacío si terminó bien).
+        """
+        with self._connect() as conn:
+            pending, failing = conn.execute(
+                "select count(*), count(*) filter (where attempts > 0) from entries where flushed_at is null"
+            ).fetchone()
+            flushed = conn.execute("select count(*) from entries where flushed_at is not null").fetchone()[0]
+            reserved = conn.execute("select count(*) from numbers").fetchone()[0]
+        return {
+            "pending": pending,
+            "failing": failing,
+            "flushed": flushed,
+            "reserved": reserved,
+            "loop_errors": self.loop_errors,
+            "last_loop_error": self.last_loop_error,
+        }
+
+    def retry_now(self) -> None:
+        """Reintenta ya las pendientes (sin esperar su backoff)."""
+        with self._connect() as conn:
+            conn.execute("update entries set next_attempt_at = 0 where flushed_at is null")
+        self._wake.set()
+
+    # -----------------------------
+    # Envío a Postgres
+    # -----------------------------
+    def flush_once(self) -> tuple[int, int]:
+        """
+        Envía un lote de pendientes cuyo reintento ya venció. Retorna
+        (enviadas, fallidas). Si la base no responde, todo el lote espera.
+        Las que la base saltó porque su N° ya existía cuentan como enviadas
+        solo si lo guardado es esta misma cotización (ver _settle).
+        """
+        now = time.time()
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                select quote_number, payload, attempts from entries
+                where flushed_at is null and next_attempt_at <= ?
+                order by created_at limit ?
+                """,
+                (now, self.batch_size),
+            ).fetchall()
+        if not rows:
+            return 0, 0
+
+        from db import save_journaled_quotes
+
+        try:
+            inserted = save_journaled_quotes([_decode(payload) for _, payload, _ in rows])
+        except Exception as e:
+            if len(rows) == 1 or _is_connection_error(e):
+                self._mark_failed(rows, e)
+                return 0, len(rows)
+            # Error de datos en alguna: aislarla enviando una por una
+            sent = failed = 0
+            for row in rows:
+                try:
+                    inserted_one = save_journaled_quotes([_decode(row[1])])
+                except Exception as e_one:
+                    self._mark_failed([row], e_one)
+                    failed += 1
+                else:
+                    sent_one, failed_one = self._settle([row], inserted_one)
+                    sent += sent_one
+                    failed += failed_one
+            return sent, failed
+
+        return self._settle(rows, inserted)
+
+    def _settle(self, rows: Sequence[tuple], inserted: Sequence[str]) -> tuple[int, int]:
+        """
+        Marca como enviadas las filas insertadas ahora y, de las que la base
+        saltó (N° ya existente), las que ya estaban guardadas tal cual (un
+        envío anterior que sí llegó). Las demás quedan pendientes con error:
+        su N° lo tiene otra cotización. Retorna (enviadas, fallidas).
+        """
+        from db import journaled_quote_matches
+
+        done = set(inserted)
+        flushed: list[tuple] = []
+        failed = 0
+        for row in rows:
+            if row[0] in done or journaled_quote_matches(_decode(row[1])):
+                flushed.append(row)
+            else:
+                self._mark_failed(
+                    [row], ValueError(f"El N° {row[0]} ya existe en la base con otra cotización; no se guardó.")
+                )
+                failed += 1
+        self._mark_flushed(flushed)
+        return len(flushed), failed
+
+    def _mark_flushed(self, rows: Sequence[tuple]) -> None:
+        with self._connect() as conn:
+            conn.executemany(
+                "update entries set flushed_at = ?, last_error = '' where quote_number = ?",
+                [(time.time(), r[0]) for r in rows],
+            )
+
+    def _mark_failed(self, rows: Sequence[tuple], error: Exception) -> None:
+        now = time.time()
+        message = f"{type(error).__name__}: {error}"[:500]
+        with self._connect() as conn:
+            conn.executemany(
+                "update entries set attempts = ?, next_attempt_at = ?, last_error = ? where quote_number = ?",
+                [
+                    (r[2] + 1, now + min(self.retry_max_seconds, 2.0 ** (r[2] + 1)), message, r[0])
+                    for r in rows
+                ],
+            )
+
+    def _next_due(self) -> Optional[float]:
+        with self._connect() as conn:
+            row = conn.execute("select min(next_attempt_at) from entries where flushed_at is null").fetchone()
+        return row[0] if row else None
+
+    def _maintain(self) -> None:
+        """Rellena la reserva de los años en uso y olvida envíos antiguos."""
+        with self._years_lock:
+            years = sorted(self._years)
+        with self._connect() as conn:
+            counts = dict(conn.execute("select year, count(*) from numbers group by year").fetchall())
+            conn.execute(
+                "delete from entries where flushed_at is not null and flushed_at < ?",
+                (time.time() - KEEP_FLUSHED_SECONDS,),
+            )
+        for year in years:
+            if counts.get(year, 0) <= self.reserve_size // 2:
+                self._refill(year)
+
+    # -----------------------------
+    # Hilo de envío
+    # -----------------------------
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="quote-journal", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def _record_loop_error(self, e: Exception) -> None:
+        """Se cuenta en stats(); la base caída es esperable, el resto va al log con traceback."""
+        self.loop_errors += 1
+        self.last_loop_error = f"{type(e).__name__}: {e}"[:500]
+        if _is_connection_error(e):
+            log.warning("Diario %s: la base no responde (%s)", self.path, self.last_loop_error)
+        else:
+            log.exception("Error en el hilo del diario %s", self.path)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            failed = 0
+            try:
+                while not self._stop.is_set():
+                    sent, failed = self.flush_once()
+                    if not sent or failed:
+                        break
+                if not failed:
+                    self._maintain()
+                self.last_loop_error = ""
+            except Exception as e:  # base caída, diario bloqueado por otro proceso o un error nuestro: próxima vuelta
+                self._record_loop_error(e)
+
+            try:
+                due = self._next_due()
+            except Exception as e:
+                self._record_loop_error(e)
+                due = None
+            wait = IDLE_SECONDS if due is None else min(IDLE_SECONDS, max(0.05, due - time.time()))
+            self._wake.wait(wait)
+            self._wake.clear()
+
+
+# Diario único por proceso (None si JOURNAL_PATH no está configurado)
+_journal: Optional[Journal] = None
+_journal_lock = threading.Lock()
+
+
+def get_journal() -> Optional[Journal]:
+    global _journal
+    if _journal is None:
+        from settings import get_int_setting, get_setting
+
+        path = get_setting("JOURNAL_PATH")
+        if not path:
+            return None
+        with _journal_lock:
+            if _journal is None:
+                journal = Journal(
+                    str(path),
+                    reserve_size=get_int_setting("JOURNAL_RESERVE", 20),
+                    batch_size=get_int_setting("JOURNAL_BATCH", 50),
+                    retry_max_seconds=get_int_setting("JOURNAL_RETRY_MAX_SECONDS", 300),
+                )
+                journal.start()
+                _journal = journal
+    return _journal
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Estado y envío del diario local de cotizaciones.")
+    parser.add_argument("--path", help="archivo del diario (default: JOURNAL_PATH)")
+    parser.add_argument("--flush", action="store_true", help="enviar ahora todas las pendientes")
+    args = parser.parse_args(argv)
+
+    if args.path:
+        journal = Journal(args.path)
+    else:
+        from settings import get_setting
+
+        path = get_setting("JOURNAL_PATH")
+        if not path:
+            parser.error("falta --path o JOURNAL_PATH")
+        journal = Journal(str(path))
+
+    if args.flush:
+        journal.retry_now()
+        total_sent = 0
+        while True:
+            sent, failed = journal.flush_once()
+            total_sent += sent
+            if not sent or failed:
+                break
+        print(f"Enviadas: {total_sent}")
+
+    stats = journal.stats()
+    print(
+        f"Pendientes: {stats['pending']} ({stats['failing']} con error) · "
+        f"enviadas: {stats['flushed']} · N° reservados: {stats['reserved']}"
+    )
+    for entry in journal.pending():
+        error = f" · {entry.last_error}" if entry.last_error else ""
+        print(f"  {entry.quote_number}  {entry.client_name}  {entry.items} ítems  intentos {entry.attempts}{error}")
+    return 1 if stats["pending"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
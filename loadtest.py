@@ -0,0 +1,217 @@
+"""
+Prueba de carga de asignación de correlativos y guardado de cotizaciones.
+
+Simula N sesiones concurrentes (hilos, como las sesiones de Streamlit en un
+mismo proceso) contra un Postgres local desechable y reporta throughput y
+latencias p50/p99 por estrategia de numeración (QUOTE_NUMBER_STRATEGY):
+
+    python loadtest.py --pg-url "postgresql://postgres@localhost:5432/postgres?sslmode=disable" \\
+        --sessions 32 --ops 50 --mode save --strategy row --strategy block
+
+Con --engine async las sesiones son tareas asyncio sobre db_async.py (un
+solo hilo) en vez de hilos sobre db.py.
+
+Al final verifica que los números guardados sean únicos por año.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+from typing import Any, Optional
+
+from bench import make_items, throwaway_database
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def _header(year: int) -> dict[str, Any]:
+    return dict(
+        issue_date=date(year, 6, 30),
+        brand_name="HIDRACODE SOLUTIONS",
+        brand_email="contacto.hidracode@gmail.com",
+        brand_phone="+56 9 4075 2095",
+        client_name="Cliente Carga",
+        client_email="carga@example.com",
+        client_company="Carga SpA",
+        discount_pct=Decimal("0"),
+        notes="",
+        validity_days=10,
+    )
+
+
+def run_load(*, mode: str, sessions: int, ops: int, items_per_quote: int, year: int) -> dict[str, Any]:
+    """Corre la carga con la configuración actual de db.py; retorna métricas."""
+    import db
+
+    items = make_items(items_per_quote)
+    header = _header(year)
+
+    latencies: list[float] = []
+    numbers: list[str] = []
+    errors: list[str] = []
+    lock = threading.Lock()
+    start_gate = threading.Barrier(sessions)
+
+    def session() -> None:
+        local_lat: list[float] = []
+        local_numbers: list[str] = []
+        start_gate.wait()
+        for _ in range(ops):
+            t0 = time.perf_counter()
+            try:
+                if mode == "allocate":
+                    _seq, qn = db.allocate_quote_number(year)
+                else:
+                    _id, _seq, qn = db.save_quote(year=year, items=items, **header)
+            except Exception as e:  # se reporta, no corta la prueba
+                with lock:
+                    errors.append(repr(e))
+                continue
+            local_lat.append(time.perf_counter() - t0)
+            local_numbers.append(qn)
+        with lock:
+            latencies.extend(local_lat)
+            numbers.extend(local_numbers)
+
+    threads = [threading.Thread(target=session, name=f"session-{i}") for i in range(sessions)]
+    t_start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t_start
+    return _metrics(mode, sessions, ops, latencies, numbers, errors, elapsed)
+
+
+def run_load_async(*, mode: str, sessions: int, ops: int, items_per_quote: int, year: int) -> dict[str, Any]:
+    """Como run_load, con sesiones asyncio sobre db_async.py."""
+    import db_async
+
+    items = make_items(items_per_quote)
+    header = _header(year)
+
+    latencies: list[float] = []
+    numbers: list[str] = []
+    errors: list[str] = []
+
+    async def session() -> None:
+        for _ in range(ops):
+            t0 = time.perf_counter()
+            try:
+                if mode == "allocate":
+                    _seq, qn = await db_async.next_quote_number(year)
+                else:
+                    _id, _seq, qn = await db_async.save_quote(year=year, items=items, **header)
+            except Exception as e:  # se reporta, no corta la prueba
+                errors.append(repr(e))
+                continue
+            latencies.append(time.perf_counter() - t0)
+            numbers.append(qn)
+
+    async def main() -> float:
+        await db_async.get_pool()
+        t_start = time.perf_counter()
+        try:
+            await asyncio.gather(*(session() for _ in range(sessions)))
+        finally:
+            elapsed = time.perf_counter() - t_start
+            await db_async.close_pool()
+        return elapsed
+
+    elapsed = asyncio.run(main())
+    return _metrics(mode, sessions, ops, latencies, numbers, errors, elapsed)
+
+
+def _metrics(
+    mode: str,
+    sessions: int,
+    ops: int,
+    latencies: list[float],
+    numbers: list[str],
+    errors: list[str],
+    elapsed: float,
+) -> dict[str, Any]:
+    return {
+        "mode": mode,
+        "sessions": sessions,
+        "ops_per_session": ops,
+        "completed": len(latencies),
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "elapsed_s": elapsed,
+        "throughput_ops_s": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "unique_numbers": len(set(numbers)) == len(numbers),
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Prueba de carga de correlativos/guardado contra Postgres local.")
+    parser.add_argument("--pg-url", required=True, help="Postgres local desechable (se usa un schema temporal)")
+    parser.add_argument("--sessions", type=int, default=16, help="Sesiones concurrentes (default: 16)")
+    parser.add_argument("--ops", type=int, default=50, help="Operaciones por sesión (default: 50)")
+    parser.add_argument("--mode", choices=("allocate", "save"), default="save", help="Solo asignar número o guardar cotización")
+    parser.add_argument("--items", type=int, default=5, help="Ítems por cotización en modo save (default: 5)")
+    parser.add_argument("--strategy", choices=("row", "block"), action="append", help="Estrategias a comparar (default: ambas)")
+    parser.add_argument("--block-size", type=int, default=20, help="QUOTE_NUMBER_BLOCK_SIZE para la estrategia block")
+    parser.add_argument("--engine", choices=("threads", "async"), default="threads", help="Hilos sobre db.py o asyncio sobre db_async.py")
+    parser.add_argument("--out", help="Escribe los resultados en este JSON")
+    args = parser.parse_args(argv)
+
+    sessions = max(1, args.sessions)
+    # Una conexión por sesión: la contención que se mide es la del correlativo, no la del pool
+    os.environ["DB_POOL_MIN_SIZE"] = str(sessions)
+    os.environ["DB_POOL_MAX_SIZE"] = str(sessions)
+    os.environ["QUOTE_NUMBER_BLOCK_SIZE"] = str(max(1, args.block_size))
+    os.environ["DB_ASYNC_CONCURRENCY"] = str(sessions)
+    runner = run_load_async if args.engine == "async" else run_load
+
+    results = []
+    for year_offset, strategy in enumerate(args.strategy or ["row", "block"]):
+        os.environ["QUOTE_NUMBER_STRATEGY"] = strategy
+        with throwaway_database(args.pg_url):
+            res = runner(
+                mode=args.mode,
+                sessions=sessions,
+                ops=max(1, args.ops),
+                items_per_quote=max(1, args.items),
+                year=2030 + year_offset,
+            )
+            import db
+
+            db.release_leased_numbers()
+        res["strategy"] = strategy
+        res["engine"] = args.engine
+        results.append(res)
+        print(
+            f"{strategy:<6} {res['mode']:<8} {res['completed']:>6} ops  "
+            f"{res['throughput_ops_s']:8.1f} ops/s  p50 {res['p50_ms']:7.2f} ms  p99 {res['p99_ms']:7.2f} ms  "
+            f"errores {res['errors']}  únicos {'sí' if res['unique_numbers'] else 'NO'}",
+            file=sys.stderr,
+        )
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump({"results": results}, fh, indent=2, ensure_ascii=False)
+
+    return 0 if all(r["unique_numbers"] and not r["errors"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,300 @@
+"""
+Caché de PDFs de cotización direccionada por contenido.
+
+La clave es un hash canónico de TODO lo que influye en el PDF (ítems, descuento,
+notas, marca, cliente, validez, digest del archivo de logo y versión del
+código de render). Mismos datos -> mismos bytes, sin volver a renderizar.
+
+Dos niveles:
+- memoria (LRU por tamaño en bytes, compartida por todas las sesiones del proceso)
+- disco (opcional, sobrevive reinicios; se poda por tamaño, los más antiguos primero)
+
+Ajustes opcionales en st.secrets (o entorno):
+PDF_CACHE_MEMORY_MB (default 64), PDF_CACHE_DIR (sin valor = sin disco),
+PDF_CACHE_DISK_MB (default 512).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Optional, Sequence
+
+from timing import span
+from totals import to_cents
+from utils import QuoteItem
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+# Si cambia el código de render, cambian las claves (no se sirven PDFs viejos desde disco).
+_RENDER_SOURCES = ("pdf_generator.py", "utils.py", "totals.py")
+
+
+@lru_cache(maxsize=1)
+def _render_version() -> str:
+    h = hashlib.sha256()
+    for name in _RENDER_SOURCES:
+        try:
+            with open(os.path.join(_HERE, name), "rb") as fh:
+                h.update(fh.read())
+        except OSError:
+            h.update(name.encode())
+    return h.hexdigest()[:16]
+
+
+@lru_cache(maxsize=32)
+def _file_digest(path: str, mtime_ns: int, size: int) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def logo_digest(logo_path: Optional[str]) -> str:
+    """Digest del contenido del logo (recalculado solo si cambia mtime/tamaño)."""
+    if not logo_path:
+        return "none"
+    try:
+        info = os.stat(logo_path)
+    except OSError:
+        return "missing"
+    return _file_digest(os.path.abspath(logo_path), info.st_mtime_ns, info.st_size)
+
+
+def quote_cache_key(
+    *,
+    quote_number: str,
+    issue_date: date,
+    brand_name: str,
+    brand_email: str,
+    brand_phone: str,
+    client_name: str,
+    client_email: str,
+    client_company: str,
+    items: Sequence[QuoteItem],
+    discount_pct: Decimal,
+    notes: str,
+    validity_days: int = 10,
+    logo_path: Optional[str] = None,
+) -> str:
+    """
+    Hash canónico (sha256 hex) de todos los argumentos de build_quote_pdf_bytes.
+    qty/precio entran como los usa el PDF (centésimos de totals.py) y el
+    descuento como se imprime: 1 y 1.00, o 7.5 y 7.50, dan la misma clave.
+    """
+    payload = {
+        "v": _render_version(),
+        "quote_number": quote_number,
+        "issue_date": issue_date.isoformat(),
+        "brand": [brand_name, brand_email, brand_phone],
+        "client": [client_name, client_email, client_company],
+        "items": [[it.description, to_cents(it.qty), to_cents(it.unit_price)] for it in items],
+        "discount_pct": str(Decimal(discount_pct).normalize()),
+        "notes": notes or "",
+        "validity_days": int(validity_days),
+        "logo": logo_digest(logo_path),
+    }
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class PdfCache:
+    """LRU en memoria + nivel opcional en disco, ambos acotados por bytes."""
+
+    def __init__(
+        self,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        disk_dir: Optional[str] = None,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+    ):
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+
+        self._lock = threading.Lock()
+        self._mem: OrderedDict[str, bytes] = OrderedDict()
+        self._mem_bytes = 0
+        self._disk_bytes: Optional[int] = None  # se calcula en el primer uso
+        self._stats = {"hits_memory": 0, "hits_disk": 0, "misses": 0, "evictions_memory": 0, "evictions_disk": 0}
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    # -----------------------------
+    # API
+    # -----------------------------
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._mem.get(key)
+            if data is not None:
+                self._mem.move_to_end(key)
+                self._stats["hits_memory"] += 1
+                return data
+
+        data = self._disk_get(key)
+        with self._lock:
+            if data is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits_disk"] += 1
+            self._mem_put(key, data)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        with self._lock:
+            self._mem_put(key, data)
+        self._disk_put(key, data)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            out: dict[str, Any] = dict(self._stats)
+            out["entries_memory"] = len(self._mem)
+            out["bytes_memory"] = self._mem_bytes
+            out["bytes_disk"] = self._disk_bytes or 0
+        lookups = out["hits_memory"] + out["hits_disk"] + out["misses"]
+        out["hit_ratio"] = (out["hits_memory"] + out["hits_disk"]) / lookups if lookups else 0.0
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            self._mem_bytes = 0
+
+    # -----------------------------
+    # Memoria (llamar con lock tomado)
+    # -----------------------------
+    def _mem_put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_memory_bytes:
+            return
+        old = self._mem.pop(key, None)
+        if old is not None:
+            self._mem_bytes -= len(old)
+        self._mem[key] = data
+        self._mem_bytes += len(data)
+        while self._mem_bytes > self.max_memory_bytes:
+            _, evicted = self._mem.popitem(last=False)
+            self._mem_bytes -= len(evicted)
+            self._stats["evictions_memory"] += 1
+
+    # -----------------------------
+    # Disco
+    # -----------------------------
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir or "", key[:2], f"{key}.pdf")
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as fh:
+                data = fh.read()
+            os.utime(path)  # marca uso reciente para la poda
+            return data
+        except OSError:
+            return None
+
+    def _disk_put(self, key: str, data: bytes) -> None:
+        if not self.disk_dir or len(data) > self.max_disk_bytes:
+            return
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escritura atómica: otro proceso nunca ve un PDF a medias
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._disk_scan_size()
+            else:
+                self._disk_bytes += len(data)
+            over = self._disk_bytes > self.max_disk_bytes
+        if over:
+            self._disk_evict()
+
+    def _disk_entries(self) -> list[tuple[float, int, str]]:
+        entries = []
+        for root, _dirs, files in os.walk(self.disk_dir or ""):
+            for name in files:
+                if not name.endswith(".pdf"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    info = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((info.st_mtime, info.st_size, path))
+        return entries
+
+    def _disk_scan_size(self) -> int:
+        return sum(size for _, size, _ in self._disk_entries())
+
+    def _disk_evict(self) -> None:
+        """Borra los PDFs usados hace más tiempo hasta quedar en el 90% del límite."""
+        entries = sorted(self._disk_entries())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_disk_bytes * 0.9)
+        evicted = 0
+        for _mtime, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._disk_bytes = total
+            self._stats["evictions_disk"] += evicted
+
+
+# Caché única por proceso (la comparten todas las sesiones de Streamlit)
+_cache: Optional[PdfCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_pdf_cache() -> PdfCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                from settings import get_int_setting, get_setting
+
+                _cache = PdfCache(
+                    max_memory_bytes=get_int_setting("PDF_CACHE_MEMORY_MB", 64) * 1024 * 1024,
+                    disk_dir=(get_setting("PDF_CACHE_DIR") or None),
+                    max_disk_bytes=get_int_setting("PDF_CACHE_DISK_MB", 512) * 1024 * 1024,
+                )
+    return _cache
+
+
+def cached_build_quote_pdf_bytes(**kwargs: Any) -> bytes:
+    """
+    Igual que pdf_generator.build_quote_pdf_bytes (mismos argumentos),
+    pero reutiliza el PDF si ya se renderizó con exactamente los mismos datos.
+    """
+    cache = get_pdf_cache()
+    with span("pdf.cache_lookup") as s:
+        key = quote_cache_key(**kwargs)
+        data = cache.get(key)
+        s.set(hit=data is not None)
+    if data is None:
+        from import_timing import timed_import
+
+        build = timed_import("pdf_generator").build_quote_pdf_bytes
+        with span("pdf.build", items=len(kwargs.get("items") or ())) as s:
+            data = build(**kwargs)
+            s.set(bytes=len(data))
+        cache.put(key, data)
+    return data
@@ -1,18 +1,258 @@
 from __future__ import annotations
 
+import hashlib
+import os
+from dataclasses import dataclass
 from datetime import date
-from decimal import Decimal, ROUND_HALF_UP
+from decimal import Decimal
+from functools import lru_cache
+from io import BytesIO
 from typing import Optional, Sequence
 
+from PIL import Image
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
-from reportlab.lib.units import mm
+from reportlab.lib.units import inch, mm
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfgen import canvas
 from reportlab.platypus import Table, TableStyle
 
+from timing import span
+from totals import compute_totals, to_lines
 from utils import QuoteItem, money_clp
 
 
+# Caja del logo en el encabezado y resolución con la que se incrusta
+LOGO_WIDTH = 28 * mm
+LOGO_HEIGHT = 18 * mm
+_LOGO_DPI = 300
+
+
+@dataclass(frozen=True)
+class _Logo:
+    """Logo ya preparado (bytes de imagen listos para incrustar), reutilizable entre PDFs."""
+    name: str
+    data: bytes
+
+
+@lru_cache(maxsize=8)
+def _load_logo_cached(path: str, mtime_ns: int) -> Optional[_Logo]:
+    # Se lee y prepara UNA vez por proceso y versión del archivo (path + mtime).
+    # Si el archivo no es una imagen válida, también se cachea el None.
+    name = "logo_" + hashlib.md5(f"{path}:{mtime_ns}".encode("utf-8")).hexdigest()
+    max_size = (round(LOGO_WIDTH / inch * _LOGO_DPI), round(LOGO_HEIGHT / inch * _LOGO_DPI))
+    try:
+        with Image.open(path) as img:
+            if img.width <= max_size[0] and img.height <= max_size[1]:
+                with open(path, "rb") as fh:
+                    data = fh.read()
+            else:
+                # Un logo de varios megapíxeles se reduce a lo que cabe en la caja a 300 dpi:
+                # cada PDF incrusta (y codifica) solo esos bytes.
+                img.thumbnail(max_size)
+                out = BytesIO()
+                if img.mode in ("RGBA", "LA", "P") or "transparency" in img.info:
+                    img.save(out, "PNG")
+                else:
+                    img.convert("RGB").save(out, "JPEG", quality=85)
+                data = out.getvalue()
+    except Exception:
+        return None
+    return _Logo(name=name, data=data)
+
+
+def load_logo(logo_path: Optional[str]) -> Optional[_Logo]:
+    """Logo cacheado por proceso; None si no hay ruta o el archivo no existe/no es válido."""
+    if not logo_path:
+        return None
+    path = os.path.abspath(logo_path)
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    return _load_logo_cached(path, mtime_ns)
+
+
+def _draw_logo(c: canvas.Canvas, logo: _Logo, x: float, y: float) -> None:
+    """
+    Dibuja el logo desde los bytes cacheados (sin volver a leer el archivo).
+    El ImageReader es por documento: reportlab lee de él al escribir el PDF.
+    """
+    c.drawImage(ImageReader(BytesIO(logo.data)), x, y, LOGO_WIDTH, LOGO_HEIGHT, mask="auto")
+
+
+# -----------------------------
+# Plantilla de página por marca
+# -----------------------------
+@dataclass(frozen=True)
+class _PageTemplate:
+    """
+    Parte fija del encabezado de una marca (logo, nombre, contacto, línea
+    separadora), con la línea base del nombre en top. Cada documento la
+    define una vez como form XObject (beginForm/endForm) y cada página solo
+    la invoca (doForm, /Name Do).
+    """
+    name: str
+    brand_name: str
+    brand_email: str
+    brand_phone: str
+    logo: Optional[_Logo]
+    margin_x: float
+    width: float
+    top: float
+
+
+def _page_template(
+    brand_name: str,
+    brand_email: str,
+    brand_phone: str,
+    logo: Optional[_Logo],
+    width: float,
+    margin_x: float,
+    top: float,
+) -> _PageTemplate:
+    key = "\0".join(
+        (brand_name, brand_email, brand_phone, logo.name if logo else "", f"{width}:{margin_x}:{top}")
+    )
+    return _PageTemplate(
+        # Nombre corto: se repite en cada página que usa la plantilla
+        name="tpl" + hashlib.md5(key.encode("utf-8")).hexdigest()[:10],
+        brand_name=brand_name,
+        brand_email=brand_email,
+        brand_phone=brand_phone,
+        logo=logo,
+        margin_x=margin_x,
+        width=width,
+        top=top,
+    )
+
+
+def _define_template(c: canvas.Canvas, template: _PageTemplate) -> None:
+    """Dibuja la plantilla como form XObject del documento (antes de la primera página)."""
+    top, margin_x = template.top, template.margin_x
+    c.beginForm(template.name, 0, top - 19 * mm, template.width, top + 8 * mm)
+    c.setFillColor(colors.black)
+    if template.logo is not None:
+        _draw_logo(c, template.logo, margin_x, top - LOGO_HEIGHT)
+
+    x_title = margin_x + (34 * mm if template.logo is not None else 0)
+
+    c.setFont("Helvetica-Bold", 16)
+    c.drawString(x_title, top, template.brand_name)
+
+    c.setFont("Helvetica", 10)
+    c.drawString(x_title, top - 5 * mm, f"{template.brand_email} | {template.brand_phone}")
+
+    c.setStrokeColor(colors.lightgrey)
+    c.line(margin_x, top - 18 * mm, template.width - margin_x, top - 18 * mm)
+    c.endForm()
+
+
+def _stamp_template(c: canvas.Canvas, template: _PageTemplate, y: float) -> None:
+    """Dibuja la plantilla (ya definida con _define_template) con su línea base en y."""
+    if y == template.top:
+        c.doForm(template.name)
+    else:
+        c.saveState()
+        c.translate(0, y - template.top)
+        c.doForm(template.name)
+        c.restoreState()
+
+
+@lru_cache(maxsize=1)
+def _table_styles() -> tuple[TableStyle, TableStyle]:
+    """(estilo de la tabla de ítems, filas de subtotal al pie de cada página que continúa)."""
+    table_style = TableStyle(
+        [
+            ("BACKGROUND", (0, 0), (-1, 0), colors.whitesmoke),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("FONTSIZE", (0, 0), (-1, 0), 10),
+            ("FONTSIZE", (0, 1), (-1, -1), 9),
+            ("GRID", (0, 0), (-1, -1), 0.5, colors.lightgrey),
+            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+            ("ALIGN", (1, 1), (1, -1), "RIGHT"),
+            ("ALIGN", (2, 1), (3, -1), "RIGHT"),
+            ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.Color(0.98, 0.98, 0.98)]),
+            ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
+            ("TOPPADDING", (0, 0), (-1, 0), 8),
+        ]
+    )
+    page_footer_style = TableStyle(
+        [
+            ("SPAN", (0, -2), (2, -2)),
+            ("SPAN", (0, -1), (2, -1)),
+            ("BACKGROUND", (0, -2), (-1, -1), colors.whitesmoke),
+            ("FONTNAME", (0, -2), (-1, -1), "Helvetica-Bold"),
+            ("ALIGN", (0, -2), (2, -1), "RIGHT"),
+        ]
+    )
+    return table_style, page_footer_style
+
+
+@lru_cache(maxsize=65536)
+def _text_units(text: str, font_name: str) -> int:
+    # Ancho en unidades de fuente (1/1000 em). En las fuentes Type1 estándar son
+    # enteros y el ancho de una línea es la suma exacta de sus palabras y espacios.
+    return round(pdfmetrics.stringWidth(text, font_name, 1000))
+
+
+def _split_long_word(word: str, font_name: str, max_units: float) -> list[str]:
+    """Parte una palabra más ancha que la línea en trozos que sí caben (mín. 1 carácter)."""
+    pieces: list[str] = []
+    piece = ""
+    piece_units = 0
+    for ch in word:
+        ch_units = _text_units(ch, font_name)
+        if piece and piece_units + ch_units > max_units:
+            pieces.append(piece)
+            piece, piece_units = "", 0
+        piece += ch
+        piece_units += ch_units
+    if piece:
+        pieces.append(piece)
+    return pieces
+
+
+def wrap_text(text: str, font_name: str, font_size: float, max_width: float) -> list[str]:
+    """
+    Ajusta texto a un ancho máximo (en puntos), párrafo por párrafo, con una línea
+    en blanco después de cada párrafo. Costo lineal: suma anchos cacheados por
+    palabra en vez de medir la línea completa en cada intento.
+    Las palabras más anchas que la línea se parten en varias líneas.
+    """
+    scale = 0.001 * font_size
+    max_units = max_width / scale
+    space_units = _text_units(" ", font_name)
+
+    lines: list[str] = []
+    for paragraph in text.split("\n"):
+        words: list[str] = []
+        line_units = 0
+        for word in paragraph.split():
+            word_units = _text_units(word, font_name)
+            test_units = line_units + space_units + word_units if words else word_units
+            # Misma comparación (y mismo orden de operaciones) que stringWidth(línea) <= max_width
+            if test_units * 0.001 * font_size <= max_width:
+                words.append(word)
+                line_units = test_units
+                continue
+
+            if words:
+                lines.append(" ".join(words))
+            if word_units * 0.001 * font_size <= max_width:
+                words, line_units = [word], word_units
+            else:
+                *full, last = _split_long_word(word, font_name, max_units)
+                lines.extend(full)
+                words, line_units = [last], _text_units(last, font_name)
+        if words:
+            lines.append(" ".join(words))
+        lines.append("")  # línea en blanco entre párrafos
+    return lines
+
+
 def build_quote_pdf_bytes(
     *,
     quote_number: str,
@@ -32,19 +272,11 @@ def build_quote_pdf_bytes(
     """
     Genera un PDF de cotización en bytes.
     - Incluye IVA 19% (Chile).
-    - Redondeo consistente con ROUND_HALF_UP a pesos (sin decimales).
+    - Totales en pesos enteros con ROUND_HALF_UP (totals.py, igual que en la base).
     - Incluye saltos de página básicos para evitar cortes en tabla/notas.
+    - Logo, marca y línea del encabezado van en una plantilla por marca
+      (form XObject): se dibujan una vez por documento y cada página la reutiliza.
     """
-    from io import BytesIO
-
-    # -----------------------------
-    # Constantes de formato/cálculo
-    # -----------------------------
-    IVA_RATE = Decimal("0.19")  # 19%
-    ONE = Decimal("1")
-    HUNDRED = Decimal("100")
-    ROUNDING = ROUND_HALF_UP
-
     buffer = BytesIO()
     c = canvas.Canvas(buffer, pagesize=A4)
     width, height = A4
@@ -53,6 +285,10 @@ def build_quote_pdf_bytes(
     top_margin = 18 * mm
     bottom_margin = 18 * mm
 
+    logo = load_logo(logo_path)
+    template = _page_template(brand_name, brand_email, brand_phone, logo, width, margin_x, height - top_margin)
+    _define_template(c, template)
+
     def new_page() -> float:
         """Cierra página actual y prepara una nueva, devolviendo el nuevo y inicial."""
         c.showPage()
@@ -60,40 +296,16 @@ def build_quote_pdf_bytes(
 
     def draw_header(y: float) -> float:
         """Dibuja el encabezado y retorna y actualizado."""
-        # Logo (opcional)
-        has_logo = False
-        if logo_path:
-            try:
-                c.drawImage(
-                    logo_path,
-                    margin_x,
-                    y - 18 * mm,
-                    width=28 * mm,
-                    height=18 * mm,
-                    mask="auto",
-                )
-                has_logo = True
-            except Exception:
-                # Mantener tu lógica: si falla, no revienta.
-                has_logo = False
-
-        x_title = margin_x + (34 * mm if has_logo else 0)
-
-        c.setFont("Helvetica-Bold", 16)
-        c.drawString(x_title, y, brand_name)
-
-        c.setFont("Helvetica", 10)
-        c.drawString(x_title, y - 5 * mm, f"{brand_email} | {brand_phone}")
+        # Marca (logo opcional, nombre, contacto, línea): plantilla compartida
+        _stamp_template(c, template, y)
 
+        # Lo propio de la cotización
         c.setFont("Helvetica-Bold", 12)
         c.drawRightString(width - margin_x, y, f"COTIZACIÓN #{quote_number}")
         c.setFont("Helvetica", 10)
         c.drawRightString(width - margin_x, y - 5 * mm, f"Fecha: {issue_date.strftime('%d-%m-%Y')}")
 
-        y -= 18 * mm
-        c.setStrokeColor(colors.lightgrey)
-        c.line(margin_x, y, width - margin_x, y)
-        y -= 10 * mm
+        y -= 28 * mm
         return y
 
     def draw_client_block(y: float) -> float:
@@ -118,69 +330,100 @@ def build_quote_pdf_bytes(
     y = draw_client_block(y)
 
     # -----------------------------
-    # Tabla de ítems
+    # Tabla de ítems (se divide en tantas páginas como haga falta)
     # -----------------------------
-    data = [["Descripción", "Cant.", "Precio unit.", "Total"]]
-    subtotal = Decimal("0")
-
-    for it in items:
-        line_total = it.line_total  # ya viene redondeado por línea (ROUND_HALF_UP en utils.py)
-        subtotal += line_total
-        data.append(
+    col_widths = [92 * mm, 18 * mm, 30 * mm, 30 * mm]
+    header_row = ["Descripción", "Cant.", "Precio unit.", "Total"]
+
+    # Alturas de fila calculadas igual que reportlab para celdas de texto
+    # (leading * líneas + padding), así no hay que medir la tabla completa.
+    row_leading = 12
+    header_height = row_leading + 8 + 8
+    footer_row_height = row_leading + 3 + 3
+
+    rows: list[list[str]] = []
+    row_heights: list[float] = []
+    with span("pdf.totals", items=len(items)):
+        lines = to_lines(items)
+        totals = compute_totals(lines, discount_pct)
+    line_totals = totals.line_totals
+
+    for it, ln, line_total in zip(items, lines, line_totals):
+        rows.append(
             [
                 it.description,
-                f"{it.qty.normalize()}",
-                money_clp(it.unit_price),
+                f"{ln.qty.normalize()}",
+                money_clp(ln.unit_price),
                 money_clp(line_total),
             ]
         )
+        row_heights.append(row_leading * (it.description.count("\n") + 1) + 3 + 3)
 
-    table = Table(data, colWidths=[92 * mm, 18 * mm, 30 * mm, 30 * mm])
-    table.setStyle(
-        TableStyle(
-            [
-                ("BACKGROUND", (0, 0), (-1, 0), colors.whitesmoke),
-                ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                ("FONTSIZE", (0, 0), (-1, 0), 10),
-                ("FONTSIZE", (0, 1), (-1, -1), 9),
-                ("GRID", (0, 0), (-1, -1), 0.5, colors.lightgrey),
-                ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-                ("ALIGN", (1, 1), (1, -1), "RIGHT"),
-                ("ALIGN", (2, 1), (3, -1), "RIGHT"),
-                ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.Color(0.98, 0.98, 0.98)]),
-                ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
-                ("TOPPADDING", (0, 0), (-1, 0), 8),
-            ]
-        )
-    )
+    table_style, page_footer_style = _table_styles()
 
-    # Medir tabla para saber si cabe en la página
     available_width = width - 2 * margin_x
-    tw, th = table.wrapOn(c, available_width, y)
-
-    # Si no cabe, nueva página con header (sin repetir cliente por simplicidad, manteniendo tu lógica)
-    if (y - th) < bottom_margin:
+    n_rows = len(rows)
+    start = 0
+    page_no = 1
+    running_subtotal = 0
+    fresh_page = False  # True si la página actual solo tiene el header
+
+    # Un solo recorrido por las filas: cada página toma las que caben (costo lineal)
+    while True:
+        avail = y - bottom_margin - header_height
+        end = start
+        used = 0.0
+        while end < n_rows and used + row_heights[end] <= avail:
+            used += row_heights[end]
+            end += 1
+        if end < n_rows:
+            # No caben todas: dejar espacio para las filas de subtotal de la página
+            while end > start and used + 2 * footer_row_height > avail:
+                end -= 1
+                used -= row_heights[end]
+
+        if end == start and start < n_rows:
+            if not fresh_page:
+                y = new_page()
+                y = draw_header(y)
+                page_no += 1
+                fresh_page = True
+                continue
+            end = start + 1  # fila más alta que una página: se dibuja igual
+
+        chunk = [header_row] + rows[start:end]
+        chunk_heights = [header_height] + row_heights[start:end]
+        continues = end < n_rows
+        if continues:
+            page_subtotal = sum(line_totals[start:end])
+            running_subtotal += page_subtotal
+            chunk.append([f"Subtotal página {page_no}", "", "", money_clp(page_subtotal)])
+            chunk.append(["Subtotal acumulado (continúa en la página siguiente)", "", "", money_clp(running_subtotal)])
+            chunk_heights += [footer_row_height, footer_row_height]
+
+        with span("pdf.table", page=page_no, rows=end - start):
+            table = Table(chunk, colWidths=col_widths, rowHeights=chunk_heights)
+            table.setStyle(table_style)
+            if continues:
+                table.setStyle(page_footer_style)
+            tw, th = table.wrapOn(c, available_width, y)
+            table.drawOn(c, margin_x, y - th)
+        y -= th
+
+        start = end
+        if not continues:
+            break
+        # Nueva página: se repiten header y encabezado de columnas
         y = new_page()
         y = draw_header(y)
-        # Opcional: si quieres repetir cliente en cada página, descomenta:
-        # y = draw_client_block(y)
-        tw, th = table.wrapOn(c, available_width, y)
+        page_no += 1
+        fresh_page = True
 
-    table.drawOn(c, margin_x, y - th)
-    y -= (th + 10 * mm)
+    y -= 10 * mm
 
     # -----------------------------
     # Totales con IVA
     # -----------------------------
-    # Asegurar subtotal redondeado a pesos (por consistencia)
-    subtotal = subtotal.quantize(ONE, rounding=ROUNDING)
-
-    discount_amount = (subtotal * (discount_pct / HUNDRED)).quantize(ONE, rounding=ROUNDING)
-    neto = (subtotal - discount_amount).quantize(ONE, rounding=ROUNDING)
-    iva_amount = (neto * IVA_RATE).quantize(ONE, rounding=ROUNDING)
-    total = (neto + iva_amount).quantize(ONE, rounding=ROUNDING)
-
     # Si no hay espacio para totales + notas, salto de página
     min_space_for_totals_and_notes = 55 * mm
     if y < (bottom_margin + min_space_for_totals_and_notes):
@@ -188,18 +431,18 @@ def build_quote_pdf_bytes(
         y = draw_header(y)
 
     c.setFont("Helvetica", 10)
-    c.drawRightString(width - margin_x, y, f"Subtotal (Neto): {money_clp(subtotal)}")
+    c.drawRightString(width - margin_x, y, f"Subtotal (Neto): {money_clp(totals.subtotal)}")
     y -= 5 * mm
     # Mostrar % sin ruido (ej. 10 en vez de 10.0)
     pct_str = f"{discount_pct.normalize()}"
-    c.drawRightString(width - margin_x, y, f"Descuento ({pct_str}%): - {money_clp(discount_amount)}")
+    c.drawRightString(width - margin_x, y, f"Descuento ({pct_str}%): - {money_clp(totals.discount_amount)}")
     y -= 5 * mm
-    c.drawRightString(width - margin_x, y, f"Neto: {money_clp(neto)}")
+    c.drawRightString(width - margin_x, y, f"Neto: {money_clp(totals.neto)}")
     y -= 5 * mm
-    c.drawRightString(width - margin_x, y, f"IVA (19%): {money_clp(iva_amount)}")
+    c.drawRightString(width - margin_x, y, f"IVA (19%): {money_clp(totals.iva_amount)}")
     y -= 6 * mm
     c.setFont("Helvetica-Bold", 12)
-    c.drawRightString(width - margin_x, y, f"TOTAL: {money_clp(total)}")
+    c.drawRightString(width - margin_x, y, f"TOTAL: {money_clp(totals.total)}")
     y -= 10 * mm
 
     # -----------------------------
@@ -219,24 +462,9 @@ def build_quote_pdf_bytes(
     font_size = 9
     line_height = 11  # aprox.
 
-    def wrap_lines(text: str) -> list[str]:
-        lines: list[str] = []
-        for paragraph in (text or "").split("\n"):
-            line = ""
-            for word in paragraph.split():
-                test = (line + " " + word).strip()
-                if c.stringWidth(test, font_name, font_size) <= max_width:
-                    line = test
-                else:
-                    if line:
-                        lines.append(line)
-                    line = word
-            if line:
-                lines.append(line)
-            lines.append("")  # línea en blanco entre párrafos
-        return lines
-
-    lines = wrap_lines(notes or "")
+    with span("pdf.notes_wrap") as s:
+        lines = wrap_text(notes or "", font_name, font_size, max_width)
+        s.set(lines=len(lines))
 
     # Dibujar línea por línea, con salto de página si falta espacio
     c.setFont(font_name, font_size)
@@ -253,6 +481,9 @@ def build_quote_pdf_bytes(
         c.drawString(margin_x, y, ln)
         y -= (line_height * 0.9)
 
-    c.save()
-    return buffer.getvalue()
+    with span("pdf.save") as s:
+        c.save()
+        data = buffer.getvalue()
+        s.set(bytes=len(data))
+    return data
 
@@ -0,0 +1,191 @@
+"""
+Reportes de cotizaciones: totales por mes y por cliente.
+
+Se leen del resumen materializado quote_summary_monthly (sql/007_quote_summary_clients.sql),
+una fila por (mes, cliente del directorio) con los totales que db.py guarda en
+cada cotización, así el costo de un reporte no crece con quote_items ni se
+rehace el redondeo. Las variantes de un nombre ("Juan Pérez", "juan perez")
+son un solo cliente; las cotizaciones aún sin cliente (client_id = 0) se
+agrupan por el nombre escrito.
+
+El resumen se refresca con "refresh materialized view concurrently" (las
+lecturas no se bloquean). Cuando tiene más de REPORTS_REFRESH_SECONDS (default
+300) en este proceso, una consulta lanza el refresco en un hilo y responde con
+el resumen como está; un advisory lock evita refrescos simultáneos entre
+procesos. También a mano / por cron:
+
+    python reports.py --refresh
+    python reports.py --year 2026
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
+from db import get_conn
+from settings import get_int_setting
+from utils import money_clp
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class MonthlyTotal:
+    month: date
+    quotes: int
+    subtotal: int
+    discount_amount: int
+    neto: int
+    iva_amount: int
+    total: int
+
+
+@dataclass(frozen=True)
+class ClientTotal:
+    client_id: int  # 0 = cotizaciones sin cliente del directorio (agrupadas por client_name)
+    client_name: str
+    quotes: int
+    subtotal: int
+    discount_amount: int
+    neto: int
+    iva_amount: int
+    total: int
+
+
+# -----------------------------
+# Refresco del resumen
+# -----------------------------
+_refresh_lock = threading.Lock()
+_refreshing = False
+_last_refresh = 0.0  # último refresco (o intento) de este proceso
+last_error = ""
+
+
+def refresh_summary() -> bool:
+    """
+    Refresca quote_summary_monthly. Si otro proceso ya lo está refrescando no
+    espera (advisory lock) y retorna False.
+    """
+    global _last_refresh
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("select pg_try_advisory_xact_lock(hashtext('quote_summary_monthly'))")
+            row = cur.fetchone()
+            if not row or not row[0]:
+                conn.rollback()
+                return False
+            cur.execute("refresh materialized view concurrently quote_summary_monthly")
+        conn.commit()
+    _last_refresh = time.monotonic()
+    return True
+
+
+def ensure_fresh(max_age_s: Optional[int] = None) -> None:
+    """
+    Si este proceso no refrescó el resumen en los últimos max_age_s segundos,
+    lanza el refresco en un hilo y retorna de inmediato: quien consulta lee el
+    resumen anterior mientras tanto. A lo más un refresco por proceso a la vez.
+    """
+    global _refreshing
+    if max_age_s is None:
+        max_age_s = get_int_setting("REPORTS_REFRESH_SECONDS", 300)
+    if time.monotonic() - _last_refresh < max_age_s:
+        return
+    with _refresh_lock:
+        if _refreshing or time.monotonic() - _last_refresh < max_age_s:
+            return
+        _refreshing = True
+    threading.Thread(target=_background_refresh, name="reports-refresh", daemon=True).start()
+
+
+def _background_refresh() -> None:
+    """
+    Si otro proceso tiene el advisory lock, su refresco cuenta como el de
+    este; si falla, se reintenta cuando vuelva a vencer max_age_s.
+    """
+    global _refreshing, _last_refresh, last_error
+    try:
+        refresh_summary()
+        last_error = ""
+    except Exception as e:
+        last_error = f"{type(e).__name__}: {e}"
+        log.exception("No se pudo refrescar quote_summary_monthly")
+    finally:
+        _last_refresh = time.monotonic()
+        _refreshing = False
+
+
+# -----------------------------
+# Consultas
+# -----------------------------
+def monthly_totals(year: int, *, refresh: bool = True) -> list[MonthlyTotal]:
+    """Totales por mes del año (solo meses con cotizaciones)."""
+    if refresh:
+        ensure_fresh()
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                select month, sum(quotes), sum(subtotal), sum(discount_amount),
+                       sum(neto), sum(iva_amount), sum(total)
+                from quote_summary_monthly
+                where month >= make_date(%(year)s, 1, 1) and month < make_date(%(year)s + 1, 1, 1)
+                group by month
+                order by month
+                """,
+                {"year": year},
+            )
+            rows = cur.fetchall()
+    return [MonthlyTotal(r[0], *(int(v or 0) for v in r[1:])) for r in rows]
+
+
+def client_totals(year: int, *, limit: Optional[int] = None, refresh: bool = True) -> list[ClientTotal]:
+    """Totales por cliente del año, de mayor a menor total."""
+    if refresh:
+        ensure_fresh()
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                select client_id, min(client_name), sum(quotes), sum(subtotal), sum(discount_amount),
+                       sum(neto), sum(iva_amount), sum(total)
+                from quote_summary_monthly
+                where month >= make_date(%(year)s, 1, 1) and month < make_date(%(year)s + 1, 1, 1)
+                group by client_id, unlinked_name
+                order by sum(total) desc, min(client_name)
+                limit %(limit)s
+                """,
+                {"year": year, "limit": limit},
+            )
+            rows = cur.fetchall()
+    return [ClientTotal(int(r[0]), str(r[1]), *(int(v or 0) for v in r[2:])) for r in rows]
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Reportes de cotizaciones (por mes y por cliente).")
+    parser.add_argument("--year", type=int, default=date.today().year, help="Año del reporte (default: actual)")
+    parser.add_argument("--top", type=int, default=20, help="Clientes a mostrar (default: 20)")
+    parser.add_argument("--refresh", action="store_true", help="Solo refresca el resumen materializado")
+    args = parser.parse_args(argv)
+
+    if args.refresh:
+        print("Resumen refrescado." if refresh_summary() else "Otro proceso ya lo está refrescando.")
+        return 0
+
+    refresh_summary()
+    print(f"Por mes ({args.year}):")
+    for m in monthly_totals(args.year, refresh=False):
+        print(f"  {m.month:%Y-%m}  {m.quotes:>5} cotizaciones  total {money_clp(m.total)}")
+    print(f"Por cliente ({args.year}, top {args.top}):")
+    for c in client_totals(args.year, limit=args.top, refresh=False):
+        print(f"  {c.client_name or '(sin nombre)':<40} {c.quotes:>5}  total {money_clp(c.total)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,498 @@
+"""
+Servicio HTTP de cotizaciones en PDF (sin Streamlit), para integraciones como el ERP.
+
+    python service.py --port 8080 --workers 4
+
+Endpoints:
+- POST /quotes            cuerpo: una cotización en el formato JSONL de batch.py.
+                          Responde el PDF. Con ?save=1 se guarda antes (asigna el N°,
+                          igual que la app; usa el diario local si JOURNAL_PATH está
+                          configurado) y el N° va en el header X-Quote-Number.
+- GET  /quotes/<N°>.pdf   reimprime una cotización guardada.
+- GET  /metrics           throughput, latencias p50/p90/p99, rechazos y timeouts (JSON).
+- GET  /healthz
+
+El render corre en un pool de procesos que se precalienta al partir (fuentes,
+logo y plantilla ya cargados en cada worker). Control de carga:
+- Hay a lo más SERVICE_MAX_PENDING renders en curso o en cola; sobre eso se
+  responde 503 con Retry-After, sin guardar nada.
+- Un render que supera SERVICE_TIMEOUT_SECONDS responde 504 (si se guardó,
+  el N° igual va en X-Quote-Number para reimprimirlo después).
+
+Ajustes opcionales en st.secrets (o entorno): SERVICE_WORKERS (default: N° de
+CPUs), SERVICE_MAX_PENDING (default: 4 por worker), SERVICE_TIMEOUT_SECONDS
+(default 30), SERVICE_LOGO_PATH (default assets/logo.jpg) y SERVICE_TOKEN
+(si está, /quotes exige "Authorization: Bearer <token>"; /metrics y /healthz no).
+
+Prueba de carga contra un servicio corriendo:
+    python service.py --load http://127.0.0.1:8080 --concurrency 16 --requests 400
+"""
+from __future__ import annotations
+
+import argparse
+import hmac
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+from batch import HEADER_FIELDS, render_spec, spec_from_json
+from utils import QuoteItem
+
+MAX_BODY_BYTES = 5 * 1024 * 1024
+CHUNK_BYTES = 64 * 1024
+
+
+# -----------------------------
+# Workers
+# -----------------------------
+def _warm_worker(logo_path: Optional[str]) -> None:
+    """Inicializador de cada proceso: carga reportlab, fuentes, logo y plantilla con un render de prueba."""
+    spec = spec_from_json(
+        {"client_name": "warmup", "quote_number": "0000-0000", "items": [{"description": "x"}]},
+        "warmup",
+    )
+    render_spec(spec, logo_path)
+
+
+def _worker_pid() -> int:
+    time.sleep(0.05)  # mantiene ocupado al worker: las demás tareas van a otros
+    return os.getpid()
+
+
+def _percentile(ordered: list[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def _summary(values: list[float]) -> dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "p50": round(_percentile(ordered, 50), 2),
+        "p90": round(_percentile(ordered, 90), 2),
+        "p99": round(_percentile(ordered, 99), 2),
+        "max": round(ordered[-1], 2) if ordered else 0.0,
+    }
+
+
+class Metrics:
+    """Contadores por status y latencias de las últimas `window` respuestas."""
+
+    def __init__(self, window: int = 2048):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self._status: Counter[int] = Counter()
+        self._latency_ms: deque[float] = deque(maxlen=window)
+        self._render_ms: deque[float] = deque(maxlen=window)
+        self._finished_at: deque[float] = deque(maxlen=100_000)
+
+    def observe(self, status: int, latency_ms: float, render_ms: Optional[float] = None) -> None:
+        with self._lock:
+            self._status[status] += 1
+            self._latency_ms.append(latency_ms)
+            if render_ms is not None:
+                self._render_ms.append(render_ms)
+            self._finished_at.append(time.time())
+
+    def snapshot(self) -> dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            last_minute = sum(1 for t in self._finished_at if t >= now - 60)
+            uptime = now - self.started_at
+            return {
+                "uptime_s": round(uptime, 1),
+                "requests": {str(k): v for k, v in sorted(self._status.items())},
+                "rejected_503": self._status[503],
+                "timeouts_504": self._status[504],
+                "throughput_rps_60s": round(last_minute / min(60.0, max(uptime, 1e-9)), 2),
+                "latency_ms": _summary(list(self._latency_ms)),
+                "render_ms": _summary(list(self._render_ms)),
+            }
+
+
+class Busy(Exception):
+    """No hay cupo: ya hay max_pending renders en curso o en cola."""
+
+
+class QuoteService:
+    """Pool de procesos precalentado + cupo de renders pendientes + métricas."""
+
+    def __init__(
+        self,
+        *,
+        workers: int,
+        max_pending: int,
+        timeout: float,
+        logo_path: Optional[str],
+        token: Optional[str] = None,
+    ):
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.timeout = timeout
+        self.logo_path = logo_path
+        self.token = token or None
+        self.metrics = Metrics()
+
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        # spawn: los workers no heredan hilos ni conexiones abiertas del servidor
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_worker,
+            initargs=(logo_path,),
+        )
+
+    def warm(self, timeout: float = 60.0) -> int:
+        """
+        Espera a que todos los workers hayan partido (con su render de prueba
+        hecho) antes de aceptar tráfico. Retorna cuántos respondieron.
+        """
+        deadline = time.monotonic() + timeout
+        pids: set[int] = set()
+        while len(pids) < self.workers and time.monotonic() < deadline:
+            futures = [self._executor.submit(_worker_pid) for _ in range(self.workers)]
+            pids.update(f.result() for f in futures)
+        return len(pids)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def acquire(self) -> None:
+        """Reserva cupo para un render o lanza Busy (sin esperar)."""
+        if not self._slots.acquire(blocking=False):
+            raise Busy()
+        with self._pending_lock:
+            self._pending += 1
+
+    def release(self, _future: Optional[Future] = None) -> None:
+        with self._pending_lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def render(self, spec: dict[str, Any]) -> bytes:
+        """
+        Renderiza con el cupo ya reservado (acquire). El cupo se libera cuando el
+        worker termina, no cuando se responde: un render que excedió el timeout
+        sigue ocupando su lugar hasta terminar.
+        """
+        try:
+            future = self._executor.submit(render_spec, spec, self.logo_path)
+        except Exception:
+            self.release()
+            raise
+        future.add_done_callback(self.release)
+        try:
+            _filename, data = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise
+        return data
+
+
+# -----------------------------
+# HTTP
+# -----------------------------
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "CotizadorPDF/1.0"
+    protocol_version = "HTTP/1.1"
+    service: QuoteService  # lo asigna serve()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass  # las métricas reemplazan al log de accesos
+
+    # -- respuestas --
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        # En trozos: el PDF sale a medida que el cliente lo recibe
+        view = memoryview(body)
+        for i in range(0, len(body), CHUNK_BYTES):
+            self.wfile.write(view[i : i + CHUNK_BYTES])
+
+    def _json(self, status: int, payload: dict[str, Any], headers: Optional[dict[str, str]] = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self._send(status, body, "application/json; charset=utf-8", headers)
+
+    def _authorized(self) -> bool:
+        token = self.service.token
+        if token is None:
+            return True
+        given = self.headers.get("Authorization", "")
+        return hmac.compare_digest(given.encode("utf-8"), f"Bearer {token}".encode("utf-8"))
+
+    # -- rutas --
+    def do_GET(self) -> None:
+        path = urlparse(self.path).path
+        if path == "/healthz":
+            self._json(200, {"ok": True})
+        elif path == "/metrics":
+            self._json(
+                200,
+                {
+                    **self.service.metrics.snapshot(),
+                    "workers": self.service.workers,
+                    "pending": self.service.pending,
+                    "max_pending": self.service.max_pending,
+                },
+            )
+        elif path.startswith("/quotes/") and path.endswith(".pdf"):
+            self._handle_quote(reprint=unquote(path[len("/quotes/") : -len(".pdf")]))
+        else:
+            self._json(404, {"error": "no encontrado"})
+
+    def do_POST(self) -> None:
+        if urlparse(self.path).path == "/quotes":
+            self._handle_quote()
+        else:
+            self._json(404, {"error": "no encontrado"})
+
+    def _handle_quote(self, reprint: Optional[str] = None) -> None:
+        t0 = time.perf_counter()
+        status, render_ms = self._quote(reprint)
+        self.service.metrics.observe(status, (time.perf_counter() - t0) * 1000, render_ms)
+
+    def _quote(self, reprint: Optional[str]) -> tuple[int, Optional[float]]:
+        """Atiende POST /quotes o GET /quotes/<N°>.pdf. Retorna (status, ms de render)."""
+        if not self._authorized():
+            self._json(401, {"error": "no autorizado"}, {"WWW-Authenticate": "Bearer"})
+            return 401, None
+
+        try:
+            spec = self._read_spec() if reprint is None else None
+        except OverflowError:  # antes que ArithmeticError: _read_spec la usa para el cuerpo demasiado grande
+            self._json(413, {"error": f"cuerpo mayor a {MAX_BODY_BYTES} bytes"}, {"Connection": "close"})
+            self.close_connection = True
+            return 413, None
+        except (ValueError, ArithmeticError) as e:
+            # ArithmeticError: decimal.InvalidOperation y similares (ej. "qty": "NaN")
+            self._json(400, {"error": str(e) if isinstance(e, ValueError) else f"cotización inválida: {type(e).__name__}"})
+            return 400, None
+
+        try:
+            self.service.acquire()
+        except Busy:
+            self._json(503, {"error": "servicio ocupado, reintentar"}, {"Retry-After": "1"})
+            return 503, None
+
+        rendering = False  # desde que se encola el render, el cupo lo libera el worker al terminar
+        try:
+            if reprint is not None:
+                spec = self._stored_spec(reprint)
+                if spec is None:
+                    self._json(404, {"error": f"no existe la cotización {reprint}"})
+                    return 404, None
+            elif parse_qs(urlparse(self.path).query).get("save", ["0"])[0] in ("1", "true"):
+                spec["quote_number"] = _save(spec)
+            elif "quote_number" not in spec:
+                spec["quote_number"] = "BORRADOR"
+
+            qn = str(spec["quote_number"])
+            headers = {"X-Quote-Number": qn}
+            t_render = time.perf_counter()
+            rendering = True
+            try:
+                data = self.service.render(spec)
+            except FutureTimeout:
+                self._json(504, {"error": f"el render superó {self.service.timeout:g} s", "quote_number": qn}, headers)
+                return 504, None
+            render_ms = (time.perf_counter() - t_render) * 1000
+        except Exception as e:
+            self._json(500, {"error": f"{type(e).__name__}: {e}"})
+            return 500, None
+        finally:
+            if not rendering:
+                self.service.release()
+
+        headers["Content-Disposition"] = f'inline; filename="cotizacion_{qn}.pdf"'
+        headers["X-Render-Ms"] = f"{render_ms:.1f}"
+        self._send(200, data, "application/pdf", headers)
+        return 200, render_ms
+
+    def _read_spec(self) -> dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise OverflowError()
+        if length <= 0:
+            raise ValueError("falta el cuerpo JSON (Content-Length)")
+        try:
+            raw = json.loads(self.rfile.read(length))
+            return spec_from_json(raw, "http")
+        except (TypeError, AttributeError, json.JSONDecodeError) as e:
+            raise ValueError(f"cotización inválida: {e}") from None
+
+    @staticmethod
+    def _stored_spec(quote_number: str) -> Optional[dict[str, Any]]:
+        from db import load_quote
+
+        stored = load_quote(quote_number)
+        if stored is None:
+            return None
+        spec = stored.pdf_kwargs()
+        del spec["logo_path"]
+        spec["items"] = [(it.description, str(it.qty), str(it.unit_price)) for it in stored.items]
+        return spec
+
+
+def _save(spec: dict[str, Any]) -> str:
+    """Guarda la cotización (como la app: con diario local si está configurado). Retorna el N°."""
+    from journal import get_journal
+
+    header = {k: spec[k] for k in HEADER_FIELDS if k != "quote_number"}
+    header["year"] = spec["issue_date"].year
+    items = [QuoteItem(description=d, qty=Decimal(q), unit_price=Decimal(p)) for d, q, p in spec["items"]]
+
+    journal = get_journal()
+    if journal is not None:
+        _seq, qn = journal.save_quote(items=items, **header)
+    else:
+        from db import save_quote
+
+        _quote_id, _seq, qn = save_quote(items=items, **header)
+    return qn
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Backlog amplio: el exceso de carga se responde con 503, no con conexiones rechazadas
+    request_queue_size = 128
+
+
+def serve(service: QuoteService, host: str, port: int) -> None:
+    handler = type("Handler", (_Handler,), {"service": service})
+    httpd = _Server((host, port), handler)
+    print(
+        f"Servicio en http://{host}:{port} · {service.workers} workers · "
+        f"{service.max_pending} renders pendientes máx. · timeout {service.timeout:g} s",
+        file=sys.stderr,
+    )
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        service.close()
+
+
+# -----------------------------
+# Prueba de carga (cliente)
+# -----------------------------
+def load_test(url: str, *, concurrency: int, requests: int, items: int, save: bool) -> dict[str, Any]:
+    """N clientes concurrentes haciendo POST /quotes; retorna throughput, latencias y status."""
+    from urllib.error import HTTPError
+    from urllib.request import Request, urlopen
+
+    body = json.dumps(
+        {
+            "client_name": "Cliente Carga",
+            "client_company": "Carga SpA",
+            "items": [{"description": f"Ítem {i}", "qty": "1", "unit_price": str(1000 + i)} for i in range(items)],
+        }
+    ).encode("utf-8")
+    target = url.rstrip("/") + "/quotes" + ("?save=1" if save else "")
+    headers = {"Content-Type": "application/json"}
+    token = os.environ.get("SERVICE_TOKEN")
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+
+    latencies: list[float] = []
+    statuses: Counter[int] = Counter()
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+
+    def client() -> None:
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            t0 = time.perf_counter()
+            try:
+                with urlopen(Request(target, data=body, headers=headers), timeout=120) as resp:
+                    resp.read()
+                    status = resp.status
+            except HTTPError as e:
+                e.read()
+                status = e.code
+            except OSError:
+                status = 0
+            with lock:
+                statuses[status] += 1
+                if status == 200:
+                    latencies.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(statuses[200] / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": _summary(latencies),
+        "status": {str(k): v for k, v in sorted(statuses.items())},
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    from settings import get_int_setting, get_setting
+
+    parser = argparse.ArgumentParser(description="Servicio HTTP de cotizaciones en PDF.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, help="procesos de render (default: SERVICE_WORKERS o N° de CPUs)")
+    parser.add_argument("--max-pending", type=int, help="renders en curso/cola antes de responder 503")
+    parser.add_argument("--timeout", type=float, help="segundos por render antes de responder 504")
+    parser.add_argument("--load", metavar="URL", help="en vez de servir, hacer una prueba de carga contra URL")
+    parser.add_argument("--concurrency", type=int, default=16, help="clientes concurrentes (--load)")
+    parser.add_argument("--requests", type=int, default=400, help="total de solicitudes (--load)")
+    parser.add_argument("--items", type=int, default=10, help="ítems por cotización (--load)")
+    parser.add_argument("--save", action="store_true", help="--load con ?save=1 (guarda en la base)")
+    args = parser.parse_args(argv)
+
+    if args.load:
+        result = load_test(args.load, concurrency=args.concurrency, requests=args.requests, items=args.items, save=args.save)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0 if result["status"].get("200") == args.requests else 1
+
+    workers = args.workers or get_int_setting("SERVICE_WORKERS", os.cpu_count() or 2)
+    service = QuoteService(
+        workers=workers,
+        max_pending=args.max_pending or get_int_setting("SERVICE_MAX_PENDING", 4 * workers),
+        timeout=args.timeout or get_int_setting("SERVICE_TIMEOUT_SECONDS", 30),
+        logo_path=get_setting("SERVICE_LOGO_PATH", "assets/logo.jpg") or None,
+        token=get_setting("SERVICE_TOKEN"),
+    )
+    t0 = time.perf_counter()
+    ready = service.warm()
+    print(f"{ready} workers listos en {time.perf_counter() - t0:.1f} s", file=sys.stderr)
+    serve(service, args.host, args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
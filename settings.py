@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import os
+import sys
+import tomllib
+from functools import lru_cache
+from typing import Any
+
+# Mismos archivos que lee st.secrets (el del proyecto tiene prioridad)
+_SECRETS_PATHS = (
+    os.path.join(os.path.expanduser("~"), ".streamlit", "secrets.toml"),
+    os.path.join(os.getcwd(), ".streamlit", "secrets.toml"),
+)
+
+
+def get_setting(name: str, default: Any = None) -> Any:
+    """
+    Lee un ajuste: primero la variable de entorno homónima (permite apuntar
+    CLI, benchmarks o servicios a otra base sin tocar secrets.toml) y luego
+    los Secrets.
+    Dentro de la app se usa st.secrets. Fuera de un runtime de Streamlit
+    (CLI, batch, servicio, workers) secrets.toml se lee directamente: no se
+    importa Streamlit, no hay avisos de "bare mode" y no se copian sus claves
+    a os.environ (st.secrets sí lo hace, y pisaría las variables de entorno).
+    """
+    value = os.environ.get(name)
+    if value is None:
+        value = _streamlit_secret(name) if _in_streamlit() else _file_secrets().get(name)
+    return default if value is None else value
+
+
+def get_int_setting(name: str, default: int) -> int:
+    """
+    Lee un entero opcional (ej. DB_POOL_MAX_SIZE = 10).
+    """
+    raw = get_setting(name)
+    if raw is None or str(raw).strip() == "":
+        return default
+    return int(raw)
+
+
+def _in_streamlit() -> bool:
+    if "streamlit" not in sys.modules:
+        return False
+    from streamlit import runtime
+
+    return runtime.exists()
+
+
+def _streamlit_secret(name: str) -> Any:
+    import streamlit as st
+
+    try:
+        return st.secrets.get(name)
+    except FileNotFoundError:
+        return None
+
+
+@lru_cache(maxsize=1)
+def _file_secrets() -> dict[str, Any]:
+    values: dict[str, Any] = {}
+    for path in _SECRETS_PATHS:
+        try:
+            with open(path, "rb") as fh:
+                values.update(tomllib.load(fh))
+        except FileNotFoundError:
+            continue
+    return values
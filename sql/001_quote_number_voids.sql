@@ -0,0 +1,10 @@
+-- Correlativos reservados en bloque (db.reserve_quote_numbers) que no se usaron.
+-- Cada hueco en la numeración de un año queda explicado aquí.
+create table if not exists quote_number_voids (
+  year         int         not null,
+  seq          int         not null,
+  quote_number text        not null,
+  reason       text        not null default '',
+  voided_at    timestamptz not null default now(),
+  primary key (year, seq)
+);
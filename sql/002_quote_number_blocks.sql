@@ -0,0 +1,14 @@
+-- Bloques de correlativos reservados (db.reserve_quote_numbers): quién y cuándo.
+-- Todo número de un año está en quotes, en quote_number_voids o dentro de un
+-- bloque registrado aquí (ej. un proceso que terminó sin devolver su reserva).
+-- Si se devolvió la cola de un bloque, un bloque posterior puede repetir esos números.
+create table if not exists quote_number_blocks (
+  id          bigserial   primary key,
+  year        int         not null,
+  first_seq   int         not null,
+  last_seq    int         not null,
+  holder      text        not null default '',
+  reserved_at timestamptz not null default now()
+);
+
+create index if not exists quote_number_blocks_year_idx on quote_number_blocks (year, first_seq);
@@ -0,0 +1,52 @@
+-- Totales precalculados por cotización (pesos enteros, mismas reglas que totals.py)
+-- e índices para reportes. db.py los llena al guardar; aquí se completan los
+-- existentes con el mismo cálculo en SQL (round() de numeric = ROUND_HALF_UP).
+alter table quotes add column if not exists subtotal        bigint;
+alter table quotes add column if not exists discount_amount bigint;
+alter table quotes add column if not exists neto            bigint;
+alter table quotes add column if not exists iva_amount      bigint;
+alter table quotes add column if not exists total           bigint;
+
+with lines as (
+  select quote_id, sum(round(qty * unit_price)) as subtotal
+  from quote_items
+  group by quote_id
+),
+calc as (
+  select q.id,
+         coalesce(l.subtotal, 0)::bigint as subtotal,
+         round(coalesce(l.subtotal, 0) * q.discount_pct / 100)::bigint as discount_amount
+  from quotes q
+  left join lines l on l.quote_id = q.id
+  where q.total is null
+)
+update quotes q
+set subtotal        = calc.subtotal,
+    discount_amount = calc.discount_amount,
+    neto            = calc.subtotal - calc.discount_amount,
+    iva_amount      = round((calc.subtotal - calc.discount_amount) * 19 / 100.0)::bigint,
+    total           = calc.subtotal - calc.discount_amount
+                      + round((calc.subtotal - calc.discount_amount) * 19 / 100.0)::bigint
+from calc
+where q.id = calc.id;
+
+create unique index if not exists quotes_year_seq_idx on quotes (year, seq);
+create index if not exists quotes_issue_date_idx on quotes (issue_date);
+create index if not exists quotes_client_idx on quotes (client_name, issue_date);
+create index if not exists quote_items_quote_id_idx on quote_items (quote_id);
+
+-- Resumen mensual por cliente para reportes (reports.py lo refresca con
+-- "refresh materialized view concurrently", sin bloquear lecturas).
+create materialized view if not exists quote_summary_monthly as
+select date_trunc('month', issue_date)::date as month,
+       coalesce(client_name, '')             as client_name,
+       count(*)                              as quotes,
+       sum(subtotal)                         as subtotal,
+       sum(discount_amount)                  as discount_amount,
+       sum(neto)                             as neto,
+       sum(iva_amount)                       as iva_amount,
+       sum(total)                            as total
+from quotes
+group by 1, 2;
+
+create unique index if not exists quote_summary_monthly_key on quote_summary_monthly (month, client_name);
@@ -0,0 +1,26 @@
+-- Búsqueda de clientes en el historial (db.list_quotes): índice de trigramas
+-- sobre nombre + empresa + email. Acelera ILIKE '%texto%' y la búsqueda
+-- difusa por similitud (operador <%). La expresión debe ser idéntica a
+-- db._CLIENT_SEARCH_EXPR para que el índice se use.
+-- Si pg_trgm no está disponible (Postgres local sin contrib), se omite y
+-- db.py busca con ILIKE sin índice.
+do $$
+begin
+  create extension if not exists pg_trgm;
+exception when others then
+  raise notice 'pg_trgm no disponible: búsqueda de historial sin índice de trigramas';
+end
+$$;
+
+do $$
+begin
+  if exists (select 1 from pg_extension where extname = 'pg_trgm') then
+    execute $idx$
+      create index if not exists quotes_client_search_trgm_idx on quotes using gin (
+        (coalesce(client_name, '') || ' ' || coalesce(client_company, '') || ' ' || coalesce(client_email, ''))
+        gin_trgm_ops
+      )
+    $idx$;
+  end if;
+end
+$$;
@@ -0,0 +1,34 @@
+-- Catálogo de productos/servicios (catalog.py): autocompletado de descripción
+-- y precio al editar ítems. La app lo carga una vez en memoria y después solo
+-- pide las filas con updated_at reciente, por eso:
+-- - updated_at se actualiza en cada update (trigger) y tiene índice;
+-- - para retirar un ítem se marca active = false (un delete no se vería).
+create table if not exists catalog_items (
+  id          bigserial     primary key,
+  description text          not null,
+  unit_price  numeric(14,2) not null default 0,
+  active      boolean       not null default true,
+  updated_at  timestamptz   not null default now()
+);
+
+create unique index if not exists catalog_items_description_key on catalog_items (lower(description));
+create index if not exists catalog_items_updated_at_idx on catalog_items (updated_at);
+
+create or replace function catalog_items_touch() returns trigger
+language plpgsql as $$
+begin
+  new.updated_at := now();
+  return new;
+end
+$$;
+
+drop trigger if exists catalog_items_touch on catalog_items;
+create trigger catalog_items_touch
+  before update on catalog_items
+  for each row execute function catalog_items_touch();
+
+-- Los ítems que la app traía por defecto
+insert into catalog_items (description, unit_price)
+values ('Diseño de logo', 50000),
+       ('Landing page (1 sección)', 120000)
+on conflict do nothing;
@@ -0,0 +1,24 @@
+-- Directorio de clientes (clients.py). Cada cotización nueva queda ligada a su
+-- cliente por client_key: nombre + empresa sin mayúsculas, tildes, espacios
+-- ni puntuación (utils.client_key), así "Juan Pérez " y "juan perez" son el
+-- mismo. db.py crea el cliente al guardar si no existe.
+-- quotes conserva client_name/email/company tal como se escribieron (el PDF
+-- se reimprime igual); client_id es para búsquedas y reportes por cliente.
+--
+-- Las cotizaciones anteriores se ligan después, en lotes cortos (no bloquea
+-- quotes por mucho rato):
+--     python clients.py --migrate
+create table if not exists clients (
+  id          bigserial   primary key,
+  client_key  text        not null unique,
+  name        text        not null,
+  email       text        not null default '',
+  company     text        not null default '',
+  created_at  timestamptz not null default now(),
+  updated_at  timestamptz not null default now()
+);
+
+-- Sin default: agregar la columna no reescribe la tabla
+alter table quotes add column if not exists client_id bigint references clients (id);
+
+create index if not exists quotes_client_id_idx on quotes (client_id, issue_date);
@@ -0,0 +1,33 @@
+-- Resumen mensual por cliente del directorio (sql/006_clients.sql): se agrupa
+-- por client_id, no por el nombre escrito, así "Juan Pérez" y "juan perez"
+-- suman juntos en los reportes. La etiqueta es clients.name.
+-- Las cotizaciones sin client_id (aún no ligadas por clients.py --migrate, o
+-- sin nombre ni empresa) quedan con client_id = 0 y se agrupan por su
+-- client_name, como antes.
+--
+-- Reemplaza la vista de sql/003_quote_totals.sql; al terminar la migración de
+-- clientes basta con refrescarla (python reports.py --refresh).
+drop materialized view if exists quote_summary_monthly;
+
+create materialized view quote_summary_monthly as
+with per_client as (
+  select date_trunc('month', issue_date)::date                              as month,
+         coalesce(client_id, 0)                                             as client_id,
+         case when client_id is null then coalesce(client_name, '') else '' end as unlinked_name,
+         count(*)                                                           as quotes,
+         sum(subtotal)                                                      as subtotal,
+         sum(discount_amount)                                               as discount_amount,
+         sum(neto)                                                          as neto,
+         sum(iva_amount)                                                    as iva_amount,
+         sum(total)                                                         as total
+  from quotes
+  group by 1, 2, 3
+)
+select p.month, p.client_id, p.unlinked_name,
+       coalesce(c.name, p.unlinked_name) as client_name,
+       p.quotes, p.subtotal, p.discount_amount, p.neto, p.iva_amount, p.total
+from per_client p
+left join clients c on c.id = p.client_id;
+
+-- "refresh ... concurrently" necesita un índice único sin where (y sin nulls en la clave)
+create unique index quote_summary_monthly_key on quote_summary_monthly (month, client_id, unlinked_name);
@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+import os
+from typing import Iterator
+
+import pytest
+
+# Postgres local desechable (se crea y se borra un schema propio); sin ella se omiten
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+needs_database = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL no definida")
+
+
+@pytest.fixture(scope="session")
+def db_module() -> Iterator[object]:
+    """Módulo db apuntando a un schema desechable en TEST_DATABASE_URL."""
+    from bench import throwaway_database
+
+    with throwaway_database(TEST_DATABASE_URL):
+        import db
+
+        yield db
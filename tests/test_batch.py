@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+
+from batch import spec_from_json
+
+
+def _raw(**item: Any) -> dict[str, Any]:
+    return {"ref": "c1", "client_name": "Juan Pérez", "items": [{"description": "Servicio", **item}]}
+
+
+def test_spec_keeps_decimals_as_exact_text() -> None:
+    spec = spec_from_json(_raw(qty="2.50", unit_price=" 19990.5 "), "L1")
+    assert spec["items"] == [("Servicio", "2.50", "19990.5")]
+
+
+@pytest.mark.parametrize("field", ["qty", "unit_price"])
+@pytest.mark.parametrize("value", ["NaN", "sNaN", "Infinity", "-inf", "abc"])
+def test_spec_rejects_invalid_and_non_finite_numbers(field: str, value: str) -> None:
+    with pytest.raises(ValueError, match=rf"\[c1\] valor inválido en {field}"):
+        spec_from_json(_raw(**{field: value}), "L1")
+
+
+def test_spec_rejects_non_finite_discount() -> None:
+    raw = {**_raw(qty="1", unit_price="10"), "discount_pct": "NaN"}
+    with pytest.raises(ValueError, match=r"valor inválido en discount_pct"):
+        spec_from_json(raw, "L1")
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from conftest import needs_database
+from utils import QuoteItem
+
+pytestmark = needs_database
+
+COPY_THRESHOLD = 5
+
+
+@pytest.fixture
+def copy_calls(db_module, monkeypatch: pytest.MonkeyPatch) -> list[int]:
+    monkeypatch.setenv("DB_COPY_THRESHOLD", str(COPY_THRESHOLD))
+    calls: list[int] = []
+    copy_quote_items = db_module._copy_quote_items
+
+    def spy(cur, quote_id, values):
+        calls.append(len(values))
+        copy_quote_items(cur, quote_id, values)
+
+    monkeypatch.setattr(db_module, "_copy_quote_items", spy)
+    return calls
+
+
+def _items(n: int) -> list[QuoteItem]:
+    qtys = ("1.00", "2.50", "0.33", "12.75", "1000.01")
+    prices = ("19990.50", "0.01", "123456789.99", "4999.49", "7.10")
+    return [
+        QuoteItem(f"Ítem {i} – «ñandú»", Decimal(qtys[i % len(qtys)]), Decimal(prices[i % len(prices)]))
+        for i in range(n)
+    ]
+
+
+def _save(db_module, items: list[QuoteItem]) -> int:
+    quote_id, _, _ = db_module.save_quote(
+        year=2026,
+        issue_date=date(2026, 1, 15),
+        brand_name="HIDRACODE",
+        brand_email="contacto@hidracode.cl",
+        brand_phone="+56 9 0000 0000",
+        client_name="Juan Pérez",
+        client_email="",
+        client_company="",
+        discount_pct=Decimal("7.5"),
+        notes="",
+        validity_days=10,
+        items=items,
+    )
+    return quote_id
+
+
+@pytest.mark.parametrize("n, copied", [(COPY_THRESHOLD, False), (COPY_THRESHOLD * 4 + 3, True)])
+def test_items_round_trip_exactly_with_and_without_copy(db_module, copy_calls: list[int], n: int, copied: bool) -> None:
+    items = _items(n)
+    quote_id = _save(db_module, items)
+
+    assert copy_calls == ([n] if copied else [])
+    stored = db_module.get_quote_items(quote_id)
+    # Mismo Decimal (valor y escala) y mismo orden, vayan por executemany o por COPY binario
+    assert [(it.description, str(it.qty), str(it.unit_price)) for it in stored] == [
+        (it.description, str(it.qty), str(it.unit_price)) for it in items
+    ]
+
+
+def test_copy_types_match_quote_items_columns(db_module) -> None:
+    with db_module.get_conn() as conn, conn.cursor() as cur:
+        types = db_module._quote_items_copy_types(cur)
+        cur.execute("select 'int8'::regtype::oid, 'text'::regtype::oid, 'numeric'::regtype::oid")
+        int8, text, numeric = cur.fetchone()
+    assert types == [int8, text, numeric, numeric]
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import pytest
+
+from conftest import needs_database
+
+pytestmark = needs_database
+
+
+def test_pool_recreated_registers_close_pool_once(db_module, monkeypatch: pytest.MonkeyPatch) -> None:
+    registered = []
+    monkeypatch.setattr(db_module.atexit, "register", registered.append)
+    monkeypatch.setattr(db_module, "_atexit_registered", False)
+    dsn = db_module._dsn
+
+    for _ in range(3):
+        db_module.close_pool()
+        pool = db_module.get_pool(dsn)
+        with pool.connection() as conn:
+            assert conn.execute("select 1").fetchone() == (1,)
+
+    assert registered == [db_module.close_pool]
+
+
+def test_get_pool_with_another_dsn_replaces_the_pool(db_module) -> None:
+    dsn = db_module._dsn
+    first = db_module.get_pool()
+    assert db_module.get_pool(dsn) is first
+    assert db_module.get_pool(dsn + "&application_name=otra") is not first
+    assert db_module.get_pool(dsn) is not first
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import date
+from decimal import Decimal
+from typing import Any
+
+import pytest
+
+from jobs import DONE, FAILED, JobQueue, render_stored, save_job_key
+from utils import QuoteItem
+
+HEADER = {
+    "year": 2026,
+    "issue_date": date(2026, 1, 15),
+    "client_name": "Juan Pérez",
+    "discount_pct": Decimal("7.5"),
+    "notes": "",
+}
+ITEMS = [QuoteItem("Landing page", Decimal("1"), Decimal("120000")), QuoteItem("Logo", Decimal("2"), Decimal("50000"))]
+
+
+def _wait(queue: JobQueue, key: str, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(key)
+        if job is not None and job.finished:
+            return job
+        time.sleep(0.005)
+    raise AssertionError(f"el trabajo {key} no terminó")
+
+
+# -----------------------------
+# Claves de idempotencia
+# -----------------------------
+def test_save_job_key_is_stable_for_the_same_draft_and_content() -> None:
+    key = save_job_key("draft1", HEADER, ITEMS)
+    assert key.startswith("save:draft1:")
+    assert save_job_key("draft1", dict(reversed(list(HEADER.items()))), list(ITEMS)) == key
+
+
+@pytest.mark.parametrize(
+    "draft, header, items",
+    [
+        ("draft2", HEADER, ITEMS),
+        ("draft1", {**HEADER, "client_name": "Juan Perez"}, ITEMS),
+        ("draft1", HEADER, ITEMS[:1]),
+        ("draft1", HEADER, [ITEMS[1], ITEMS[0]]),
+        ("draft1", HEADER, [QuoteItem("Landing page", Decimal("1"), Decimal("120001")), ITEMS[1]]),
+    ],
+)
+def test_save_job_key_changes_with_draft_or_content(draft: str, header: dict[str, Any], items: list[QuoteItem]) -> None:
+    assert save_job_key(draft, header, items) != save_job_key("draft1", HEADER, ITEMS)
+
+
+# -----------------------------
+# Cola
+# -----------------------------
+def test_submit_same_key_runs_once() -> None:
+    queue = JobQueue(workers=2)
+    release = threading.Event()
+    calls = []
+
+    def fn(report, value):
+        calls.append(value)
+        release.wait(5)
+        return {"quote_number": "2026-0001"}, b"%PDF"
+
+    first = queue.submit("save:a", fn, 1)
+    second = queue.submit("save:a", fn, 1)
+    release.set()
+    job = _wait(queue, "save:a")
+
+    assert first.key == second.key == "save:a"
+    assert queue.submit("save:a", fn, 1).status == DONE
+    assert calls == [1]
+    assert job.quote_number == "2026-0001"
+    assert queue.take_result("save:a") == b"%PDF"
+
+
+def test_failed_job_after_save_is_retried_without_saving_again() -> None:
+    queue = JobQueue(workers=1)
+    saves = []
+    renders = {"fail": True}
+
+    def fn(report, header, saved_as=""):
+        if not saved_as:
+            saves.append(header)
+            saved_as = f"2026-{len(saves):04d}"
+            report(0.5, "Guardado", quote_number=saved_as)
+        if renders.pop("fail", False):
+            raise OSError("render falló")
+        return {"quote_number": saved_as}, b"%PDF"
+
+    queue.submit("save:b", fn, "cabecera")
+    failed = _wait(queue, "save:b")
+    assert failed.status == FAILED
+    assert failed.quote_number == "2026-0001"
+
+    retry = queue.submit("save:b", fn, "cabecera")
+    assert retry.quote_number == "2026-0001"
+    done = _wait(queue, "save:b")
+    assert done.status == DONE
+    assert done.quote_number == "2026-0001"
+    assert len(saves) == 1
+
+
+def test_failed_job_before_save_runs_in_full_again() -> None:
+    queue = JobQueue(workers=1)
+    attempts = []
+
+    def fn(report, saved_as=""):
+        attempts.append(saved_as)
+        if len(attempts) == 1:
+            raise ConnectionError("base caída")
+        return {"quote_number": "2026-0002"}, b"%PDF"
+
+    queue.submit("save:c", fn)
+    assert _wait(queue, "save:c").status == FAILED
+    queue.submit("save:c", fn)
+    assert _wait(queue, "save:c").status == DONE
+    assert attempts == ["", ""]
+
+
+# -----------------------------
+# Reimpresión
+# -----------------------------
+@pytest.fixture
+def journal_with_quote(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    import journal
+
+    j = journal.Journal(str(tmp_path / "diario.sqlite"))
+    with closing(sqlite3.connect(j.path)) as conn:
+        conn.execute("insert into numbers(year, seq) values (2026, 7)")
+        conn.commit()
+    _seq, quote_number = j.save_quote(items=ITEMS, **HEADER)
+    monkeypatch.setattr(journal, "get_journal", lambda: j)
+    return j, quote_number
+
+
+@pytest.fixture
+def rendered(monkeypatch: pytest.MonkeyPatch) -> list[dict[str, Any]]:
+    import pdf_cache
+
+    calls: list[dict[str, Any]] = []
+    monkeypatch.setattr(pdf_cache, "cached_build_quote_pdf_bytes", lambda **kw: calls.append(kw) or b"%PDF")
+    return calls
+
+
+def test_render_stored_reads_a_quote_still_in_the_journal(journal_with_quote, rendered, monkeypatch) -> None:
+    import db
+
+    _j, quote_number = journal_with_quote
+
+    def load_quote(quote_number: str):
+        raise AssertionError("no debería consultar la base")
+
+    monkeypatch.setattr(db, "load_quote", load_quote)
+    meta, data = render_stored(lambda *a, **kw: None, quote_number, None)
+
+    assert quote_number == "2026-0007"
+    assert meta == {"quote_number": quote_number, "filename": f"cotizacion_{quote_number}.pdf"}
+    assert data == b"%PDF"
+    pdf_args = {k: v for k, v in HEADER.items() if k != "year"}
+    assert rendered == [{**pdf_args, "quote_number": quote_number, "items": ITEMS, "logo_path": None}]
+
+
+def test_render_stored_reads_the_database_once_flushed(journal_with_quote, rendered, monkeypatch) -> None:
+    import db
+
+    j, quote_number = journal_with_quote
+    with closing(sqlite3.connect(j.path)) as conn:
+        conn.execute("update entries set flushed_at = 1 where quote_number = ?", (quote_number,))
+        conn.commit()
+    monkeypatch.setattr(db, "load_quote", lambda quote_number: None)
+
+    with pytest.raises(LookupError, match=quote_number):
+        render_stored(lambda *a, **kw: None, quote_number, None)
+    assert rendered == []
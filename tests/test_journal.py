@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from datetime import date
+from decimal import Decimal
+from typing import Any
+
+import pytest
+
+from conftest import needs_database
+from utils import QuoteItem
+
+pytestmark = needs_database
+
+HEADER = {
+    "year": 2026,
+    "issue_date": date(2026, 3, 2),
+    "brand_name": "HIDRACODE",
+    "brand_email": "contacto@hidracode.cl",
+    "brand_phone": "+56 9 0000 0000",
+    "client_name": "Juan Pérez",
+    "client_email": "",
+    "client_company": "Hidracode SpA",
+    "notes": "",
+    "validity_days": 10,
+}
+ITEMS = [QuoteItem("Landing page", Decimal("1"), Decimal("120000.50")), QuoteItem("Logo", Decimal("2.5"), Decimal("49990"))]
+
+
+@pytest.fixture
+def saved(db_module) -> dict[str, Any]:
+    """Cotización del diario ya guardada en la base (como si un envío anterior hubiera llegado)."""
+    quote = {**HEADER, "discount_pct": Decimal("7.555"), "items": ITEMS}
+    _quote_id, seq, _qn = db_module.save_quote(**quote)
+    return {**quote, "seq": seq}
+
+
+def test_journaled_quote_matches_its_stored_copy(db_module, saved: dict[str, Any]) -> None:
+    # La base guardó discount_pct = 7.56 (numeric(5,2)); el diario conserva 7.555
+    assert db_module.load_quote(f"2026-{saved['seq']:04d}").discount_pct == Decimal("7.56")
+    assert db_module.journaled_quote_matches(saved)
+
+
+@pytest.mark.parametrize(
+    "changes",
+    [
+        {"discount_pct": Decimal("7.5")},
+        {"client_name": "Juan Perez"},
+        {"items": ITEMS[:1]},
+        {"items": [ITEMS[0], QuoteItem("Logo", Decimal("2.5"), Decimal("49991"))]},
+    ],
+)
+def test_journaled_quote_does_not_match_another_quote(db_module, saved: dict[str, Any], changes: dict[str, Any]) -> None:
+    assert not db_module.journaled_quote_matches({**saved, **changes})
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import os
+import time
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from pdf_cache import PdfCache, quote_cache_key
+from utils import QuoteItem
+
+QUOTE = {
+    "quote_number": "2026-0001",
+    "issue_date": date(2026, 1, 15),
+    "brand_name": "HIDRACODE",
+    "brand_email": "contacto@hidracode.cl",
+    "brand_phone": "+56 9 0000 0000",
+    "client_name": "Juan Pérez",
+    "client_email": "",
+    "client_company": "",
+    "items": [QuoteItem("Landing page", Decimal("1"), Decimal("120000")), QuoteItem("Logo", Decimal("2.5"), Decimal("49990.5"))],
+    "discount_pct": Decimal("7.5"),
+    "notes": "",
+    "validity_days": 10,
+}
+
+
+# -----------------------------
+# Clave
+# -----------------------------
+def test_key_ignores_decimal_scale() -> None:
+    same = {
+        **QUOTE,
+        "items": [
+            QuoteItem("Landing page", Decimal("1.00"), Decimal("120000.00")),
+            QuoteItem("Logo", Decimal("2.50"), Decimal("49990.50")),
+        ],
+        "discount_pct": Decimal("7.50"),
+    }
+    assert quote_cache_key(**same) == quote_cache_key(**QUOTE)
+
+
+@pytest.mark.parametrize(
+    "changes",
+    [
+        {"items": [QuoteItem("Landing page", Decimal("1"), Decimal("120000.01")), QuoteItem("Logo", Decimal("2.5"), Decimal("49990.5"))]},
+        {"items": [QuoteItem("Landing page", Decimal("2"), Decimal("120000")), QuoteItem("Logo", Decimal("2.5"), Decimal("49990.5"))]},
+        {"discount_pct": Decimal("7.55")},
+        {"client_name": "Juan Perez"},
+        {"quote_number": "2026-0002"},
+    ],
+)
+def test_key_changes_with_what_the_pdf_prints(changes: dict) -> None:
+    assert quote_cache_key(**{**QUOTE, **changes}) != quote_cache_key(**QUOTE)
+
+
+# -----------------------------
+# Niveles memoria -> disco
+# -----------------------------
+def test_memory_evictions_are_served_from_disk(tmp_path) -> None:
+    cache = PdfCache(max_memory_bytes=250, disk_dir=str(tmp_path))
+    for key in ("aa1", "bb2", "cc3"):
+        cache.put(key, key.encode() * 33 + b"x")  # 100 bytes
+
+    stats = cache.stats()
+    assert (stats["entries_memory"], stats["evictions_memory"]) == (2, 1)
+
+    assert cache.get("aa1") == b"aa1" * 33 + b"x"  # salió de memoria, sigue en disco
+    assert cache.get("aa1") == b"aa1" * 33 + b"x"  # y volvió a memoria
+    assert cache.get("zz9") is None
+    stats = cache.stats()
+    assert (stats["hits_disk"], stats["hits_memory"], stats["misses"]) == (1, 1, 1)
+
+    # Otro proceso (o un reinicio) con el mismo directorio
+    assert PdfCache(disk_dir=str(tmp_path)).get("bb2") == b"bb2" * 33 + b"x"
+
+
+def test_disk_is_pruned_to_90_percent_oldest_first(tmp_path) -> None:
+    cache = PdfCache(disk_dir=str(tmp_path), max_disk_bytes=1000)
+    keys = [f"{i:02d}key" for i in range(10)]
+    now = time.time()
+    for i, key in enumerate(keys):
+        cache.put(key, b"x" * 100)
+        os.utime(cache._disk_path(key), (now - 100 + i, now - 100 + i))
+    assert cache.stats()["evictions_disk"] == 0  # 1000 bytes: justo en el límite
+
+    cache.clear()
+    cache.get(keys[0])  # uso reciente: ya no es el más antiguo
+    cache.put("10key", b"x" * 100)  # 1100 bytes -> se poda hasta 900
+
+    on_disk = {key for key in keys + ["10key"] if os.path.exists(cache._disk_path(key))}
+    assert on_disk == set(keys) - {keys[1], keys[2]} | {"10key"}
+    stats = cache.stats()
+    assert (stats["bytes_disk"], stats["evictions_disk"]) == (900, 2)
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import re
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from reportlab.pdfbase import pdfmetrics
+
+import pdf_generator
+from bench import make_items
+from pdf_generator import build_quote_pdf_bytes, wrap_text
+from totals import compute_totals
+from utils import money_clp
+
+FONT = "Helvetica"
+SIZE = 9
+
+
+def _fits(line: str, width: float) -> bool:
+    return pdfmetrics.stringWidth(line, FONT, SIZE) <= width
+
+
+def test_short_text_is_one_line_plus_paragraph_gap() -> None:
+    assert wrap_text("Entrega en 3 días", FONT, SIZE, 200) == ["Entrega en 3 días", ""]
+
+
+def test_paragraphs_keep_their_order_with_a_blank_line_after_each() -> None:
+    assert wrap_text("uno\n\ndos", FONT, SIZE, 200) == ["uno", "", "", "dos", ""]
+
+
+def test_long_paragraph_wraps_within_width_without_losing_words() -> None:
+    text = " ".join(f"palabra{i} de la cláusula número {i}," for i in range(60))
+    lines = wrap_text(text, FONT, SIZE, 150)
+
+    assert lines[-1] == ""
+    body = lines[:-1]
+    assert len(body) > 1
+    assert all(line and _fits(line, 150) for line in body)
+    assert " ".join(body) == text
+
+
+def test_each_line_is_as_full_as_possible() -> None:
+    text = "aa bb cc dd ee ff gg hh ii jj kk ll mm nn oo pp"
+    body = wrap_text(text, FONT, SIZE, 60)[:-1]
+    next_words = [nxt.split()[0] for nxt in body[1:]]
+    assert all(not _fits(f"{line} {word}", 60) for line, word in zip(body, next_words))
+
+
+def test_unbreakable_word_is_split_into_pieces_that_fit() -> None:
+    word = "https://example.com/" + "x" * 300
+    lines = wrap_text(f"Ver {word} fin", FONT, SIZE, 100)[:-1]
+
+    assert lines[0] == "Ver"
+    assert all(_fits(line, 100) for line in lines)
+    pieces = [line for line in lines if line not in ("Ver",)]
+    assert "".join(pieces).removesuffix(" fin") == word
+    assert len(pieces) > 1
+
+
+def test_width_narrower_than_a_character_still_advances() -> None:
+    # Mínimo un carácter por línea: no hay ciclo infinito ni líneas vacías
+    assert wrap_text("abc", FONT, SIZE, 1) == ["a", "b", "c", ""]
+
+
+# -----------------------------
+# Tabla de ítems en varias páginas
+# -----------------------------
+def _pesos(text: str) -> int:
+    return int(text.replace("$", "").replace(".", "").strip())
+
+
+@pytest.mark.parametrize("n_items, n_pages", [(10, 1), (1_000, 31), (10_000, 304)])
+def test_items_table_splits_across_pages_with_running_subtotals(
+    monkeypatch: pytest.MonkeyPatch, n_items: int, n_pages: int
+) -> None:
+    tables: list[list[list[str]]] = []
+
+    class RecordingTable(pdf_generator.Table):
+        def __init__(self, data, *args, **kwargs):
+            tables.append(data)
+            super().__init__(data, *args, **kwargs)
+
+    monkeypatch.setattr(pdf_generator, "Table", RecordingTable)
+    right_strings: list[str] = []
+    draw_right = pdf_generator.canvas.Canvas.drawRightString
+    monkeypatch.setattr(
+        pdf_generator.canvas.Canvas,
+        "drawRightString",
+        lambda self, x, y, text, *a, **kw: right_strings.append(text) or draw_right(self, x, y, text, *a, **kw),
+    )
+    items = make_items(n_items)
+    discount = Decimal("7.5")
+    pdf = build_quote_pdf_bytes(
+        quote_number="2026-0001",
+        issue_date=date(2026, 1, 15),
+        brand_name="HIDRACODE",
+        brand_email="contacto@hidracode.cl",
+        brand_phone="+56 9 0000 0000",
+        client_name="Juan Pérez",
+        client_email="",
+        client_company="",
+        items=items,
+        discount_pct=discount,
+        notes="Entrega en 3 días",
+        validity_days=10,
+    )
+    totals = compute_totals(items, discount)
+
+    assert len(re.findall(rb"/Type /Page\b", pdf)) == n_pages
+    assert len(tables) == n_pages
+    # Cada página repite el encabezado de columnas y las filas salen todas, en orden
+    assert all(t[0] == ["Descripción", "Cant.", "Precio unit.", "Total"] for t in tables)
+    rows = [row for t in tables for row in t[1:] if not row[0].startswith("Subtotal ")]
+    assert [row[0] for row in rows] == [it.description for it in items]
+
+    running = 0
+    for t in tables[:-1]:
+        *page_rows, page_row, running_row = t[1:]
+        page_subtotal = sum(_pesos(row[3]) for row in page_rows)
+        running += page_subtotal
+        assert page_row[0].startswith("Subtotal página") and _pesos(page_row[3]) == page_subtotal
+        assert running_row[0].startswith("Subtotal acumulado") and _pesos(running_row[3]) == running
+    # Lo acumulado hasta la penúltima página + la última = subtotal de compute_totals
+    assert running + sum(_pesos(row[3]) for row in tables[-1][1:]) == totals.subtotal
+    assert f"Subtotal (Neto): {money_clp(totals.subtotal)}" in right_strings
+    assert f"TOTAL: {money_clp(totals.total)}" in right_strings
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from decimal import ROUND_HALF_UP, Decimal
+
+import pytest
+
+from totals import Line, compute_totals, line_total, line_totals, to_cents
+from utils import QuoteItem
+
+
+def _pesos(value: Decimal) -> int:
+    return int(value.quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+@pytest.mark.parametrize(
+    "value, cents",
+    [
+        ("0.005", 1),
+        ("0.004", 0),
+        ("1.235", 124),  # como float sería 1.23499999...
+        ("2.675", 268),
+        ("-0.005", -1),  # mitades lejos de cero, como round() de numeric en Postgres
+        ("10", 1000),
+        ("19990.5", 1999050),
+    ],
+)
+def test_to_cents_rounds_half_up(value: str, cents: int) -> None:
+    assert to_cents(Decimal(value)) == cents
+
+
+@pytest.mark.parametrize(
+    "qty, price, expected",
+    [
+        ("1", "0.5", 1),
+        ("1", "0.49", 0),
+        ("3", "0.5", 2),  # 1.5 -> 2
+        ("2.5", "0.3", 1),  # 0.75 -> 1
+        ("0.333", "3", 1),  # qty a centésimos primero: 0.33 * 3 = 0.99 -> 1
+        ("1", "-0.5", -1),
+    ],
+)
+def test_line_total_rounds_half_up_to_pesos(qty: str, price: str, expected: int) -> None:
+    assert line_total(Decimal(qty), Decimal(price)) == expected
+    assert Line.from_decimal(Decimal(qty), Decimal(price)).total == expected
+
+
+def test_line_totals_matches_line_total() -> None:
+    lines = [Line(q, p) for q in (-150, -1, 0, 1, 50, 150, 333) for p in (-4999, -50, 50, 4999, 12345)]
+    assert line_totals(lines) == [ln.total for ln in lines]
+
+
+@pytest.mark.parametrize(
+    "items, discount, expected",
+    [
+        # neto 50 -> IVA 9.5 -> 10
+        ([("1", "50")], "0", (50, 0, 50, 10, 60)),
+        # descuento 10% de 5 = 0.5 -> 1
+        ([("1", "5")], "10", (5, 1, 4, 1, 5)),
+        ([("2", "19990.5"), ("1", "0.5")], "7.5", (39982, 2999, 36983, 7027, 44010)),
+    ],
+)
+def test_compute_totals_rounds_each_step_half_up(
+    items: list[tuple[str, str]], discount: str, expected: tuple[int, int, int, int, int]
+) -> None:
+    quote = [QuoteItem("x", Decimal(q), Decimal(p)) for q, p in items]
+    t = compute_totals(quote, Decimal(discount))
+    assert (t.subtotal, t.discount_amount, t.neto, t.iva_amount, t.total) == expected
+
+
+def test_compute_totals_matches_decimal_reference() -> None:
+    # Mismo resultado que hacerlo con Decimal y ROUND_HALF_UP en cada paso
+    items = [QuoteItem("x", Decimal(1 + i % 4), Decimal(990 + i * 37) + Decimal("0.5")) for i in range(40)]
+    discount = Decimal("12.5")
+    subtotal = sum(_pesos(it.qty * it.unit_price) for it in items)
+    discount_amount = _pesos(subtotal * discount / 100)
+    neto = subtotal - discount_amount
+    iva = _pesos(Decimal(neto) * 19 / 100)
+
+    t = compute_totals(items, discount)
+    assert (t.subtotal, t.discount_amount, t.neto, t.iva_amount, t.total) == (
+        subtotal,
+        discount_amount,
+        neto,
+        iva,
+        neto + iva,
+    )
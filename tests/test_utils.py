@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from decimal import Decimal
+
+import pytest
+
+from utils import client_key, fold_text, money_clp
+
+
+@pytest.mark.parametrize(
+    "text, folded",
+    [
+        ("Juan Pérez", "juan perez"),
+        ("  JUAN   PÉREZ. ", "juan perez"),
+        ("Ñandú_Diseño-Web", "nandu diseno web"),
+        ("Straße", "strasse"),
+        ("¡¿...?!", ""),
+    ],
+)
+def test_fold_text(text: str, folded: str) -> None:
+    assert fold_text(text) == folded
+
+
+def test_client_key_ignores_case_accents_spacing_and_punctuation() -> None:
+    key = client_key("Juan Pérez", "Hidracode SpA")
+    assert key == "juan perez|hidracode spa"
+    assert client_key("JUAN PEREZ.", "hidracode  spa") == key
+
+
+def test_client_key_keeps_name_and_company_apart() -> None:
+    assert client_key("Juan Pérez", "") != client_key("", "Juan Pérez")
+    assert client_key("Juan", "Pérez") != client_key("Juan Pérez", "")
+    assert client_key("Juan Pérez", "Otra SpA") != client_key("Juan Pérez", "Hidracode SpA")
+
+
+def test_client_key_is_empty_without_name_or_company() -> None:
+    assert client_key("", "") == ""
+    assert client_key("  ", "--") == ""
+    assert client_key(None, None) == ""  # type: ignore[arg-type]
+    assert client_key("", "ACME") == "|acme"
+
+
+@pytest.mark.parametrize(
+    "value, text",
+    [
+        (1234567, "$ 1.234.567"),
+        (0, "$ 0"),
+        (Decimal("999.5"), "$ 1.000"),
+        (Decimal("0.49"), "$ 0"),
+    ],
+)
+def test_money_clp(value: Decimal | int, text: str) -> None:
+    assert money_clp(value) == text
@@ -0,0 +1,151 @@
+"""
+Medición de tiempos por fase (spans) para db.py y pdf_generator.py.
+
+    with span("db.save.execute", items=len(items)) as s:
+        ...
+        s.set(bytes=len(data))
+
+Cada span terminado produce un registro
+{"ts": ..., "request": ..., "phase": ..., "ms": ..., **campos (items, bytes, ...)}
+que va a:
+- el sink JSONL configurado (TIMING_SINK = ruta de archivo, o "stderr"), y/o
+- la lista de la medición en curso (collect()), p. ej. para mostrar el
+  desglose de una cotización en la barra lateral.
+
+Sin sink ni collect() activo, span() retorna un objeto vacío compartido: el
+costo es un if y una lectura de ContextVar.
+"""
+from __future__ import annotations
+
+import contextvars
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional, TextIO
+
+_sink: Optional[TextIO] = None
+_sink_lock = threading.Lock()
+_configured = False
+_enabled = False
+
+# Registros de la medición en curso (collect) y su nombre
+_collector: contextvars.ContextVar[Optional[list[dict[str, Any]]]] = contextvars.ContextVar("timing_collector", default=None)
+_request: contextvars.ContextVar[str] = contextvars.ContextVar("timing_request", default="")
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> _NoopSpan:
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        return None
+
+    def set(self, **fields: Any) -> None:
+        return None
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("phase", "fields", "_t0", "_collector")
+
+    def __init__(self, phase: str, fields: dict[str, Any], collector: Optional[list[dict[str, Any]]]):
+        self.phase = phase
+        self.fields = fields
+        self._collector = collector
+        self._t0 = 0.0
+
+    def __enter__(self) -> _Span:
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, *exc: Any) -> None:
+        ms = (time.perf_counter() - self._t0) * 1000
+        record = {"ts": round(time.time(), 3), "request": _request.get(), "phase": self.phase, "ms": round(ms, 3)}
+        record.update(self.fields)
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        if self._collector is not None:
+            self._collector.append(record)
+        if _enabled:
+            _emit(record)
+
+    def set(self, **fields: Any) -> None:
+        """Agrega campos al registro (ej. bytes, conocidos recién al final)."""
+        self.fields.update(fields)
+
+
+def configure(sink: Optional[str] = None) -> None:
+    """
+    Define el sink JSONL: ruta de archivo (se agrega al final), "stderr", o
+    None/"" para desactivar. Si no se llama, se lee TIMING_SINK en el primer span.
+    """
+    global _sink, _configured, _enabled
+    with _sink_lock:
+        if _sink is not None and _sink is not sys.stderr:
+            _sink.close()
+        if not sink:
+            _sink = None
+        elif sink == "stderr":
+            _sink = sys.stderr
+        else:
+            _sink = open(sink, "a", encoding="utf-8", buffering=1)
+        _enabled = _sink is not None
+        _configured = True
+
+
+def _emit(record: dict[str, Any]) -> None:
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with _sink_lock:
+        if _sink is not None:
+            _sink.write(line + "\n")
+
+
+def enabled() -> bool:
+    """True si hay sink configurado (lee TIMING_SINK la primera vez)."""
+    if not _configured:
+        from settings import get_setting
+
+        configure(get_setting("TIMING_SINK") or None)
+    return _enabled
+
+
+def span(phase: str, **fields: Any) -> Any:
+    """Mide el bloque with como la fase phase (con campos extra, ej. items=10)."""
+    if not _configured:
+        enabled()
+    collector = _collector.get()
+    if not _enabled and collector is None:
+        return _NOOP
+    return _Span(phase, fields, collector)
+
+
+@contextmanager
+def collect(request: str) -> Iterator[list[dict[str, Any]]]:
+    """
+    Junta los spans del bloque (en este hilo/contexto) en una lista, y los
+    marca con el nombre request también en el sink.
+    """
+    records: list[dict[str, Any]] = []
+    token_c = _collector.set(records)
+    token_r = _request.set(request)
+    try:
+        yield records
+    finally:
+        _collector.reset(token_c)
+        _request.reset(token_r)
+
+
+def summarize(records: list[dict[str, Any]]) -> list[tuple[str, float, int]]:
+    """(fase, ms totales, veces) por fase, en el orden en que aparecieron."""
+    totals: dict[str, list[float]] = {}
+    for r in records:
+        acc = totals.setdefault(r["phase"], [0.0, 0])
+        acc[0] += r["ms"]
+        acc[1] += 1
+    return [(phase, ms, int(n)) for phase, (ms, n) in totals.items()]
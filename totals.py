@@ -0,0 +1,146 @@
+"""
+Motor de totales de cotización en pesos enteros.
+
+Una sola implementación para el PDF y la base de datos: cantidades y precios se
+llevan a centésimos (la misma escala de quote_items: numeric(12,2) y
+numeric(14,2)) y todo el cálculo es aritmética entera exacta con redondeo
+ROUND_HALF_UP a pesos:
+
+    línea     = cantidad * precio                      (redondeada a pesos)
+    subtotal  = suma de líneas
+    descuento = subtotal * descuento% / 100            (redondeado a pesos)
+    neto      = subtotal - descuento
+    IVA       = neto * 19 / 100                        (redondeado a pesos)
+    total     = neto + IVA
+
+Como lo que se guarda en quote_items es exactamente Line.qty/Line.unit_price,
+los totales recalculados desde la base coinciden siempre con los del PDF.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Iterable, Protocol, Sequence, Union
+
+SCALE = 100  # centésimos (2 decimales, como las columnas de quote_items)
+IVA_PCT = 19
+
+_LINE_DEN = SCALE * SCALE  # qty_c * price_c está en diez-milésimos de peso
+
+
+def _div_half_up(num: int, den: int) -> int:
+    """num / den redondeado a entero, mitades lejos de cero (den > 0)."""
+    if num >= 0:
+        return (2 * num + den) // (2 * den)
+    return -((-2 * num + den) // (2 * den))
+
+
+def to_cents(value: Decimal) -> int:
+    """Decimal -> entero en centésimos (ROUND_HALF_UP, igual que el cast a numeric(_,2))."""
+    num, den = value.as_integer_ratio()  # exacto y bastante más barato que quantize
+    if den == 1:
+        return num * SCALE
+    return _div_half_up(num * SCALE, den)
+
+
+def from_cents(value: int) -> Decimal:
+    return Decimal(value).scaleb(-2)
+
+
+def line_total(qty: Decimal, unit_price: Decimal) -> int:
+    """Total de una línea en pesos (sin pasar por Line)."""
+    return _div_half_up(to_cents(qty) * to_cents(unit_price), _LINE_DEN)
+
+
+class Line:
+    """Ítem compacto para cálculo: cantidad y precio unitario en centésimos."""
+
+    __slots__ = ("qty_c", "price_c")
+
+    def __init__(self, qty_c: int, price_c: int):
+        self.qty_c = qty_c
+        self.price_c = price_c
+
+    @classmethod
+    def from_decimal(cls, qty: Decimal, unit_price: Decimal) -> Line:
+        return cls(to_cents(qty), to_cents(unit_price))
+
+    @property
+    def qty(self) -> Decimal:
+        return from_cents(self.qty_c)
+
+    @property
+    def unit_price(self) -> Decimal:
+        return from_cents(self.price_c)
+
+    @property
+    def total(self) -> int:
+        return _div_half_up(self.qty_c * self.price_c, _LINE_DEN)
+
+    def __repr__(self) -> str:
+        return f"Line(qty={self.qty}, unit_price={self.unit_price})"
+
+
+class _Priced(Protocol):
+    qty: Decimal
+    unit_price: Decimal
+
+
+# utils.QuoteItem (o cualquier objeto con qty/unit_price Decimal) o una Line ya convertida
+ItemLike = Union[Line, _Priced]
+
+
+@dataclass(frozen=True)
+class QuoteTotals:
+    """Totales de una cotización, en pesos enteros."""
+    line_totals: tuple[int, ...]
+    subtotal: int
+    discount_amount: int
+    neto: int
+    iva_amount: int
+    total: int
+
+
+def to_lines(items: Iterable[ItemLike]) -> list[Line]:
+    """Convierte ítems (QuoteItem o Line) a Line; las Line se reutilizan tal cual."""
+    return [it if isinstance(it, Line) else Line.from_decimal(it.qty, it.unit_price) for it in items]
+
+
+def line_totals(lines: Sequence[Line]) -> list[int]:
+    """Total por línea en pesos, para muchas líneas de una vez (repricing en bloque)."""
+    den2 = 2 * _LINE_DEN
+    out = []
+    append = out.append
+    for ln in lines:
+        n = ln.qty_c * ln.price_c
+        if n >= 0:
+            append((2 * n + _LINE_DEN) // den2)
+        else:
+            append(-((-2 * n + _LINE_DEN) // den2))
+    return out
+
+
+def totals_from_line_totals(totals: Sequence[int], discount_pct: Decimal) -> QuoteTotals:
+    subtotal = sum(totals)
+    # discount_pct también a centésimos (quotes.discount_pct es numeric(5,2))
+    discount_amount = _div_half_up(subtotal * to_cents(discount_pct), 100 * SCALE)
+    neto = subtotal - discount_amount
+    iva_amount = _div_half_up(neto * IVA_PCT, 100)
+    return QuoteTotals(
+        line_totals=tuple(totals),
+        subtotal=subtotal,
+        discount_amount=discount_amount,
+        neto=neto,
+        iva_amount=iva_amount,
+        total=neto + iva_amount,
+    )
+
+
+def compute_totals(items: Iterable[ItemLike], discount_pct: Decimal) -> QuoteTotals:
+    """Totales de una cotización (ítems QuoteItem o Line)."""
+    return totals_from_line_totals(line_totals(to_lines(items)), discount_pct)
+
+
+def compute_totals_many(quotes: Iterable[tuple[Iterable[ItemLike], Decimal]]) -> list[QuoteTotals]:
+    """compute_totals() para muchas cotizaciones (pares (ítems, descuento%)), en orden."""
+    return [compute_totals(items, discount_pct) for items, discount_pct in quotes]
@@ -1,13 +1,31 @@
 from __future__ import annotations
+import re
+import unicodedata
 from dataclasses import dataclass
 from decimal import Decimal, ROUND_HALF_UP
+from typing import Union
 
-def money_clp(value: Decimal) -> str:
-    # Formato CLP simple: 1234567 -> 1.234.567
-    v = int(value.quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+from totals import line_total as _line_total
+
+def money_clp(value: Union[Decimal, int]) -> str:
+    # Formato CLP simple: 1234567 -> 1.234.567 (int = pesos ya redondeados, ver totals.py)
+    v = value if isinstance(value, int) else int(value.quantize(Decimal("1"), rounding=ROUND_HALF_UP))
     s = f"{v:,}".replace(",", ".")
     return f"$ {s}"
 
+_NON_WORD = re.compile(r"[\W_]+")
+
+def fold_text(text: str) -> str:
+    # Para comparar y buscar: sin mayúsculas ni tildes, solo letras/dígitos separados por un espacio
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    plain = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_WORD.sub(" ", plain).strip()
+
+def client_key(name: str, company: str = "") -> str:
+    # Clave del directorio de clientes: mismo nombre + empresa salvo mayúsculas, tildes, espacios y puntuación
+    name_key, company_key = fold_text(name or ""), fold_text(company or "")
+    return f"{name_key}|{company_key}" if name_key or company_key else ""
+
 def to_decimal(x) -> Decimal:
     try:
         return Decimal(str(x))
@@ -22,4 +40,5 @@ class QuoteItem:
 
     @property
     def line_total(self) -> Decimal:
-        return (self.qty * self.unit_price).quantize(Decimal("1"), rounding=ROUND_HALF_UP)
+        # Mismo cálculo que el PDF y la base (totals.py)
+        return Decimal(_line_total(self.qty, self.unit_price))